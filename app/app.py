@@ -1,113 +1,440 @@
 import os
 import json
-from flask import Flask, request, jsonify
+import time
+import queue
+import threading
+from flask import Flask, Response, request, jsonify
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 
 # Import our modules
-from processors.pdf_processor import process_pdf
-from processors.image_processor import process_image
+from processors.pdf_processor import process_pdf, PROCESSOR_VERSION as PDF_PROCESSOR_VERSION
+from processors.image_processor import process_image, PROCESSOR_VERSION as IMAGE_PROCESSOR_VERSION
 from processors.spreadsheet_processor import process_spreadsheet
 from rule_engine import RuleEngine
 from gemini_agent import GeminiAgent
-from evaluation_agent import EvaluationAgent  # <-- Agent 2
+from evaluation_agent import EvaluationAgent, RUBRIC_VERSION  # <-- Agent 2
+from evaluation_cache import EvaluationCache
+from document_cache import DocumentCache
+from upload_store import UploadStore, Upload, load_upload
+from pre_evaluator import requires_synchronous_review
+from evaluation_queue import EvaluationQueue
+from job_queue import JobQueue, JobQueueFullError
+from llm_client import LLMClient
+from llm_scheduler import LLMOverloadedError
+from vitals_state import VitalsStore
+from downsampling import chart_series, DEFAULT_MAX_POINTS
+from lab_parser import parse_lab_report
+import stage_executor
+from stage_executor import StageOverloadedError
 
 load_dotenv()
 
 # --- CONFIGURATION ---
-UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'xlsx', 'xls', 'csv'}
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+AGENT_TYPES = {'drug_safety', 'translator', 'symptom_triage', 'chronic_care', 'doctors_copilot'}
+# How long a queued job waits out full OCR/NER/embedding stages before it fails.
+JOB_STAGE_WAIT_SECONDS = int(os.getenv("JOB_STAGE_WAIT_SECONDS", "600"))
 
 app = Flask(__name__)
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
 # --- INITIALIZE MODULES (SINGLETONS) ---
 print("Initializing all modules...")
+stage_executor.start_executors()  # OCR/NER/embedding pools; forked only if no other threads exist yet
 rule_engine = RuleEngine()
-gemini_agent_1 = GeminiAgent(api_key=os.getenv("GOOGLE_API_KEY"))
-evaluation_agent_2 = EvaluationAgent(api_key=os.getenv("GOOGLE_API_KEY"))  # <-- Agent 2
+llm_client = LLMClient(api_key=os.getenv("GOOGLE_API_KEY"))  # Shared by both agents
+gemini_agent_1 = GeminiAgent(api_key=os.getenv("GOOGLE_API_KEY"), llm_client=llm_client)
+evaluation_cache = EvaluationCache(rubric_version=RUBRIC_VERSION)
+upload_store = UploadStore()  # Only large uploads (and queued jobs') touch disk
+document_cache = DocumentCache({"pdf": PDF_PROCESSOR_VERSION, "image": IMAGE_PROCESSOR_VERSION})  # OCR + NER results
+evaluation_agent_2 = EvaluationAgent(api_key=os.getenv("GOOGLE_API_KEY"), llm_client=llm_client, evaluation_cache=evaluation_cache)  # <-- Agent 2
+evaluation_queue = EvaluationQueue(evaluation_agent_2.evaluate_output)
+vitals_store = VitalsStore()  # Incremental per-patient state fed by home devices, shared by all workers
 print("Initialization complete. Server is ready.")
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# --- API ENDPOINT ---
-@app.route('/api/unified_analysis', methods=['POST'])
-def unified_analysis():
-    """Single endpoint to handle all agent tasks."""
-    print("\n--- NEW REQUEST RECEIVED ---")
-    
-    agent_type = request.form.get('agent_type')
-    json_data_string = request.form.get('json_data', '{}')
-    
+@app.errorhandler(LLMOverloadedError)
+@app.errorhandler(JobQueueFullError)
+@app.errorhandler(StageOverloadedError)
+def handle_llm_overloaded(e):
+    """Work shed by the LLM scheduler, the job queue or a full model stage is reported as a retryable 503."""
+    response = jsonify({"error": str(e)})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+class InvalidRequestError(Exception):
+    """Raised while parsing a request; reported to the client as a 400."""
+
+@app.errorhandler(InvalidRequestError)
+def handle_invalid_request(e):
+    return jsonify({"error": str(e)}), 400
+
+# --- REQUEST PIPELINE ---
+def parse_request():
+    """
+    Reads the form fields and processes the uploaded file, if any.
+    Returns (agent_type, data, processed_file_data, upload).
+    """
+    agent_type, data, upload = read_request()
+    return agent_type, data, process_upload(upload), upload
+
+def read_request():
+    """
+    Reads the form fields and the uploaded file, if any, without processing it.
+    Returns (agent_type, data, upload).
+    """
+    agent_type, data = parse_fields(request.form.get('agent_type'), request.form.get('json_data', '{}'))
+
+    upload = None
+    if 'file' in request.files and request.files['file'].filename != '':
+        file = request.files['file']
+        upload = accept_upload(file.filename, file.stream)
+
+    return agent_type, data, upload
+
+def parse_fields(agent_type: str, json_data_string: str):
+    """Validates the agent type and parses the JSON form field. Returns (agent_type, data)."""
     print(f"Agent Type Received: {agent_type}")
     print(f"JSON Data String Received: {json_data_string}")
 
     try:
         data = json.loads(json_data_string)
     except json.JSONDecodeError:
-        return jsonify({"error": "Invalid JSON data provided in the form."}), 400
+        raise InvalidRequestError("Invalid JSON data provided in the form.")
 
-    file_path = None
-    processed_file_data = None
-    if 'file' in request.files and request.files['file'].filename != '':
-        file = request.files['file']
-        if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            upload_subfolder = os.path.join(app.config['UPLOAD_FOLDER'], agent_type)
-            os.makedirs(upload_subfolder, exist_ok=True)
-            file_path = os.path.join(upload_subfolder, filename)
-            file.save(file_path)
-
-            print(f"File '{filename}' saved. Processing...")
-            ext = filename.rsplit('.', 1)[1].lower()
-            
-            if ext == 'pdf':
-                processed_file_data = process_pdf(file_path)
-            elif ext in {'png', 'jpg', 'jpeg'}:
-                processed_file_data = process_image(file_path)
-            elif ext in {'xlsx', 'xls', 'csv'}:
-                processed_file_data = process_spreadsheet(file_path)
-        else:
-            return jsonify({"error": "File type not allowed."}), 400
+    if agent_type not in AGENT_TYPES:
+        raise InvalidRequestError(f"Unknown agent_type: {agent_type}")
+    return agent_type, data
 
-    # --- AGENT 1: ANALYSIS ---
-    agent1_result = {}
+def accept_upload(filename: str, stream) -> Upload:
+    """Reads an uploaded file from its stream. Raises InvalidRequestError for disallowed types."""
+    if not allowed_file(filename):
+        raise InvalidRequestError("File type not allowed.")
+    upload = upload_store.accept(secure_filename(filename), stream)
+    print(f"File '{upload.filename}' received ({upload.size} bytes, {'spilled to disk' if upload.path else 'in memory'}).")
+    return upload
+
+def process_upload(upload: Upload) -> dict:
+    """Extracts text/records from an upload (OCR, NER, spreadsheet parsing). Returns None without a file."""
+    if upload is None:
+        return None
+    print(f"Processing '{upload.filename}'...")
+    ext = upload.ext
+    if ext == 'pdf':
+        kind, processor = 'pdf', process_pdf
+    elif ext in {'png', 'jpg', 'jpeg'}:
+        kind, processor = 'image', process_image
+    elif ext in {'xlsx', 'xls', 'csv'}:
+        return process_spreadsheet(upload.source, upload.filename)
+
+    # Re-uploads of the same report (patient, then doctor, then a page refresh) skip OCR and NER.
+    cached = document_cache.get(kind, upload.digest)
+    if cached is not None:
+        print("Processed document served from cache.")
+        return {**cached, "source_file": upload.filename}
+    start_time = time.perf_counter()
+    result = processor(upload.source, upload.filename)
+    if "error" not in result:
+        document_cache.put(kind, upload.digest, result, time.perf_counter() - start_time)
+    return result
+
+def run_agent_1(agent_type: str, data: dict, processed_file_data: dict, upload: Upload, on_chunk=None,
+                lab_findings: list = None) -> dict:
+    """Runs the rule engine and the requested Agent 1 skill. `on_chunk` receives streamed LLM text."""
     print(f"Routing to agent: {agent_type}")
     
     if agent_type == 'drug_safety':
         medications = data.get('medications', [])
         safety_alerts = rule_engine.run_all_checks(drug_names=medications)
-        agent1_result = gemini_agent_1.run_drug_safety_agent(data, safety_alerts)
+        return gemini_agent_1.run_drug_safety_agent(data, safety_alerts, on_chunk=on_chunk)
     elif agent_type == 'translator':
         text_content = processed_file_data.get('cleaned_text', '') if processed_file_data else ''
-        agent1_result = gemini_agent_1.run_translator_agent(text_content=text_content, image_path=file_path)
+        ocr_confidence = processed_file_data.get('ocr_confidence') if processed_file_data else None
+        return gemini_agent_1.run_translator_agent(text_content=text_content, upload=upload, on_chunk=on_chunk,
+                                                   lab_findings=lab_findings, ocr_confidence=ocr_confidence)
     elif agent_type == 'symptom_triage':
         symptom_text = data.get('symptoms', '')
         red_flag_alerts = rule_engine.run_all_checks(symptom_text=symptom_text)
-        agent1_result = gemini_agent_1.run_symptom_triage_agent(data, red_flag_alerts)
+        return gemini_agent_1.run_symptom_triage_agent(data, red_flag_alerts, on_chunk=on_chunk)
     elif agent_type == 'chronic_care':
         records = processed_file_data.get('records', []) if processed_file_data else []
-        agent1_result = gemini_agent_1.run_chronic_care_agent(records)
+        if not records and data.get('patient_id'):
+            # No upload: analyze the state built from the patient's streamed device readings.
+            summary = vitals_store.summary(str(data['patient_id']))
+            if summary is None:
+                raise InvalidRequestError(f"No vitals readings have been ingested for patient {data['patient_id']}.")
+            return gemini_agent_1.run_chronic_care_agent([], on_chunk=on_chunk, summary=summary)
+        return gemini_agent_1.run_chronic_care_agent(records, on_chunk=on_chunk)
     elif agent_type == 'doctors_copilot':
         note = data.get('note', '')
-        agent1_result = gemini_agent_1.run_doctors_copilot_agent(note)
-    else:
-        return jsonify({"error": f"Unknown agent_type: {agent_type}"}), 400
+        return gemini_agent_1.run_doctors_copilot_agent(note, on_chunk=on_chunk)
+
+def build_chart_series(agent_type: str, data: dict, processed_file_data: dict) -> dict:
+    """
+    Chart-ready, downsampled vitals series for chronic care uploads, so the frontend can
+    plot long logs without re-parsing the file. Returns None for other agents.
+    """
+    records = processed_file_data.get('records') if processed_file_data else None
+    if agent_type != 'chronic_care' or not records:
+        return None
+    try:
+        max_points = int(data.get('chart_max_points', DEFAULT_MAX_POINTS))
+        return chart_series(records, max_points=max_points, method=data.get('chart_method', 'lttb'))
+    except ValueError as e:
+        raise InvalidRequestError(str(e))
+
+def build_lab_findings(agent_type: str, processed_file_data: dict) -> list:
+    """
+    Lab results parsed and flagged locally from a translator upload's text, so the client can
+    show key findings before the LLM responds. Returns None for other agents or non-lab documents.
+    """
+    text = processed_file_data.get('cleaned_text') if processed_file_data else None
+    if agent_type != 'translator' or not text:
+        return None
+    return parse_lab_report(text) or None
+
+def evaluate_agent1(agent1_result: dict, defer_evaluation: bool) -> dict:
+    """
+    Runs Agent 2 on the analysis. With defer_evaluation the review runs in the background and
+    a ticket is returned instead, unless the output is safety-critical, in which case it is
+    always reviewed before returning.
+    """
+    if defer_evaluation and not requires_synchronous_review(agent1_result):
+        ticket_id = evaluation_queue.submit(agent1_result)
+        print(f"Agent 2 evaluation deferred (ticket {ticket_id}).")
+        return {
+            "status": "pending",
+            "ticket_id": ticket_id,
+            "poll_url": f"/api/evaluations/{ticket_id}",
+            "events_url": f"/api/evaluations/{ticket_id}/events",
+        }
+    print("Passing Agent 1 output to Agent 2 for evaluation...")
+    return evaluation_agent_2.evaluate_output(agent1_result)
+
+def wait_for_stages(fn, *args, **kwargs):
+    """
+    Calls fn, sleeping out StageOverloadedError for up to JOB_STAGE_WAIT_SECONDS: a job was
+    already accepted, so it waits for stage capacity instead of failing at once.
+    """
+    deadline = time.monotonic() + JOB_STAGE_WAIT_SECONDS
+    while True:
+        try:
+            return fn(*args, **kwargs)
+        except StageOverloadedError as e:
+            if time.monotonic() + e.retry_after > deadline:
+                raise
+            time.sleep(e.retry_after)
+
+def run_job(job: dict, report) -> dict:
+    """Executes a submitted job's stages on a JobQueue worker; the result matches /api/unified_analysis."""
+    agent_type, request_data = job["agent_type"], job["request"]
+    data, file_path = request_data["data"], request_data["file_path"]
+    upload = load_upload(file_path, request_data.get("filename")) if file_path else None
+
+    report("extraction")
+    processed_file_data = wait_for_stages(process_upload, upload)
+    result = {}
+    chart = build_chart_series(agent_type, data, processed_file_data)
+    if chart is not None:
+        result["chart_series"] = chart
+    lab_findings = build_lab_findings(agent_type, processed_file_data)
+    if lab_findings is not None:
+        result["lab_findings"] = lab_findings
+
+    report("agent1_analysis", result)
+    # Retrieval in Agent 1 uses the embedding stage.
+    result["agent1_analysis"] = wait_for_stages(run_agent_1, agent_type, data, processed_file_data, upload,
+                                                lab_findings=lab_findings)
+
+    report("agent2_evaluation", {"agent1_analysis": result["agent1_analysis"]})
+    result["agent2_evaluation"] = evaluate_agent1(result["agent1_analysis"], request_data["defer_evaluation"])
+    print(f"--- JOB {job['job_id']} COMPLETED ---")
+    return result
+
+job_queue = JobQueue(run_job)  # Persistent, bounded; see /api/jobs
+
+# --- API ENDPOINTS ---
+@app.route('/api/unified_analysis', methods=['POST'])
+def unified_analysis():
+    """Single endpoint to handle all agent tasks."""
+    print("\n--- NEW REQUEST RECEIVED ---")
+    agent_type, data, processed_file_data, upload = parse_request()
+    chart = build_chart_series(agent_type, data, processed_file_data)
+    lab_findings = build_lab_findings(agent_type, processed_file_data)
+
+    # --- AGENT 1: ANALYSIS ---
+    agent1_result = run_agent_1(agent_type, data, processed_file_data, upload, lab_findings=lab_findings)
     
     # --- AGENT 2: EVALUATION ---
-    print("Passing Agent 1 output to Agent 2 for evaluation...")
-    agent2_evaluation = evaluation_agent_2.evaluate_output(agent1_result)
+    defer_evaluation = request.form.get('defer_evaluation', 'false').lower() == 'true'
+    agent2_evaluation = evaluate_agent1(agent1_result, defer_evaluation)
 
     # --- FINAL RESPONSE ---
     final_response = {
         "agent1_analysis": agent1_result,
         "agent2_evaluation": agent2_evaluation
     }
+    if chart is not None:
+        final_response["chart_series"] = chart
+    if lab_findings is not None:
+        final_response["lab_findings"] = lab_findings
 
     print("--- REQUEST COMPLETED SUCCESSFULLY ---")
     return jsonify(final_response)
 
+@app.route('/api/unified_analysis/stream', methods=['POST'])
+def unified_analysis_stream():
+    """
+    Streaming variant of /api/unified_analysis. Responds with NDJSON events:
+    {"event": "token", "text": ...} as Agent 1 generates (preceded by "chart_series"
+    for chronic care uploads and "lab_findings" for lab reports), then "agent1_analysis",
+    "agent2_evaluation" and finally "done" (or "error").
+    """
+    print("\n--- NEW STREAMING REQUEST RECEIVED ---")
+    agent_type, data, processed_file_data, upload = parse_request()
+    events = queue.Queue()
+    chart = build_chart_series(agent_type, data, processed_file_data)
+    if chart is not None:
+        # The chart doesn't depend on the LLM, so it is sent before the first token.
+        events.put({"event": "chart_series", "data": chart})
+    lab_findings = build_lab_findings(agent_type, processed_file_data)
+    if lab_findings is not None:
+        # Parsed and flagged locally, so key findings can be shown before the LLM responds.
+        events.put({"event": "lab_findings", "data": lab_findings})
+
+    def run_pipeline():
+        try:
+            agent1_result = run_agent_1(
+                agent_type, data, processed_file_data, upload,
+                on_chunk=lambda text: events.put({"event": "token", "text": text}),
+                lab_findings=lab_findings,
+            )
+            events.put({"event": "agent1_analysis", "data": agent1_result})
+            print("Passing Agent 1 output to Agent 2 for evaluation...")
+            events.put({"event": "agent2_evaluation", "data": evaluation_agent_2.evaluate_output(agent1_result)})
+            events.put({"event": "done"})
+        except Exception as e:
+            print(f"Error in streaming pipeline: {e}")
+            events.put({"event": "error", "error": str(e)})
+
+    def generate():
+        # The agents run in a worker thread so tokens can be flushed while Gemini is still generating.
+        threading.Thread(target=run_pipeline, daemon=True).start()
+        while True:
+            event = events.get()
+            yield json.dumps(event) + "\n"
+            if event["event"] in ("done", "error"):
+                print("--- STREAMING REQUEST COMPLETED ---")
+                return
+
+    return Response(generate(), mimetype='application/x-ndjson', headers={'X-Accel-Buffering': 'no'})
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """
+    Asynchronous variant of /api/unified_analysis: stores the upload, queues the job and
+    responds 202 with its id. Poll GET /api/jobs/<job_id> for progress and the result.
+    """
+    print("\n--- NEW JOB RECEIVED ---")
+    agent_type, data, upload = read_request()
+    defer_evaluation = request.form.get('defer_evaluation', 'false').lower() == 'true'
+    # Queued jobs survive a restart, so their uploads wait in the store rather than in memory.
+    job_id = job_queue.submit(agent_type, {
+        "data": data,
+        "file_path": upload_store.persist(upload) if upload else None,
+        "filename": upload.filename if upload else None,
+        "defer_evaluation": defer_evaluation,
+    })
+    print(f"Job {job_id} queued.")
+    response = jsonify({"job_id": job_id, "status": "queued", "poll_url": f"/api/jobs/{job_id}"})
+    response.status_code = 202
+    response.headers['Location'] = f"/api/jobs/{job_id}"
+    return response
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Returns a job's status, per-stage progress and (partial) result."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown or expired job: {job_id}"}), 404
+    return jsonify(job)
+
+@app.route('/api/evaluations/<ticket_id>', methods=['GET'])
+def get_evaluation(ticket_id):
+    """Polls a deferred Agent 2 evaluation."""
+    ticket = evaluation_queue.get(ticket_id)
+    if ticket is None:
+        return jsonify({"error": f"Unknown or expired evaluation ticket: {ticket_id}"}), 404
+    return jsonify(ticket)
+
+@app.route('/api/evaluations/<ticket_id>/events', methods=['GET'])
+def evaluation_events(ticket_id):
+    """Server-sent events: pushes the deferred evaluation once it is ready."""
+    if evaluation_queue.get(ticket_id) is None:
+        return jsonify({"error": f"Unknown or expired evaluation ticket: {ticket_id}"}), 404
+
+    def generate():
+        while True:
+            ticket = evaluation_queue.wait(ticket_id, timeout=15)
+            if ticket is None or ticket["status"] != "pending":
+                yield f"event: evaluation\ndata: {json.dumps(ticket)}\n\n"
+                return
+            yield ": keep-alive\n\n"
+
+    return Response(generate(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# --- VITALS INGEST ENDPOINTS ---
+@app.route('/api/vitals/<patient_id>/readings', methods=['POST'])
+def ingest_vitals(patient_id):
+    """
+    Accepts device readings as JSON: one {"date": ..., "systolic": ..., "diastolic": ..., "glucose": ...}
+    object, or {"readings": [...]}. Each reading updates the patient's state in O(1).
+    """
+    payload = request.get_json(silent=True)
+    if payload is None:
+        raise InvalidRequestError("Request body must be JSON.")
+    readings = payload.get('readings', [payload]) if isinstance(payload, dict) else payload
+    if not isinstance(readings, list) or not all(isinstance(r, dict) for r in readings):
+        raise InvalidRequestError("Expected a reading object or {\"readings\": [...]}.")
+    try:
+        accepted = vitals_store.ingest(patient_id, readings)
+    except ValueError as e:
+        raise InvalidRequestError(str(e))
+    return jsonify({"patient_id": patient_id, "accepted": accepted})
+
+@app.route('/api/vitals/<patient_id>', methods=['GET'])
+def get_vitals(patient_id):
+    """Returns the patient's precomputed vitals summary."""
+    summary = vitals_store.summary(patient_id)
+    if summary is None:
+        return jsonify({"error": f"No vitals readings have been ingested for patient {patient_id}."}), 404
+    return jsonify({"patient_id": patient_id, "summary": summary})
+
+# --- METRICS ENDPOINT ---
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Exposes runtime statistics of the caching and performance layers."""
+    return jsonify({
+        "semantic_cache": gemini_agent_1.triage_cache.stats() if gemini_agent_1.triage_cache else None,
+        "guideline_index": gemini_agent_1.guidelines.stats() if gemini_agent_1.guidelines else None,
+        "translation_cache": gemini_agent_1.translation_cache.stats(),
+        "llm_client": llm_client.stats(),
+        "evaluation_queue": evaluation_queue.stats(),
+        "job_queue": job_queue.stats(),
+        "stage_executors": stage_executor.stats(),
+        "pre_evaluator": evaluation_agent_2.pre_evaluator.stats(),
+        "evaluation_cache": evaluation_cache.stats(),
+        "document_cache": document_cache.stats(),
+        "upload_store": upload_store.stats(),
+        "vitals_store": vitals_store.stats(),
+        "structured_output": {
+            "agent_1": gemini_agent_1.structured.stats(),
+            "agent_2": evaluation_agent_2.structured.stats(),
+        }
+    })
+
 if __name__ == '__main__':
     app.run(debug=True, port=5001)
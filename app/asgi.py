@@ -0,0 +1,160 @@
+# File: app/asgi.py
+#
+# ASGI implementation of the unified analysis API, for serving concurrent load:
+#
+#   cd app && gunicorn -c gunicorn_conf.py asgi:application     # prefork workers sharing model weights
+#   cd app && uvicorn asgi:application --port 5001               # single process
+#
+# The analysis endpoints are native coroutines. The extraction stages (spreadsheet parsing,
+# chart downsampling, lab parsing, and OCR/NER, which block on their own process pools in
+# stage_executor.py) run on a CPU executor; the LLM-bound stages (retrieval and Gemini calls)
+# are awaited on a wide IO executor, so slow model calls never block the event loop or queue
+# behind OCR. The remaining routes (jobs, evaluations, vitals, metrics) are served by the
+# Flask app, mounted underneath.
+
+import os
+import json
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route, Mount
+
+import app as pipeline
+from app import InvalidRequestError
+from job_queue import JobQueueFullError
+from llm_scheduler import LLMOverloadedError
+from stage_executor import StageOverloadedError
+
+# --- CONFIGURATION ---
+# Extraction threads mostly wait on the model stage pools, which bound and shed their own queues;
+# this must exceed the OCR stage's MAX_PENDING or its backpressure can never trigger.
+CPU_WORKERS = int(os.getenv("ASGI_CPU_WORKERS", "16"))
+# The LLM-bound stages mostly wait on the network; this caps in-flight analyses per process.
+IO_WORKERS = int(os.getenv("ASGI_IO_WORKERS", "64"))
+
+cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="asgi-cpu")
+io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="asgi-io")
+
+
+async def run_cpu(fn, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(cpu_executor, functools.partial(fn, *args, **kwargs))
+
+async def run_io(fn, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(io_executor, functools.partial(fn, *args, **kwargs))
+
+
+def extract(agent_type: str, data: dict, upload):
+    """The CPU-bound stages: returns (processed_file_data, chart, lab_findings)."""
+    processed_file_data = pipeline.process_upload(upload)
+    chart = pipeline.build_chart_series(agent_type, data, processed_file_data)
+    lab_findings = pipeline.build_lab_findings(agent_type, processed_file_data)
+    return processed_file_data, chart, lab_findings
+
+async def read_request(request):
+    """
+    Async counterpart of app.read_request: parses the form and reads the upload, if any.
+    Returns (agent_type, data, upload, defer_evaluation).
+    """
+    form = await request.form()
+    agent_type, data = pipeline.parse_fields(form.get('agent_type'), form.get('json_data', '{}'))
+    defer_evaluation = form.get('defer_evaluation', 'false').lower() == 'true'
+
+    upload = None
+    file = form.get('file')
+    if file is not None and getattr(file, 'filename', ''):
+        # The form parser spools the file; reading it (and spilling a large one) is blocking IO.
+        upload = await run_io(pipeline.accept_upload, file.filename, file.file)
+    return agent_type, data, upload, defer_evaluation
+
+
+# --- API ENDPOINTS ---
+async def unified_analysis(request):
+    """Same contract as the Flask /api/unified_analysis endpoint."""
+    print("\n--- NEW REQUEST RECEIVED (ASGI) ---")
+    agent_type, data, upload, defer_evaluation = await read_request(request)
+    processed_file_data, chart, lab_findings = await run_cpu(extract, agent_type, data, upload)
+
+    agent1_result = await run_io(pipeline.run_agent_1, agent_type, data, processed_file_data, upload,
+                                 lab_findings=lab_findings)
+    agent2_evaluation = await run_io(pipeline.evaluate_agent1, agent1_result, defer_evaluation)
+
+    final_response = {
+        "agent1_analysis": agent1_result,
+        "agent2_evaluation": agent2_evaluation
+    }
+    if chart is not None:
+        final_response["chart_series"] = chart
+    if lab_findings is not None:
+        final_response["lab_findings"] = lab_findings
+
+    print("--- REQUEST COMPLETED SUCCESSFULLY ---")
+    return JSONResponse(final_response)
+
+async def unified_analysis_stream(request):
+    """Same NDJSON events as the Flask /api/unified_analysis/stream endpoint."""
+    print("\n--- NEW STREAMING REQUEST RECEIVED (ASGI) ---")
+    agent_type, data, upload, _ = await read_request(request)
+    processed_file_data, chart, lab_findings = await run_cpu(extract, agent_type, data, upload)
+
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    if chart is not None:
+        events.put_nowait({"event": "chart_series", "data": chart})
+    if lab_findings is not None:
+        events.put_nowait({"event": "lab_findings", "data": lab_findings})
+
+    async def run_pipeline():
+        try:
+            # Tokens arrive on the IO thread; hand them to the event loop as they come.
+            agent1_result = await run_io(
+                pipeline.run_agent_1, agent_type, data, processed_file_data, upload,
+                on_chunk=lambda text: loop.call_soon_threadsafe(events.put_nowait, {"event": "token", "text": text}),
+                lab_findings=lab_findings,
+            )
+            events.put_nowait({"event": "agent1_analysis", "data": agent1_result})
+            print("Passing Agent 1 output to Agent 2 for evaluation...")
+            evaluation = await run_io(pipeline.evaluation_agent_2.evaluate_output, agent1_result)
+            events.put_nowait({"event": "agent2_evaluation", "data": evaluation})
+            events.put_nowait({"event": "done"})
+        except Exception as e:
+            print(f"Error in streaming pipeline: {e}")
+            events.put_nowait({"event": "error", "error": str(e)})
+
+    async def generate():
+        task = asyncio.create_task(run_pipeline())
+        while True:
+            event = await events.get()
+            yield json.dumps(event) + "\n"
+            if event["event"] in ("done", "error"):
+                await task
+                print("--- STREAMING REQUEST COMPLETED ---")
+                return
+
+    return StreamingResponse(generate(), media_type='application/x-ndjson', headers={'X-Accel-Buffering': 'no'})
+
+
+# --- ERROR HANDLERS ---
+async def handle_invalid_request(request, e):
+    return JSONResponse({"error": str(e)}, status_code=400)
+
+async def handle_overloaded(request, e):
+    """Work shed by the LLM scheduler, the job queue or a full model stage is reported as a retryable 503."""
+    return JSONResponse({"error": str(e)}, status_code=503, headers={'Retry-After': str(e.retry_after)})
+
+
+application = Starlette(
+    routes=[
+        Route('/api/unified_analysis', unified_analysis, methods=['POST']),
+        Route('/api/unified_analysis/stream', unified_analysis_stream, methods=['POST']),
+        Mount('/', app=WSGIMiddleware(pipeline.app)),
+    ],
+    exception_handlers={
+        InvalidRequestError: handle_invalid_request,
+        LLMOverloadedError: handle_overloaded,
+        JobQueueFullError: handle_overloaded,
+        StageOverloadedError: handle_overloaded,
+    },
+)
@@ -0,0 +1,192 @@
+# File: app/batch_evaluate.py
+#
+# Re-scores stored Agent 1 outputs with the current EvaluationAgent rubric.
+#
+#   python batch_evaluate.py outputs.jsonl scores.parquet --concurrency 4 --pack-size 4
+#   python batch_evaluate.py outputs.jsonl scores.parquet --fake-model   # local throughput check
+#
+# Each input line is either an Agent 1 output, or {"id": ..., "agent1_analysis": {...}}.
+# Finished scores are appended to '<output>.checkpoint.jsonl' as they complete, so an
+# interrupted run resumes where it stopped; the columnar file is written at the end.
+# Failed evaluations are reported in it but not checkpointed, so the next run retries them.
+
+import os
+import json
+import time
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import pandas as pd
+from dotenv import load_dotenv
+
+from evaluation_agent import EvaluationAgent, RUBRIC_VERSION
+from pre_evaluator import requires_synchronous_review
+from llm_client import LLMClient
+from llm_scheduler import LLMScheduler, LocalRateBudget, SQLiteRateBudget, LLMOverloadedError
+from fake_llm import FakeGenerativeModel
+
+# --- CONFIGURATION ---
+MAX_PACKED_CHARS = 12000  # Upper bound on the serialized size of one packed prompt's outputs.
+CRITERIA = ["Clarity", "Actionability", "Safety", "Completeness"]
+
+
+# --- 1. LOADING AND PACKING ---
+
+def load_outputs(input_path: str) -> list[tuple[str, dict]]:
+    items = []
+    with open(input_path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "agent1_analysis" in record:
+                items.append((str(record.get("id", f"line-{line_number}")), record["agent1_analysis"]))
+            else:
+                items.append((f"line-{line_number}", record))
+    return items
+
+def pack_outputs(items: list[tuple[str, dict]], pack_size: int) -> list[list[tuple[str, dict]]]:
+    """
+    Groups outputs into packs for one prompt each. Safety-critical and oversized outputs
+    are always reviewed alone so they get the reviewer's full attention.
+    """
+    packs, current, current_chars = [], [], 0
+    for item_id, output in items:
+        size = len(json.dumps(output))
+        if pack_size <= 1 or requires_synchronous_review(output) or size > MAX_PACKED_CHARS // 2:
+            packs.append([(item_id, output)])
+            continue
+        if current and (len(current) >= pack_size or current_chars + size > MAX_PACKED_CHARS):
+            packs.append(current)
+            current, current_chars = [], 0
+        current.append((item_id, output))
+        current_chars += size
+    if current:
+        packs.append(current)
+    return packs
+
+
+# --- 2. CHECKPOINTING ---
+
+def load_checkpoint(checkpoint_path: str) -> dict:
+    done = {}
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    # Failures written by older versions of this script are rescored too.
+                    if row.get("rubric_version") == RUBRIC_VERSION and not row.get("error"):
+                        done[row["id"]] = row
+    return done
+
+def to_row(item_id: str, evaluation: dict) -> dict:
+    scores = {d.get("criterion"): d.get("score") for d in evaluation.get("evaluation_details", []) if isinstance(d, dict)}
+    return {
+        "id": item_id,
+        "rubric_version": RUBRIC_VERSION,
+        "overall_quality_score": evaluation.get("overall_quality_score"),
+        **{criterion.lower(): scores.get(criterion) for criterion in CRITERIA},
+        "final_recommendation": evaluation.get("final_recommendation"),
+        "error": evaluation.get("error"),
+    }
+
+
+# --- 3. EVALUATION ---
+
+def evaluate_pack(agent: EvaluationAgent, pack: list[tuple[str, dict]]) -> list[dict]:
+    """Scores one pack, retrying shed requests and falling back to one-by-one for anything the model dropped."""
+    while True:
+        try:
+            results = agent.evaluate_batch(pack) if len(pack) > 1 else {}
+            rows = [to_row(item_id, results[item_id]) for item_id, _ in pack if item_id in results]
+            for item_id, output in pack:
+                if item_id not in results:
+                    rows.append(to_row(item_id, agent.evaluate_batch([(item_id, output)]).get(
+                        item_id, {"error": "Failed to get a valid evaluation from the AI model."})))
+            return rows
+        except LLMOverloadedError as e:
+            time.sleep(e.retry_after)
+
+def run_batch(agent: EvaluationAgent, items: list, output_path: str, concurrency: int, pack_size: int) -> dict:
+    checkpoint_path = output_path + ".checkpoint.jsonl"
+    done = load_checkpoint(checkpoint_path)
+    pending = [(item_id, output) for item_id, output in items if item_id not in done]
+    packs = pack_outputs(pending, pack_size)
+    print(f"{len(items)} outputs, {len(done)} already scored, {len(pending)} to score in {len(packs)} prompts.")
+
+    write_lock = threading.Lock()
+    start = time.perf_counter()
+    scored = failed = 0
+    with open(checkpoint_path, 'a', encoding='utf-8') as checkpoint, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(evaluate_pack, agent, pack) for pack in packs]
+        for future in as_completed(futures):
+            rows = future.result()
+            with write_lock:
+                for row in rows:
+                    if row["error"]:
+                        failed += 1
+                    else:
+                        checkpoint.write(json.dumps(row) + "\n")
+                    done[row["id"]] = row
+                checkpoint.flush()
+                scored += len(rows)
+            elapsed = time.perf_counter() - start
+            print(f"  scored {scored}/{len(pending)} ({scored / elapsed * 60:.1f} evaluations/min)")
+    elapsed = time.perf_counter() - start
+
+    pd.DataFrame([done[item_id] for item_id, _ in items if item_id in done]).to_parquet(output_path, index=False)
+    print(f"Scores written to: {output_path}")
+    if failed:
+        print(f"{failed} evaluations failed; run again to retry them.")
+    return {
+        "scored": scored,
+        "failed": failed,
+        "prompts": len(packs),
+        "seconds": round(elapsed, 2),
+        "evaluations_per_minute": round(scored / elapsed * 60, 1) if elapsed else None,
+    }
+
+
+# --- 4. FAKE MODEL FOR LOCAL THROUGHPUT CHECKS ---
+
+def fake_reviewer(contents) -> str:
+    """Answers batch evaluation prompts with plausible scores for every packed id."""
+    parts = contents if isinstance(contents, (list, tuple)) else [contents]
+    section = "\n".join(str(p) for p in parts).split("Agent 1 outputs to evaluate (JSON array):", 1)[1]
+    packed, _ = json.JSONDecoder().raw_decode(section[section.index("["):])
+    return json.dumps([{
+        "id": item["id"],
+        "overall_quality_score": 4.0,
+        "evaluation_details": [{"criterion": c, "score": 4, "justification": "Fake reviewer."} for c in CRITERIA],
+        "final_recommendation": "The output is safe and clear for patient use.",
+    } for item in packed])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-score stored Agent 1 outputs with the current evaluation rubric.")
+    parser.add_argument("input_path", type=str, help="JSONL file of Agent 1 outputs.")
+    parser.add_argument("output_path", type=str, help="Parquet file to write the scores to.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum number of prompts in flight.")
+    parser.add_argument("--pack-size", type=int, default=4, help="Maximum outputs packed into one prompt (1 disables packing).")
+    parser.add_argument("--rpm", type=int, default=60, help="Requests-per-minute budget.")
+    parser.add_argument("--tpm", type=int, default=1000000, help="Tokens-per-minute budget.")
+    parser.add_argument("--rate-db", type=str, default="", help="SQLite file to share the rate budget with the running server.")
+    parser.add_argument("--fake-model", action="store_true", help="Use a local fake model (for throughput measurements).")
+    args = parser.parse_args()
+
+    load_dotenv()
+    budget = SQLiteRateBudget(args.rate_db, args.rpm, args.tpm) if args.rate_db else LocalRateBudget(args.rpm, args.tpm)
+    # Offline jobs queue deliberately, so they are never shed.
+    scheduler = LLMScheduler(budget=budget, shed_queue_depth=float("inf"))
+    api_key = "offline" if args.fake_model else os.getenv("GOOGLE_API_KEY")
+    model_factory = None
+    if args.fake_model:
+        rng = random.Random(0)
+        model_factory = lambda name: FakeGenerativeModel(latency_sampler=lambda: rng.lognormvariate(0, 0.3) * 0.5, responder=fake_reviewer)
+    llm_client = LLMClient(api_key=api_key, scheduler=scheduler, model_factory=model_factory)
+
+    agent = EvaluationAgent(api_key=api_key, llm_client=llm_client)
+    summary = run_batch(agent, load_outputs(args.input_path), args.output_path, args.concurrency, args.pack_size)
+    print(f"Rubric {RUBRIC_VERSION}: {summary}")
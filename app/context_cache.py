@@ -0,0 +1,113 @@
+import os
+import time
+import hashlib
+import datetime
+import threading
+import google.generativeai as genai
+from google.generativeai import caching
+from singleflight import SingleFlight
+
+# --- CONFIGURATION ---
+CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "3600"))
+# Gemini rejects cached contents below a per-model minimum size; shorter prefixes are sent inline.
+CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("CONTEXT_CACHE_MIN_TOKENS", "4096"))
+REFRESH_MARGIN_SECONDS = 60  # Re-create a cache this long before the provider expires it.
+LATENCY_WINDOW = 1000
+
+
+def gemini_cache_factory(model_name: str, system_prompt: str, ttl_seconds: int):
+    """Creates a Gemini CachedContent holding `system_prompt` and returns a model bound to it."""
+    cached_content = caching.CachedContent.create(
+        model=model_name,
+        system_instruction=system_prompt,
+        ttl=datetime.timedelta(seconds=ttl_seconds),
+    )
+    return genai.GenerativeModel.from_cached_content(cached_content=cached_content)
+
+
+def _p50(values: list):
+    if not values:
+        return None
+    return round(sorted(values)[len(values) // 2] * 1000, 2)
+
+
+class ContextCache:
+    """
+    Keeps each agent's static instruction block (its system prompt) in the provider's
+    context cache, so per-request calls only send the variable suffix.
+    `cache_factory(model_name, system_prompt, ttl_seconds)` returns a model bound to the
+    cached prefix; pass fake_llm.fake_cache_factory for local runs.
+    """
+    def __init__(self, cache_factory=None, ttl_seconds: int = CONTEXT_CACHE_TTL_SECONDS,
+                 min_tokens: int = CONTEXT_CACHE_MIN_TOKENS):
+        self.cache_factory = cache_factory or gemini_cache_factory
+        self.ttl_seconds = ttl_seconds
+        self.min_tokens = min_tokens
+        self._models = {}  # (model_name, prefix hash) -> (model or None, expires_at)
+        self._singleflight = SingleFlight()
+        self._lock = threading.Lock()
+
+        # --- Metrics ---
+        self._agents = {}
+
+    def lookup(self, model_name: str, system_prompt: str, prefix_tokens: int):
+        """
+        Returns a model bound to the cached `system_prompt`, or None when the prefix is too
+        short to cache or the provider refused it (the caller then sends the prefix inline).
+        """
+        if prefix_tokens < self.min_tokens:
+            return None
+        key = (model_name, hashlib.sha256(system_prompt.encode('utf-8')).hexdigest())
+        with self._lock:
+            entry = self._models.get(key)
+        if entry is not None and entry[1] > time.time():
+            return entry[0]
+        # Concurrent first calls for the same prefix share a single cache creation.
+        return self._singleflight.do(f"{key[0]}:{key[1]}", lambda: self._create(key, model_name, system_prompt))
+
+    def _create(self, key: tuple, model_name: str, system_prompt: str):
+        try:
+            model = self.cache_factory(model_name, system_prompt, self.ttl_seconds)
+            expires_at = time.time() + self.ttl_seconds - REFRESH_MARGIN_SECONDS
+        except Exception as e:
+            # Remember the refusal for a TTL so every call doesn't retry it.
+            print(f"[context-cache] Could not cache prompt prefix for {model_name}; sending it inline. Error: {e}")
+            model, expires_at = None, time.time() + self.ttl_seconds
+        with self._lock:
+            self._models[key] = (model, expires_at)
+        return model
+
+    def record(self, agent: str, cached: bool, prefix_tokens: int, input_tokens: int, seconds: float):
+        """Records one call's prompt size and latency, split by whether the prefix was served from cache."""
+        with self._lock:
+            stats = self._agents.setdefault(agent, {
+                "calls": 0, "cached_calls": 0, "input_tokens": 0, "input_tokens_saved": 0,
+                "cached_latencies": [], "inline_latencies": [],
+            })
+            stats["calls"] += 1
+            stats["input_tokens"] += input_tokens
+            latencies = stats["cached_latencies"] if cached else stats["inline_latencies"]
+            if cached:
+                stats["cached_calls"] += 1
+                stats["input_tokens_saved"] += prefix_tokens
+            latencies.append(seconds)
+            if len(latencies) > LATENCY_WINDOW:
+                del latencies[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "cached_prefixes": sum(1 for model, _ in self._models.values() if model is not None),
+                "agents": {
+                    agent: {
+                        "calls": s["calls"],
+                        "cached_calls": s["cached_calls"],
+                        "input_tokens_sent": s["input_tokens"] - s["input_tokens_saved"],
+                        "input_tokens_saved": s["input_tokens_saved"],
+                        "input_token_reduction": s["input_tokens_saved"] / s["input_tokens"] if s["input_tokens"] else 0.0,
+                        "p50_cached_ms": _p50(s["cached_latencies"]),
+                        "p50_inline_ms": _p50(s["inline_latencies"]),
+                    }
+                    for agent, s in self._agents.items()
+                },
+            }
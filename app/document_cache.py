@@ -0,0 +1,104 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+# --- CONFIGURATION ---
+DEFAULT_DB_PATH = os.getenv("DOCUMENT_CACHE_PATH", os.path.join("cache", "document_cache.db"))
+DEFAULT_MAX_BYTES = int(os.getenv("DOCUMENT_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+
+class DocumentCache:
+    """
+    Caches processor output (cleaned_text, extracted_data, ...) keyed by the SHA-256 of the
+    uploaded file plus the processor's version, so a re-uploaded report skips OCR and NER.
+    Entries live in SQLite; the least recently used are evicted once the stored results
+    exceed `max_bytes`. Entries written by another version of a processor are dropped at start.
+    """
+    def __init__(self, processor_versions: dict, db_path: str = DEFAULT_DB_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.processor_versions = processor_versions
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        # --- Metrics ---
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.seconds_saved = 0.0
+
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "digest TEXT NOT NULL, processor TEXT NOT NULL, result TEXT NOT NULL, size INTEGER NOT NULL, "
+                "seconds REAL NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (digest, processor))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_last_used ON documents (last_used)")
+            current = [self._processor(kind) for kind in processor_versions]
+            placeholders = ",".join("?" * len(current))
+            self._conn.execute(f"DELETE FROM documents WHERE processor NOT IN ({placeholders})", current)
+        self._bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM documents").fetchone()[0]
+
+    def _processor(self, kind: str) -> str:
+        return f"{kind}:{self.processor_versions[kind]}"
+
+    def get(self, kind: str, digest: str) -> dict:
+        processor = self._processor(kind)
+        with self._lock:
+            row = self._conn.execute("SELECT result, seconds FROM documents WHERE digest = ? AND processor = ?",
+                                     (digest, processor)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            with self._conn:
+                self._conn.execute("UPDATE documents SET last_used = ? WHERE digest = ? AND processor = ?",
+                                   (time.time(), digest, processor))
+            self.hits += 1
+            self.seconds_saved += row[1]
+            return json.loads(row[0])
+
+    def put(self, kind: str, digest: str, result: dict, seconds: float):
+        """Stores a processor result; `seconds` is what producing it took, credited on later hits."""
+        encoded = json.dumps(result)
+        if len(encoded) > self.max_bytes:
+            return
+        with self._lock:
+            with self._conn:
+                previous = self._conn.execute("SELECT size FROM documents WHERE digest = ? AND processor = ?",
+                                              (digest, self._processor(kind))).fetchone()
+                self._conn.execute("INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?)",
+                                   (digest, self._processor(kind), encoded, len(encoded), seconds, time.time()))
+                self._bytes += len(encoded) - (previous[0] if previous else 0)
+                if self._bytes > self.max_bytes:
+                    self._evict()
+
+    def _evict(self):
+        """Deletes least recently used entries until the stored results fit in `max_bytes`."""
+        victims = []
+        for digest, processor, size in self._conn.execute(
+                "SELECT digest, processor, size FROM documents ORDER BY last_used"):
+            if self._bytes <= self.max_bytes:
+                break
+            victims.append((digest, processor))
+            self._bytes -= size
+        self._conn.executemany("DELETE FROM documents WHERE digest = ? AND processor = ?", victims)
+        self.evictions += len(victims)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                "processor_versions": self.processor_versions,
+                "entries": entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "seconds_saved": round(self.seconds_saved, 2),
+            }
@@ -0,0 +1,72 @@
+import os
+import numpy as np
+from vitals_analytics import records_to_frame
+
+# --- CONFIGURATION ---
+DEFAULT_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "500"))
+METHODS = ('lttb', 'minmax')
+MIN_POINTS = {'lttb': 3, 'minmax': 2}  # Fewer can't keep the endpoints (LTTB) or a bucket's min and max.
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: returns the indices of `threshold` points that
+    best preserve the visual shape of the series. Keeps the first and last points.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)  # Buckets over the interior points.
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # The next bucket's average is the third vertex (the last point for the final bucket).
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        areas = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+    return selected
+
+def minmax_buckets(y: np.ndarray, max_points: int) -> np.ndarray:
+    """Returns the indices of each bucket's minimum and maximum, so spikes are never dropped."""
+    n = len(y)
+    if max_points >= n or max_points < 2:
+        return np.arange(n)
+    edges = np.linspace(0, n, max_points // 2 + 1).astype(int)
+    indices = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end > start:
+            bucket = y[start:end]
+            indices += [start + int(np.argmin(bucket)), start + int(np.argmax(bucket))]
+    return np.unique(indices)
+
+def chart_series(records: list, max_points: int = DEFAULT_MAX_POINTS, method: str = 'lttb') -> dict:
+    """
+    Builds a chart-ready, downsampled series per vital sign from a vitals log, capped at
+    `max_points` points each, so the frontend can render multi-year logs without the raw file.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown downsampling method: {method}. Use one of {METHODS}.")
+    if max_points < MIN_POINTS[method]:
+        raise ValueError(f"chart_max_points must be at least {MIN_POINTS[method]} for {method} downsampling.")
+    df = records_to_frame(records)
+    series = {}
+    for metric in df.columns:
+        values = df[metric].dropna()
+        if values.empty:
+            continue
+        x = values.index.to_numpy(dtype='datetime64[ns]').astype(np.int64) / 1e9
+        y = values.to_numpy(dtype=float)
+        keep = lttb(x, y, max_points) if method == 'lttb' else minmax_buckets(y, max_points)
+        series[metric] = {
+            "dates": [timestamp.isoformat() for timestamp in values.index[keep]],
+            "values": np.round(y[keep], 1).tolist(),
+            "original_points": int(len(y)),
+        }
+    return {"method": method, "max_points": max_points, "series": series}
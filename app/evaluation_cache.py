@@ -0,0 +1,118 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+# --- CONFIGURATION ---
+DEFAULT_DB_PATH = os.getenv("EVALUATION_CACHE_PATH", os.path.join("cache", "evaluation_cache.db"))
+DEFAULT_MEMORY_ENTRIES = 1024
+DEFAULT_DISK_ENTRIES = 50000
+PRUNE_EVERY_N_WRITES = 100
+
+
+def canonical_hash(agent1_output: dict) -> str:
+    """SHA-256 of the output's canonical JSON form, so key order and whitespace don't matter."""
+    canonical = json.dumps(agent1_output, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class EvaluationCache:
+    """
+    Caches Agent 2 evaluations keyed by the canonical hash of the Agent 1 output
+    plus the reviewer's rubric version. A bounded in-memory LRU sits in front of a
+    bounded SQLite table; when the rubric version changes, the table is cleared.
+    """
+    def __init__(self, rubric_version: str, db_path: str = DEFAULT_DB_PATH,
+                 memory_entries: int = DEFAULT_MEMORY_ENTRIES, disk_entries: int = DEFAULT_DISK_ENTRIES):
+        self.rubric_version = rubric_version
+        self.db_path = db_path
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self._memory = OrderedDict()
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        # --- Metrics ---
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS evaluations ("
+                "key TEXT PRIMARY KEY, evaluation TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_evaluations_last_used ON evaluations (last_used)")
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'rubric_version'").fetchone()
+            if row is None or row[0] != rubric_version:
+                if row is not None:
+                    print(f"Evaluation rubric changed ({row[0]} -> {rubric_version}); clearing evaluation cache.")
+                self._conn.execute("DELETE FROM evaluations")
+                self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('rubric_version', ?)", (rubric_version,))
+
+    def _key(self, agent1_output: dict) -> str:
+        return f"{self.rubric_version}:{canonical_hash(agent1_output)}"
+
+    def get(self, agent1_output: dict) -> dict:
+        key = self._key(agent1_output)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key]
+
+            row = self._conn.execute("SELECT evaluation FROM evaluations WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            with self._conn:
+                self._conn.execute("UPDATE evaluations SET last_used = ? WHERE key = ?", (time.time(), key))
+            evaluation = json.loads(row[0])
+            self._remember(key, evaluation)
+            self.disk_hits += 1
+            return evaluation
+
+    def put(self, agent1_output: dict, evaluation: dict):
+        key = self._key(agent1_output)
+        with self._lock:
+            self._remember(key, evaluation)
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO evaluations VALUES (?, ?, ?)",
+                    (key, json.dumps(evaluation), time.time()),
+                )
+                # Keep the table bounded by periodically evicting the least recently used rows.
+                self._writes += 1
+                if self._writes % PRUNE_EVERY_N_WRITES == 0:
+                    self._conn.execute(
+                        "DELETE FROM evaluations WHERE key IN ("
+                        "SELECT key FROM evaluations ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                        (self.disk_entries,),
+                    )
+
+    def _remember(self, key: str, evaluation: dict):
+        self._memory[key] = evaluation
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            disk_entries = self._conn.execute("SELECT COUNT(*) FROM evaluations").fetchone()[0]
+            total = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "rubric_version": self.rubric_version,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / total if total else 0.0,
+            }
@@ -0,0 +1,62 @@
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+# --- CONFIGURATION ---
+DEFAULT_MAX_WORKERS = int(os.getenv("EVALUATION_WORKERS", "4"))
+DEFAULT_TICKET_TTL_SECONDS = 60 * 60
+
+
+class EvaluationQueue:
+    """
+    Runs Agent 2 evaluations on a background worker pool.
+    `submit` returns a ticket id immediately; clients poll `get` (or block in `wait`)
+    for the result. Tickets are forgotten `ttl_seconds` after submission.
+    """
+    def __init__(self, evaluate_fn, max_workers: int = DEFAULT_MAX_WORKERS,
+                 ttl_seconds: int = DEFAULT_TICKET_TTL_SECONDS):
+        self.evaluate_fn = evaluate_fn
+        self.ttl_seconds = ttl_seconds
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent2-eval")
+        self._tickets = {}  # ticket id -> (future, submitted_at)
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float):
+        expired = [t for t, (_, submitted_at) in self._tickets.items() if now - submitted_at > self.ttl_seconds]
+        for ticket_id in expired:
+            del self._tickets[ticket_id]
+
+    def submit(self, agent1_result: dict) -> str:
+        ticket_id = uuid.uuid4().hex
+        future = self.executor.submit(self.evaluate_fn, agent1_result)
+        with self._lock:
+            now = time.time()
+            self._prune(now)
+            self._tickets[ticket_id] = (future, now)
+        return ticket_id
+
+    def get(self, ticket_id: str) -> dict:
+        """Returns the ticket's status ('pending' | 'done' | 'error') and result, or None if unknown."""
+        return self.wait(ticket_id, timeout=0)
+
+    def wait(self, ticket_id: str, timeout: float) -> dict:
+        """Like `get`, but blocks up to `timeout` seconds for a pending evaluation to finish."""
+        with self._lock:
+            entry = self._tickets.get(ticket_id)
+        if entry is None:
+            return None
+        future, _ = entry
+        try:
+            result = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            return {"ticket_id": ticket_id, "status": "pending"}
+        except Exception as e:
+            return {"ticket_id": ticket_id, "status": "error", "result": {"error": f"Evaluation failed: {e}"}}
+        return {"ticket_id": ticket_id, "status": "done", "result": result}
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = sum(1 for future, _ in self._tickets.values() if not future.done())
+            return {"tickets": len(self._tickets), "pending": pending}
@@ -0,0 +1,61 @@
+import time
+import random
+
+
+def heavy_tailed_latency(median: float = 0.05, tail_probability: float = 0.05, tail_scale: float = 10.0,
+                         rng: random.Random = None):
+    """
+    Returns a sampler for a heavy-tailed latency distribution: a log-normal body
+    around `median` seconds, plus a Pareto tail hit `tail_probability` of the time.
+    """
+    rng = rng or random.Random(0)
+
+    def sample() -> float:
+        latency = rng.lognormvariate(0, 0.3) * median
+        if rng.random() < tail_probability:
+            latency += median * tail_scale * rng.paretovariate(1.5)
+        return latency
+    return sample
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """
+    A local stand-in for genai.GenerativeModel used by benchmarks and offline jobs.
+    Sleeps for a sampled latency (plus `seconds_per_input_token` of prefill for every
+    uncached prompt token and `seconds_per_output_token` of decoding for every response
+    token) and answers via `responder(contents) -> str`.
+    """
+    def __init__(self, latency_sampler=None, responder=None, seconds_per_input_token: float = 0.0,
+                 seconds_per_output_token: float = 0.0):
+        self.latency_sampler = latency_sampler or heavy_tailed_latency()
+        self.responder = responder or (lambda contents: "{}")
+        self.seconds_per_input_token = seconds_per_input_token
+        self.seconds_per_output_token = seconds_per_output_token
+        self.calls = 0
+
+    def generate_content(self, contents, stream: bool = False, **kwargs):
+        self.calls += 1
+        parts = contents if isinstance(contents, (list, tuple)) else [contents]
+        input_tokens = sum(len(p) // 4 for p in parts if isinstance(p, str))
+        text = self.responder(contents)
+        time.sleep(self.latency_sampler() + input_tokens * self.seconds_per_input_token
+                   + len(text) // 4 * self.seconds_per_output_token)
+        if stream:
+            words = text.split(" ")
+            return [FakeResponse(word if i == 0 else " " + word) for i, word in enumerate(words)]
+        return FakeResponse(text)
+
+
+def fake_cache_factory(model_factory):
+    """
+    A local stand-in for Gemini context caching (see context_cache.ContextCache).
+    The returned models never see the cached prefix, so they only pay prefill for the suffix.
+    """
+    def create(model_name: str, system_prompt: str, ttl_seconds: int):
+        return model_factory(model_name)
+    return create
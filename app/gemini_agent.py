@@ -1,28 +1,57 @@
 import os
+import re
 import faiss
 import json
-import google.generativeai as genai
-from sentence_transformers import SentenceTransformer
 import numpy as np
+import time
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
+from semantic_cache import SemanticCache
+from llm_client import LLMClient, estimate_tokens
+from structured_output import StructuredOutput
+from vitals_analytics import analyze_vitals
+from note_sections import split_sections, split_windows
+from guideline_matcher import load_guideline_index
+from lab_parser import remaining_text
+from stage_executor import PooledEncoder
+from image_preparation import TranslationCache, is_image, perceptual_hash, prepare_image, should_send_image, text_fingerprint, prompt_version
+from agent_prompts import (DRUG_SAFETY_SYSTEM_PROMPT, TRANSLATOR_SYSTEM_PROMPT, TRANSLATOR_FINDINGS_SYSTEM_PROMPT,
+                           CHRONIC_CARE_SYSTEM_PROMPT, COPILOT_SYSTEM_PROMPT,
+                           COPILOT_SECTION_SYSTEM_PROMPT, COPILOT_REDUCE_SYSTEM_PROMPT, COPILOT_MATCHED_SYSTEM_PROMPT)
 
 
 # File: app/gemini_agent.py
 
 # ... (keep the imports) ...
 
+# --- SEMANTIC CACHE CONFIGURATION ---
+TRIAGE_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("TRIAGE_CACHE_SIMILARITY_THRESHOLD", "0.92"))
+TRIAGE_CACHE_TTL_SECONDS = int(os.getenv("TRIAGE_CACHE_TTL_SECONDS", str(6 * 60 * 60)))
+TRIAGE_CACHE_MAX_ENTRIES = int(os.getenv("TRIAGE_CACHE_MAX_ENTRIES", "512"))
+
+# --- MAP-REDUCE COPILOT CONFIGURATION ---
+# Notes at least this long (and with two or more sections) are processed section by section.
+COPILOT_MAP_REDUCE_MIN_TOKENS = int(os.getenv("COPILOT_MAP_REDUCE_MIN_TOKENS", "6000"))
+COPILOT_SECTION_TOP_K = int(os.getenv("COPILOT_SECTION_TOP_K", "3"))
+COPILOT_REDUCE_TOP_K = 5  # Same snippet budget as the single-prompt path.
+COPILOT_MAX_CONCURRENT_SECTIONS = int(os.getenv("COPILOT_MAX_CONCURRENT_SECTIONS", "4"))
+# MiniLM truncates its input at 256 word pieces; clinical text runs ~1.5 pieces per word,
+# which leaves room for the query prefix. Sections are embedded in windows of this many words.
+COPILOT_SECTION_WINDOW_WORDS = int(os.getenv("COPILOT_SECTION_WINDOW_WORDS", "128"))
+
 class GeminiAgent:
-    def __init__(self, api_key, kb_folder="../data/my_final_kb"):
+    def __init__(self, api_key, kb_folder="../data/my_final_kb", llm_client: LLMClient = None):
         """
         Initializes the agent, Gemini model, and loads the local Knowledge Base.
         CORRECTED PATH: Looks one level up for the 'data/my_final_kb' folder.
+        Pass a shared `llm_client` so identical calls from both agents are coalesced.
         """
         if not api_key:
             raise ValueError("Google API Key is missing. Please set it in your .env file.")
         
         # Configure the Gemini API
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
+        self.llm = llm_client or LLMClient(api_key=api_key)
+        self.structured = StructuredOutput(self.llm)
         
         # Load the local vector store for RAG
         print("Loading local Knowledge Base...")
@@ -30,14 +59,36 @@ class GeminiAgent:
             self.index = faiss.read_index(os.path.join(kb_folder, "kb.faiss"))
             with open(os.path.join(kb_folder, "kb_chunks.json"), 'r', encoding='utf-8') as f:
                 self.chunks = json.load(f)
-            self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+            self.embedding_model = PooledEncoder()  # MiniLM, in its own process pool
             print("Knowledge Base loaded successfully.")
         except Exception as e:
             print(f"CRITICAL: Failed to load Knowledge Base. RAG features will be disabled. Error: {e}")
             print(f"--> Please ensure the folder '{kb_folder}' exists and contains 'kb.faiss' and 'kb_chunks.json'.")
             self.index = None
+
+        # Translations of uploaded images, reused for duplicate uploads (by perceptual hash)
+        self.translation_cache = TranslationCache(prompt_version(TRANSLATOR_SYSTEM_PROMPT, TRANSLATOR_FINDINGS_SYSTEM_PROMPT))
+
+        # Atomic guideline recommendations extracted at KB build time (optional)
+        self.guidelines = load_guideline_index(kb_folder)
+
+        # Semantic cache for symptom triage answers (reuses the MiniLM encoder loaded above)
+        self.triage_cache = None
+        if self.index:
+            self.triage_cache = SemanticCache(
+                self.embedding_model,
+                similarity_threshold=TRIAGE_CACHE_SIMILARITY_THRESHOLD,
+                ttl_seconds=TRIAGE_CACHE_TTL_SECONDS,
+                max_entries=TRIAGE_CACHE_MAX_ENTRIES,
+            )
     
     # ... (the rest of the class remains the same) ...
+    def _generate(self, contents, agent: str, on_chunk=None, system_prompt: str = None) -> str:
+        """Calls the LLM, streaming text to `on_chunk` when the caller wants incremental output."""
+        if on_chunk:
+            return self.llm.generate_stream(contents, agent=agent, on_chunk=on_chunk, system_prompt=system_prompt)
+        return self.llm.generate(contents, agent=agent, system_prompt=system_prompt)
+
     def _retrieve_context(self, query: str, top_k: int = 3) -> str:
         """Retrieves relevant context from the local FAISS index."""
         if not self.index:
@@ -49,9 +100,32 @@ class GeminiAgent:
         context = "\n\n".join([self.chunks[i]['content_chunk'] for i in indices[0] if i != -1])
         return context
 
+    def _retrieve_section_snippets(self, sections: dict, top_k: int = 3) -> list:
+        """
+        Retrieves the top-k chunk indices for each section. Every section is cut into windows
+        the embedding model reads in full, all windows are encoded and searched in one batch,
+        and each section keeps its closest chunks across its windows.
+        """
+        if not self.index:
+            return [[] for _ in sections]
+        queries, owners = [], []
+        for position, (name, text) in enumerate(sections.items()):
+            for window in split_windows(text, COPILOT_SECTION_WINDOW_WORDS):
+                queries.append(f"Clinical guidelines related to the following {name} section: {window}")
+                owners.append(position)
+        query_embeddings = self.embedding_model.encode(queries)
+        distances, indices = self.index.search(np.array(query_embeddings), top_k)
+
+        best = [{} for _ in sections]
+        for position, row_distances, row_indices in zip(owners, distances, indices):
+            for distance, i in zip(row_distances, row_indices):
+                if i != -1 and distance < best[position].get(int(i), float("inf")):
+                    best[position][int(i)] = distance
+        return [sorted(hits, key=hits.get)[:top_k] for hits in best]
+
 # ... (keep the rest of the file the same) ...
 
-    def run_drug_safety_agent(self, data: dict, safety_alerts: list) -> dict:
+    def run_drug_safety_agent(self, data: dict, safety_alerts: list, on_chunk=None) -> dict:
         """
         Uses Gemini to interpret rule engine alerts and retrieve general drug info.
         UPDATED: Now falls back to Gemini's general knowledge if local KB is insufficient.
@@ -64,24 +138,20 @@ class GeminiAgent:
             query = f"Provide a brief, patient-friendly description of the drug {med}, including its common use and important considerations."
             context = self._retrieve_context(query)
             
-            # --- NEW, MORE FLEXIBLE PROMPT ---
+            # The instructions are the cached system prompt; only the context and query vary.
             prompt = f"""
-            You are a helpful healthcare assistant. Your task is to answer the user's query about a medication.
-
-            1. First, try to answer the query using ONLY the "Context from local knowledge base" provided below.
-            2. If the context is empty, not relevant, or does not contain the answer, then use your own general knowledge to answer.
-            3. When you use your own general knowledge, you MUST start your response with the phrase "Based on my general knowledge,...".
-
             Context from local knowledge base:
             ---
             {context}
             ---
             User's Query: {query}
             """
-            response = self.model.generate_content(prompt)
+            if on_chunk:
+                on_chunk(f"\n\n**{med}:** ")
+            response_text = self._generate(prompt, agent="drug_safety", on_chunk=on_chunk, system_prompt=DRUG_SAFETY_SYSTEM_PROMPT)
             drug_info_list.append({
                 "drug_name": med,
-                "info": response.text
+                "info": response_text
             })
             
         return {
@@ -95,46 +165,87 @@ class GeminiAgent:
             ]
         }
 # ... (the rest of the file remains the same) ...
-    def run_translator_agent(self, text_content: str, image_path: str = None) -> dict:
+    def run_translator_agent(self, text_content: str, upload=None, on_chunk=None, lab_findings: list = None,
+                             ocr_confidence: float = None) -> dict:
         """
         Uses Gemini's multimodal capabilities to translate medical documents.
+        `upload` is the uploaded file (an upload_store.Upload), if any.
+        Pass `lab_findings` (from lab_parser.parse_lab_report) to have the model only phrase them;
+        they are not used for an image whose OCR is unsure, since they were parsed from that text.
+        Images are downscaled, grayscaled and recompressed before upload, skipped when the
+        OCR text is confident enough, and duplicate uploads reuse the cached translation.
         """
-        prompt = """
-        You are a Doctor-to-Patient Translator. Your task is to analyze the provided medical document (text and/or image) and explain it in simple, clear language.
+        if upload is None or not is_image(upload.filename):
+            # PDFs are translated from their extracted text.
+            return self._translate(text_content, None, on_chunk=on_chunk, lab_findings=lab_findings)
 
-        Your output MUST be a JSON object with the following structure:
-        {
-          "summary": "A brief, one-paragraph summary of the document.",
-          "key_findings": [
-            {
-              "finding": "The specific medical term or result (e.g., 'Hemoglobin').",
-              "value": "The measured value (e.g., '9.5 g/dL').",
-              "interpretation": "A plain-language explanation of what this means (e.g., 'This is lower than the normal range, indicating anemia.').",
-              "is_abnormal": true
-            }
-          ],
-          "next_steps": "Recommended actions for the patient (e.g., 'Discuss these results with your doctor.').",
-          "urgency": "Low | Medium | High"
-        }
+        original = Image.open(upload.open())
+        phash, fingerprint = perceptual_hash(original), text_fingerprint(text_content)
+        cached = self.translation_cache.get(phash, fingerprint)
+        if cached is not None:
+            print(f"Translation cache hit for image {upload.filename} (phash {phash:016x}).")
+            if on_chunk:
+                on_chunk(json.dumps(cached))
+            return cached
+
+        start_time = time.perf_counter()
+        image = None
+        if should_send_image(text_content, ocr_confidence):
+            if lab_findings:
+                # Findings parsed from unreliable OCR must not be presented to the model as authoritative.
+                print("OCR confidence too low to trust the parsed lab findings; translating from the image.")
+                lab_findings = None
+            image, uploaded_bytes = prepare_image(original)
+            print(f"Analyzing image: {upload.filename} ({original.size[0]}x{original.size[1]} -> {image.size[0]}x{image.size[1]}, "
+                  f"{upload.size} -> {uploaded_bytes} bytes)")
+        self.translation_cache.record_upload(upload.size, uploaded_bytes if image else 0, sent=image is not None)
 
-        Analyze the following content:
+        result = self._translate(text_content, image, on_chunk=on_chunk, lab_findings=lab_findings)
+        if "error" not in result:
+            self.translation_cache.put(phash, fingerprint, result, seconds=time.perf_counter() - start_time)
+        return result
+
+    def _translate(self, text_content: str, image, on_chunk=None, lab_findings: list = None) -> dict:
+        if lab_findings:
+            return self._phrase_lab_findings(text_content, lab_findings, on_chunk=on_chunk)
+        contents = [text_content, image] if image is not None else [text_content]
+        return self.structured.generate(contents, agent="translator", on_chunk=on_chunk,
+                                        system_prompt=TRANSLATOR_SYSTEM_PROMPT)
+
+    def _phrase_lab_findings(self, text_content: str, lab_findings: list, on_chunk=None) -> dict:
         """
-        
-        if image_path:
-            print(f"Analyzing image: {image_path}")
-            img = Image.open(image_path)
-            response = self.model.generate_content([prompt, text_content, img])
-        else:
-            response = self.model.generate_content([prompt, text_content])
-            
-        # Clean and parse the JSON response from Gemini
-        cleaned_response = response.text.strip().replace("```json", "").replace("```", "")
-        try:
-            return json.loads(cleaned_response)
-        except json.JSONDecodeError:
-            return {"error": "Failed to parse AI model's response.", "raw_response": cleaned_response}
+        The lab results are already parsed and flagged, so the prompt carries them as compact
+        JSON (plus the rest of the report text, without the image) and the model only explains
+        them; key_findings are assembled here with the parsed values and flags.
+        """
+        findings = [
+            {"id": i, "test": f["name"], "value": f["value"], "reference_range": f["reference_range"], "status": f["status"]}
+            for i, f in enumerate(lab_findings)
+        ]
+        prompt = f"""
+        Lab Results:
+        {json.dumps(findings)}
+        Other Report Text:
+        {remaining_text(text_content, lab_findings)}
+        """
+        result = self.structured.generate(prompt, agent="translator", schema_name="translator_findings", on_chunk=on_chunk,
+                                          system_prompt=TRANSLATOR_FINDINGS_SYSTEM_PROMPT)
+        if "error" in result:
+            return result
+        interpretations = {item["id"]: item["interpretation"] for item in result.pop("interpretations", [])
+                           if isinstance(item, dict) and "id" in item and "interpretation" in item}
+        key_findings = [
+            {
+                "finding": f["name"],
+                "value": f["value"],
+                "interpretation": interpretations.get(i) or f"This result is {f['status']} (reference range: {f['reference_range'] or 'not given'}).",
+                "is_abnormal": f["is_abnormal"],
+            }
+            for i, f in enumerate(lab_findings)
+        ]
+        return {"summary": result.get("summary"), "key_findings": key_findings, **result}
 
-    def run_symptom_triage_agent(self, data: dict, red_flag_alerts: list) -> dict:
+    def run_symptom_triage_agent(self, data: dict, red_flag_alerts: list, on_chunk=None) -> dict:
         """
         Provides a triage recommendation based on symptoms.
         """
@@ -145,19 +256,33 @@ class GeminiAgent:
         else:
             # If no red flags, use the LLM for nuanced advice
             symptoms = data.get("symptoms", "No symptoms provided.")
-            query = f"A patient reports the following symptoms: '{symptoms}'. Based on this, what is the recommended triage level (Home care, Book GP, Go to ER now) and what are some basic first-aid steps?"
-            context = self._retrieve_context(query)
-            prompt = f"""
-            Context from WHO/CDC guidelines:
-            {context}
-            ---
-            Based ONLY on the context provided, analyze the patient's query and provide a triage recommendation.
-            Patient Query: {query}
-            """
-            response = self.model.generate_content(prompt)
-            # In a real app, you would parse this response more carefully.
-            # For the hackathon, we'll just pass the text.
-            urgency_and_reasoning = response.text
+            start_time = time.perf_counter()
+
+            # Paraphrased symptom descriptions can reuse a prior answer. Red-flag cases never
+            # reach this branch, so they are never served from (or written to) the cache.
+            urgency_and_reasoning = self.triage_cache.lookup(symptoms) if self.triage_cache else None
+            if urgency_and_reasoning is not None:
+                if on_chunk:
+                    on_chunk(urgency_and_reasoning)
+                self.triage_cache.record_latency(hit=True, seconds=time.perf_counter() - start_time)
+            else:
+                query = f"A patient reports the following symptoms: '{symptoms}'. Based on this, what is the recommended triage level (Home care, Book GP, Go to ER now) and what are some basic first-aid steps?"
+                context = self._retrieve_context(query)
+                prompt = f"""
+                Context from WHO/CDC guidelines:
+                {context}
+                ---
+                Based ONLY on the context provided, analyze the patient's query and provide a triage recommendation.
+                Patient Query: {query}
+                """
+                # In a real app, you would parse this response more carefully.
+                # For the hackathon, we'll just pass the text.
+                urgency_and_reasoning = self._generate(prompt, agent="symptom_triage", on_chunk=on_chunk)
+                if self.triage_cache:
+                    # Don't cache answers where the model itself escalated to emergency care.
+                    if not re.search(r"go to er|emergency", urgency_and_reasoning, re.IGNORECASE):
+                        self.triage_cache.store(symptoms, urgency_and_reasoning)
+                    self.triage_cache.record_latency(hit=False, seconds=time.perf_counter() - start_time)
 
         return {
             "agent_type": "Symptom Urgency Triage",
@@ -168,70 +293,41 @@ class GeminiAgent:
     # ... (keep the __init__, _retrieve_context, run_drug_safety_agent, run_translator_agent methods as they are) ...
 # Just add the two new methods below inside the GeminiAgent class.
 
-    def run_chronic_care_agent(self, records: list) -> dict:
+    def run_chronic_care_agent(self, records: list, on_chunk=None, summary: dict = None) -> dict:
         """
         Analyzes time-series data (like BP or Glucose logs) to find trends and give advice.
+        The trend statistics are computed by vitals_analytics; the LLM only interprets them.
+        Pass a precomputed `summary` (e.g. from the VitalsStore) to skip the raw records.
         """
+        # The statistics are computed locally, so the prompt size doesn't grow with the log length.
         prompt = f"""
-        You are a Chronic Care Coach. Your task is to analyze the following patient-provided data log and provide a helpful, safe summary. The data contains a list of readings over time.
-
-        Your output MUST be a JSON object with the following structure:
-        {{
-          "trend_summary": "A brief, one-paragraph summary of the data trends (e.g., 'Blood pressure readings are consistently high', 'Glucose levels show high variability after meals').",
-          "risk_assessment": {{
-            "level": "Low | Normal | Elevated | High",
-            "reason": "A brief explanation for the risk level assigned."
-          }},
-          "behavioral_nudges": [
-            "A simple, safe, actionable diet-related suggestion.",
-            "A simple, safe, actionable lifestyle suggestion (e.g., related to exercise or stress).",
-            "A suggestion to consult a doctor for a specific reason."
-          ]
-        }}
-
-        Analyze this data:
-        {json.dumps(records, indent=2)}
-        """
-        response = self.model.generate_content(prompt)
-        cleaned_response = response.text.strip().replace("```json", "").replace("```", "")
-        try:
-            return json.loads(cleaned_response)
-        except json.JSONDecodeError:
-            return {"error": "Failed to parse AI model's response.", "raw_response": cleaned_response}
+        Analyze this statistical summary of the patient's log:
+        {json.dumps(summary or analyze_vitals(records), indent=2)}
+        """
+        return self.structured.generate(prompt, agent="chronic_care", on_chunk=on_chunk,
+                                        system_prompt=CHRONIC_CARE_SYSTEM_PROMPT)
 
-    def run_doctors_copilot_agent(self, note: str) -> dict:
+    def run_doctors_copilot_agent(self, note: str, on_chunk=None, map_reduce: bool = None) -> dict:
         """
         Processes a doctor's encounter note to generate a SOAP summary and check against guidelines.
+        Long notes with several sections go through `_run_copilot_map_reduce`; pass `map_reduce`
+        to force either path.
         """
+        if map_reduce is None:
+            map_reduce = estimate_tokens(note) >= COPILOT_MAP_REDUCE_MIN_TOKENS
+        sections = split_sections(note) if map_reduce else {}
+        if len(sections) >= 2:
+            return self._run_copilot_map_reduce(sections, on_chunk=on_chunk)
+        # Matching finds nothing when the note's terms aren't in the recommendations table; the
+        # snippet path below still gives the model guideline context then.
+        matched = self.guidelines.match(note) if self.guidelines else []
+        if matched:
+            return self._run_copilot_matched("Encounter Note", note, matched, on_chunk=on_chunk)
+
         # For the co-pilot, we use RAG to find relevant clinical guidelines in our KB
         context = self._retrieve_context(f"Clinical guidelines related to the following note: {note}", top_k=5)
 
         prompt = f"""
-        You are a Doctor's Co-Pilot, an AI assistant for clinicians. Your task is to process a raw encounter note and structure it for efficiency.
-
-        1.  Analyze the "Encounter Note".
-        2.  Use the "Retrieved Guideline Snippets" to inform your output.
-        3.  Your output MUST be a JSON object with the exact following structure:
-        {{
-          "soap_summary": {{
-            "subjective": "What the patient reported.",
-            "objective": "Verifiable observations and measurements.",
-            "assessment": "A summary of the diagnosis or condition.",
-            "plan": "The course of action."
-          }},
-          "guideline_checklist": [
-            {{
-              "guideline": "A specific recommendation from the retrieved snippets.",
-              "status": "Addressed | Not Addressed | Partially Addressed",
-              "reason": "A brief justification for the status."
-            }}
-          ],
-          "draft_orders": {{
-            "suggested_labs": ["A list of common lab tests to consider."],
-            "suggested_medications": ["A list of common medications to consider."]
-          }}
-        }}
-
         Retrieved Guideline Snippets (for context):
         ---
         {context}
@@ -241,9 +337,81 @@ class GeminiAgent:
         {note}
         ---
         """
-        response = self.model.generate_content(prompt)
-        cleaned_response = response.text.strip().replace("```json", "").replace("```", "")
-        try:
-            return json.loads(cleaned_response)
-        except json.JSONDecodeError:
-            return {"error": "Failed to parse AI model's response.", "raw_response": cleaned_response}
\ No newline at end of file
+        return self.structured.generate(prompt, agent="doctors_copilot", on_chunk=on_chunk,
+                                        system_prompt=COPILOT_SYSTEM_PROMPT)
+
+    def _run_copilot_map_reduce(self, sections: dict, on_chunk=None) -> dict:
+        """
+        Map: extracts the facts of each section concurrently, while guidelines are retrieved per
+        section, in windows short enough not to be truncated by the embedding model, unless the KB has
+        a recommendations table that matches the whole note.
+        Reduce: one call turns the compact extractions into the SOAP/guideline/order JSON.
+        """
+        print(f"[copilot] map-reduce over sections: {', '.join(sections)}")
+
+        def extract(name: str, text: str) -> dict:
+            prompt = f"""
+        Note Section ({name}):
+        ---
+        {text}
+        ---
+        """
+            extraction = self.structured.generate(prompt, agent="copilot_section", system_prompt=COPILOT_SECTION_SYSTEM_PROMPT)
+            # A failed extraction falls back to the section's own text, so nothing is lost in the reduce.
+            return {"text": text} if "error" in extraction else extraction
+
+        with ThreadPoolExecutor(max_workers=min(COPILOT_MAX_CONCURRENT_SECTIONS, len(sections))) as pool:
+            futures = {name: pool.submit(extract, name, text) for name, text in sections.items()}
+            matched = self.guidelines.match("\n".join(sections.values())) if self.guidelines else []
+            snippet_ids = [] if matched else self._retrieve_section_snippets(sections, top_k=COPILOT_SECTION_TOP_K)
+            extractions = {name: future.result() for name, future in futures.items()}
+
+        if matched:
+            return self._run_copilot_matched("Section Extractions", json.dumps(extractions, indent=2), matched,
+                                             on_chunk=on_chunk)
+
+        # Interleave the sections' hits so each section contributes its best snippets first,
+        # and send each snippet once, capped like the single-prompt path.
+        ranked_ids = [ids[rank] for rank in range(COPILOT_SECTION_TOP_K) for ids in snippet_ids if rank < len(ids)]
+        unique_ids = list(dict.fromkeys(ranked_ids))[:COPILOT_REDUCE_TOP_K]
+        context = "\n\n".join(self.chunks[i]['content_chunk'] for i in unique_ids) if self.index else "No local knowledge base loaded."
+        prompt = f"""
+        Retrieved Guideline Snippets (for context):
+        ---
+        {context}
+        ---
+        Section Extractions:
+        ---
+        {json.dumps(extractions, indent=2)}
+        ---
+        """
+        return self.structured.generate(prompt, agent="doctors_copilot", on_chunk=on_chunk,
+                                        system_prompt=COPILOT_REDUCE_SYSTEM_PROMPT)
+
+    def _run_copilot_matched(self, label: str, content: str, matched: list, on_chunk=None) -> dict:
+        """
+        Sends only the KB recommendations matched locally against the note; the model judges
+        each one's status by id, and the checklist is assembled here.
+        """
+        prompt = f"""
+        Matched Guideline Recommendations:
+        ---
+        {json.dumps(matched)}
+        ---
+        {label}:
+        ---
+        {content}
+        ---
+        """
+        result = self.structured.generate(prompt, agent="doctors_copilot", schema_name="copilot_matched", on_chunk=on_chunk,
+                                          system_prompt=COPILOT_MATCHED_SYSTEM_PROMPT)
+        if "error" in result:
+            return result
+        by_id = {recommendation["id"]: recommendation for recommendation in matched}
+        # Schema violations are only logged, so items without a status are skipped and a missing reason is left blank.
+        checklist = [
+            {"guideline": by_id[item["id"]]["recommendation"], "status": item["status"], "reason": item.get("reason", "")}
+            for item in result.pop("guideline_status", [])
+            if isinstance(item, dict) and item.get("id") in by_id and "status" in item
+        ]
+        return {"soap_summary": result.get("soap_summary"), "guideline_checklist": checklist, **result}
@@ -0,0 +1,90 @@
+import os
+import re
+import json
+import sqlite3
+import threading
+
+# --- CONFIGURATION ---
+# Written into the KB folder by `preprocessing/kb_builder.py --recommendations`.
+RECOMMENDATIONS_DB_NAME = "kb_recommendations.db"
+MAX_MATCHED_RECOMMENDATIONS = int(os.getenv("COPILOT_MAX_RECOMMENDATIONS", "8"))
+MAX_TERM_WORDS = 4  # Trigger terms are phrases of at most this many words.
+
+NON_ALPHANUMERIC = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_term(text: str) -> str:
+    """Lower-cases and collapses punctuation to single spaces ("HbA1c," -> "hba1c"). kb_builder uses the same rule."""
+    return NON_ALPHANUMERIC.sub(" ", text.lower()).strip()
+
+def note_terms(text: str) -> set:
+    """Every phrase of 1..MAX_TERM_WORDS consecutive normalized words in the text."""
+    words = normalize_term(text).split()
+    return {" ".join(words[i:i + n]) for n in range(1, MAX_TERM_WORDS + 1) for i in range(len(words) - n + 1)}
+
+
+class GuidelineIndex:
+    """
+    The table of atomic guideline recommendations extracted at KB build time. Matches a
+    note against the recommendations' trigger terms locally, so only the applicable
+    recommendations are sent to the LLM, which then only has to judge their status.
+    """
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        # The vocabulary is small, so it is held in memory and intersected with the note's phrases;
+        # only the hits go to the indexed trigger table.
+        self.vocabulary = {row[0] for row in self._conn.execute("SELECT DISTINCT term FROM triggers")}
+        self.size = self._conn.execute("SELECT COUNT(*) FROM recommendations").fetchone()[0]
+
+        # --- Metrics ---
+        self.lookups = 0
+        self.matched = 0
+        self.unmatched_notes = 0
+
+    def match(self, text: str, limit: int = MAX_MATCHED_RECOMMENDATIONS) -> list[dict]:
+        """Returns the recommendations triggered by the text, most matched trigger terms first."""
+        hits = list(self.vocabulary & note_terms(text))
+        rows = []
+        if hits:
+            placeholders = ",".join("?" * len(hits))
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT r.id, r.recommendation, r.trigger_conditions, r.required_actions, COUNT(DISTINCT t.term) AS hits "
+                    f"FROM triggers t JOIN recommendations r ON r.id = t.recommendation_id WHERE t.term IN ({placeholders}) "
+                    "GROUP BY r.id ORDER BY hits DESC, r.id LIMIT ?",
+                    hits + [limit],
+                ).fetchall()
+        with self._lock:
+            self.lookups += 1
+            self.matched += len(rows)
+            self.unmatched_notes += not rows
+        return [
+            {"id": row[0], "recommendation": row[1], "trigger_conditions": json.loads(row[2]), "required_actions": json.loads(row[3])}
+            for row in rows
+        ]
+
+    def close(self):
+        self._conn.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "recommendations": self.size,
+                "trigger_terms": len(self.vocabulary),
+                "lookups": self.lookups,
+                "avg_matched_per_note": self.matched / self.lookups if self.lookups else 0.0,
+                "notes_without_match": self.unmatched_notes,
+            }
+
+
+def load_guideline_index(kb_folder: str):
+    """Returns the KB's GuidelineIndex, or None if the KB was built without recommendations."""
+    db_path = os.path.join(kb_folder, RECOMMENDATIONS_DB_NAME)
+    if not os.path.exists(db_path):
+        print(f"No guideline recommendations table in '{kb_folder}'; the copilot will use retrieved snippets.")
+        return None
+    index = GuidelineIndex(db_path)
+    print(f"Guideline recommendations loaded: {index.size} recommendations, {len(index.vocabulary)} trigger terms.")
+    return index
@@ -0,0 +1,38 @@
+# File: app/gunicorn_conf.py
+#
+# Prefork production server for the ASGI app (asgi.py):
+#
+#   cd app && gunicorn -c gunicorn_conf.py asgi:application
+#
+# The heavy models (EasyOCR, scispaCy, MiniLM) are loaded once in the master before the
+# workers fork, so every worker, and every stage pool process it forks (stage_executor.py),
+# shares the weights copy-on-write instead of loading its own copy. The app itself is
+# imported in each worker: its SQLite connections and thread pools must not cross a fork.
+#
+# State kept in process memory (deferred-evaluation tickets, the semantic cache) is per
+# worker. With ASGI_WORKERS > 1, route each client to one worker (sticky sessions) if the
+# frontend polls tickets; jobs and vitals state live in SQLite and work from any worker.
+
+import os
+
+bind = os.getenv("ASGI_BIND", "0.0.0.0:5001")
+workers = int(os.getenv("ASGI_WORKERS", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = False  # Only the model weights are preloaded (see on_starting)
+timeout = 300  # OCR of a long scanned PDF plus two LLM calls
+graceful_timeout = 30
+keepalive = 5
+
+# torch's intra-op threads per worker; by default the cores are split between the workers,
+# so N workers don't each start one thread per core.
+TORCH_THREADS = int(os.getenv("ASGI_TORCH_THREADS", str(max(1, (os.cpu_count() or 1) // workers))))
+
+
+def on_starting(server):
+    from stage_executor import preload_models
+    server.log.info("Preloading model weights in the master process...")
+    preload_models()
+
+def post_fork(server, worker):
+    import torch
+    torch.set_num_threads(TORCH_THREADS)
@@ -0,0 +1,117 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# --- CONFIGURATION ---
+# Leave LLM_HEDGE_PERCENTILE unset to disable hedging.
+DEFAULT_HEDGE_PERCENTILE = os.getenv("LLM_HEDGE_PERCENTILE", "")
+DEFAULT_HEDGE_BUDGET_RATIO = float(os.getenv("LLM_HEDGE_BUDGET_RATIO", "0.05"))
+DEFAULT_MIN_SAMPLES = 20
+LATENCY_WINDOW = 500
+
+
+class LatencyTracker:
+    """Keeps a rolling window of observed call latencies and answers percentile queries."""
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def count(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, pct: float) -> float:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class HedgedCaller:
+    """
+    Runs a call and, if it hasn't returned by the `percentile`-th observed latency,
+    fires one duplicate and returns whichever finishes first.
+    Extra calls are capped at `budget_ratio` of all calls. A losing call that has
+    already started cannot be interrupted (the Gemini SDK is synchronous), so it is
+    cancelled if still queued and otherwise left to finish with its result discarded.
+    """
+    def __init__(self, percentile: float = 95.0, budget_ratio: float = DEFAULT_HEDGE_BUDGET_RATIO,
+                 min_samples: int = DEFAULT_MIN_SAMPLES, max_workers: int = 32):
+        self.percentile = percentile
+        self.budget_ratio = budget_ratio
+        self.min_samples = min_samples
+        self.tracker = LatencyTracker()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-hedge")
+        self._lock = threading.Lock()
+
+        # --- Metrics ---
+        self.calls = 0
+        self.hedges_fired = 0
+        self.hedge_wins = 0
+        self.hedges_denied = 0
+
+    @classmethod
+    def from_env(cls):
+        """Returns a HedgedCaller if LLM_HEDGE_PERCENTILE is configured, else None."""
+        if not DEFAULT_HEDGE_PERCENTILE:
+            return None
+        return cls(percentile=float(DEFAULT_HEDGE_PERCENTILE))
+
+    def _timed(self, fn):
+        start = time.perf_counter()
+        result = fn()
+        self.tracker.record(time.perf_counter() - start)
+        return result
+
+    def _take_budget(self) -> bool:
+        with self._lock:
+            # +1 lets the very first slow call hedge before the ratio has any headroom.
+            if self.hedges_fired + 1 > self.calls * self.budget_ratio + 1:
+                self.hedges_denied += 1
+                return False
+            self.hedges_fired += 1
+            return True
+
+    def call(self, fn):
+        with self._lock:
+            self.calls += 1
+
+        if self.tracker.count() < self.min_samples:
+            return self._timed(fn)
+
+        hedge_delay = self.tracker.percentile(self.percentile)
+        primary = self.executor.submit(self._timed, fn)
+        done, _ = wait([primary], timeout=hedge_delay)
+        if done or not self._take_budget():
+            return primary.result()
+
+        hedge = self.executor.submit(self._timed, fn)
+        done, pending = wait([primary, hedge], return_when=FIRST_COMPLETED)
+        winner = hedge if hedge in done else primary
+        if winner.exception() is not None and pending:
+            # The first attempt to finish failed; fall back to the other one.
+            winner = pending.pop()
+            pending = set()
+        for loser in pending:
+            loser.cancel()
+        if winner is hedge:
+            with self._lock:
+                self.hedge_wins += 1
+        return winner.result()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "percentile": self.percentile,
+                "hedge_delay_ms": round(self.tracker.percentile(self.percentile) * 1000, 2) if self.tracker.count() else None,
+                "calls": self.calls,
+                "hedges_fired": self.hedges_fired,
+                "hedge_wins": self.hedge_wins,
+                "hedges_denied": self.hedges_denied,
+            }
@@ -0,0 +1,170 @@
+import io
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from PIL import Image, ImageOps
+
+# --- CONFIGURATION ---
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+# Longest side sent to the model. Gemini works on 768 px tiles, so 2 tiles per side keeps
+# report text legible while a 4000x3000 phone photo shrinks ~7x in pixels.
+IMAGE_MAX_SIDE = int(os.getenv("TRANSLATOR_IMAGE_MAX_SIDE", "1536"))
+IMAGE_JPEG_QUALITY = int(os.getenv("TRANSLATOR_IMAGE_JPEG_QUALITY", "80"))
+# With OCR this confident (and enough text), the image adds nothing the text doesn't carry.
+OCR_CONFIDENCE_SKIP_IMAGE = float(os.getenv("TRANSLATOR_OCR_CONFIDENCE_SKIP_IMAGE", "0.85"))
+OCR_MIN_CHARS_SKIP_IMAGE = 200
+# Uploads whose perceptual hashes differ in at most this many of 64 bits are the same document.
+PHASH_MAX_DISTANCE = int(os.getenv("TRANSLATION_CACHE_MAX_DISTANCE", "4"))
+DEFAULT_DB_PATH = os.getenv("TRANSLATION_CACHE_PATH", os.path.join("cache", "translation_cache.db"))
+DEFAULT_MAX_ENTRIES = 5000
+
+NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+def is_image(path: str) -> bool:
+    return bool(path) and path.rsplit('.', 1)[-1].lower() in IMAGE_EXTENSIONS
+
+def perceptual_hash(image: Image.Image) -> int:
+    """
+    64-bit difference hash: the sign of horizontal gradients on a 9x8 grayscale thumbnail.
+    Re-encoded, resized or re-uploaded copies of a photo hash to (nearly) the same value.
+    """
+    pixels = np.asarray(image.convert("L").resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int(np.packbits(bits).view(">u8")[0])
+
+def prepare_image(image: Image.Image, max_side: int = IMAGE_MAX_SIDE, quality: int = IMAGE_JPEG_QUALITY):
+    """
+    Returns (prepared image, size in bytes): upright, grayscale, downscaled to `max_side`
+    and recompressed as JPEG, which is what actually gets uploaded to the model.
+    """
+    prepared = ImageOps.exif_transpose(image).convert("L")
+    prepared.thumbnail((max_side, max_side), Image.LANCZOS)
+    buffer = io.BytesIO()
+    prepared.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return Image.open(io.BytesIO(buffer.getvalue())), buffer.tell()
+
+def text_fingerprint(text: str) -> str:
+    """
+    Digest of the numbers in the OCR text. Photos of two patients' reports from the same lab
+    template can hash within a few bits of each other; they only share a translation if their
+    values agree too.
+    """
+    return hashlib.sha256(" ".join(NUMBER_PATTERN.findall(text or "")).encode("utf-8")).hexdigest()[:16]
+
+def should_send_image(text: str, ocr_confidence: float) -> bool:
+    """The image is only needed when OCR is unsure or found too little text."""
+    return ocr_confidence is None or ocr_confidence < OCR_CONFIDENCE_SKIP_IMAGE or len(text or "") < OCR_MIN_CHARS_SKIP_IMAGE
+
+
+class TranslationCache:
+    """
+    Caches translator results of uploaded images by perceptual hash, so a duplicate upload
+    (the same report photographed or re-sent) reuses the prior translation. Entries are
+    matched within PHASH_MAX_DISTANCE bits and on the OCR text's fingerprint, and cleared
+    when the translator prompt changes.
+    Also tracks what image preparation saved (upload bytes, skipped images, LLM time).
+    """
+    def __init__(self, prompt_version: str, db_path: str = DEFAULT_DB_PATH, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_distance: int = PHASH_MAX_DISTANCE):
+        self.prompt_version = prompt_version
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+
+        # --- Metrics ---
+        self.hits = 0
+        self.misses = 0
+        self.images_sent = 0
+        self.images_skipped = 0
+        self.original_bytes = 0
+        self.uploaded_bytes = 0
+        self.miss_seconds = 0.0
+
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                "phash TEXT NOT NULL, fingerprint TEXT NOT NULL, translation TEXT NOT NULL, last_used REAL NOT NULL, "
+                "PRIMARY KEY (phash, fingerprint))"
+            )
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'prompt_version'").fetchone()
+            if row is None or row[0] != prompt_version:
+                self._conn.execute("DELETE FROM translations")
+                self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('prompt_version', ?)", (prompt_version,))
+        # Hashes are scanned in memory: XOR + popcount over every entry is a few microseconds.
+        self._hashes = np.array([int(r[0], 16) for r in self._conn.execute("SELECT phash FROM translations")], dtype=np.uint64)
+
+    def get(self, phash: int, fingerprint: str) -> dict:
+        with self._lock:
+            if len(self._hashes):
+                distances = np.unpackbits((self._hashes ^ np.uint64(phash)).view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+                keys = [f"{int(h):016x}" for h in self._hashes[distances <= self.max_distance]]
+                if keys:
+                    placeholders = ",".join("?" * len(keys))
+                    row = self._conn.execute(
+                        f"SELECT phash, translation FROM translations WHERE phash IN ({placeholders}) AND fingerprint = ?",
+                        keys + [fingerprint],
+                    ).fetchone()
+                    if row is not None:
+                        with self._conn:
+                            self._conn.execute("UPDATE translations SET last_used = ? WHERE phash = ? AND fingerprint = ?",
+                                               (time.time(), row[0], fingerprint))
+                        self.hits += 1
+                        return json.loads(row[1])
+            self.misses += 1
+            return None
+
+    def put(self, phash: int, fingerprint: str, translation: dict, seconds: float):
+        key = f"{phash:016x}"
+        with self._lock:
+            self.miss_seconds += seconds
+            with self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?)",
+                                   (key, fingerprint, json.dumps(translation), time.time()))
+                count = self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+                if count > self.max_entries:
+                    self._conn.execute(
+                        "DELETE FROM translations WHERE rowid IN (SELECT rowid FROM translations ORDER BY last_used LIMIT ?)",
+                        (count - self.max_entries,),
+                    )
+            self._hashes = np.array([int(r[0], 16) for r in self._conn.execute("SELECT phash FROM translations")], dtype=np.uint64)
+
+    def record_upload(self, original_bytes: int, uploaded_bytes: int, sent: bool):
+        """Records one image's original size and what was uploaded for it (0 if skipped)."""
+        with self._lock:
+            self.original_bytes += original_bytes
+            self.uploaded_bytes += uploaded_bytes
+            self.images_sent += sent
+            self.images_skipped += not sent
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            avg_miss_seconds = self.miss_seconds / self.misses if self.misses else 0.0
+            return {
+                "entries": len(self._hashes),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "images_sent": self.images_sent,
+                "images_skipped_high_ocr_confidence": self.images_skipped,
+                "original_bytes": self.original_bytes,
+                "uploaded_bytes": self.uploaded_bytes,
+                "upload_bytes_saved": self.original_bytes - self.uploaded_bytes,
+                "avg_translation_seconds": round(avg_miss_seconds, 3),
+                "estimated_seconds_saved_by_hits": round(self.hits * avg_miss_seconds, 3),
+            }
+
+
+def prompt_version(*prompts: str) -> str:
+    """Short hash of the translator prompts, so cached translations expire when they change."""
+    return hashlib.sha256("".join(prompts).encode("utf-8")).hexdigest()[:12]
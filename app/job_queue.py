@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# --- CONFIGURATION ---
+DEFAULT_DB_PATH = os.getenv("JOB_STORE_PATH", os.path.join("cache", "jobs.db"))
+DEFAULT_MAX_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Queued + running jobs beyond this are rejected with a Retry-After instead of piling up.
+DEFAULT_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "32"))
+DEFAULT_RETENTION_SECONDS = 24 * 60 * 60
+JOB_STAGES = ("extraction", "agent1_analysis", "agent2_evaluation")
+
+
+class JobQueueFullError(Exception):
+    """Raised by `submit` when too many jobs are pending; `retry_after` is in seconds."""
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """
+    Runs unified-analysis jobs on a bounded worker pool. `submit` persists the job in
+    SQLite and returns its id immediately; `get` reports its status, per-stage progress
+    and (partial) results. Jobs left queued, or running in a process that has since
+    exited, are picked up again on startup, so they survive a server restart.
+
+    `run_fn(job, report)` executes a job and returns its result; it calls
+    `report(stage, partial=None)` when it enters each stage of JOB_STAGES, optionally
+    merging `partial` results that clients can already read.
+    """
+    def __init__(self, run_fn, db_path: str = DEFAULT_DB_PATH, max_workers: int = DEFAULT_MAX_WORKERS,
+                 max_pending: int = DEFAULT_MAX_PENDING, retention_seconds: int = DEFAULT_RETENTION_SECONDS):
+        self.run_fn = run_fn
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.retention_seconds = retention_seconds
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job-worker")
+        self._lock = threading.Lock()
+
+        # --- Metrics ---
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.recovered = 0
+        self.job_seconds = 0.0
+
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, agent_type TEXT NOT NULL, request TEXT NOT NULL, status TEXT NOT NULL, "
+                "stages TEXT NOT NULL, result TEXT, error TEXT, owner_pid INTEGER, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)")
+        self._recover()
+
+    def _recover(self):
+        """Re-queues jobs that never started, or whose worker process is gone."""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, status, owner_pid FROM jobs WHERE status IN ('queued', 'running')").fetchall()
+            orphaned = [job_id for job_id, status, pid in rows if status == 'queued' or not _process_alive(pid)]
+            with self._conn:
+                for job_id in orphaned:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'queued', stages = ?, result = NULL, owner_pid = NULL, updated_at = ? WHERE id = ?",
+                        (json.dumps(self._initial_stages()), time.time(), job_id),
+                    )
+            self.recovered += len(orphaned)
+        if orphaned:
+            print(f"Resuming {len(orphaned)} unfinished job(s) from the job store.")
+        for job_id in orphaned:
+            self.executor.submit(self._run, job_id)
+
+    @staticmethod
+    def _initial_stages() -> list:
+        return [{"stage": stage, "status": "pending"} for stage in JOB_STAGES]
+
+    def _prune(self, now: float):
+        self._conn.execute("DELETE FROM jobs WHERE status IN ('done', 'error') AND updated_at < ?", (now - self.retention_seconds,))
+
+    def submit(self, agent_type: str, request: dict) -> str:
+        """Persists and enqueues a job. `request` is the JSON-serializable input handed to `run_fn`."""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            pending = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+            if pending >= self.max_pending:
+                self.rejected += 1
+                avg_seconds = self.job_seconds / self.completed if self.completed else 30.0
+                retry_after = max(1, round(avg_seconds * (pending - self.max_pending + 1) / self.max_workers))
+                raise JobQueueFullError(f"Too many pending jobs ({pending}); retry later.", retry_after)
+            now = time.time()
+            with self._conn:
+                self._prune(now)
+                self._conn.execute(
+                    "INSERT INTO jobs (id, agent_type, request, status, stages, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                    (job_id, agent_type, json.dumps(request), json.dumps(self._initial_stages()), now, now),
+                )
+            self.submitted += 1
+        self.executor.submit(self._run, job_id)
+        return job_id
+
+    def _claim(self, job_id: str) -> dict:
+        """Atomically marks a queued job as running in this process; returns it, or None if another worker has it."""
+        with self._lock, self._conn:
+            claimed = self._conn.execute(
+                "UPDATE jobs SET status = 'running', owner_pid = ?, updated_at = ? WHERE id = ? AND status = 'queued'",
+                (os.getpid(), time.time(), job_id),
+            ).rowcount
+            if not claimed:
+                return None
+            row = self._conn.execute("SELECT agent_type, request, stages FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return {"job_id": job_id, "agent_type": row[0], "request": json.loads(row[1]), "stages": json.loads(row[2])}
+
+    def _update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", list(fields.values()) + [job_id])
+
+    def _run(self, job_id: str):
+        job = self._claim(job_id)
+        if job is None:
+            return
+        stages, partial_result, start_time = job["stages"], {}, time.perf_counter()
+
+        def advance(stage: str = None):
+            now = time.time()
+            for entry in stages:
+                if entry["status"] == "running":
+                    entry["status"], entry["seconds"] = "done", round(now - entry["started_at"], 3)
+                if entry["stage"] == stage:
+                    entry["status"], entry["started_at"] = "running", now
+
+        def report(stage: str, partial: dict = None):
+            advance(stage)
+            partial_result.update(partial or {})
+            self._update(job_id, stages=json.dumps(stages), result=json.dumps(partial_result))
+
+        try:
+            result = self.run_fn(job, report)
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            for entry in stages:
+                if entry["status"] == "running":
+                    entry["status"] = "error"
+            self._update(job_id, status="error", stages=json.dumps(stages), error=str(e))
+            with self._lock:
+                self.failed += 1
+            return
+        advance()
+        self._update(job_id, status="done", stages=json.dumps(stages), result=json.dumps(result))
+        with self._lock:
+            self.completed += 1
+            self.job_seconds += time.perf_counter() - start_time
+
+    def get(self, job_id: str) -> dict:
+        """Returns the job's status ('queued' | 'running' | 'done' | 'error'), stages and result, or None if unknown."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT agent_type, status, stages, result, error, created_at, updated_at FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        stages = json.loads(row[2])
+        job = {
+            "job_id": job_id,
+            "agent_type": row[0],
+            "status": row[1],
+            "stages": stages,
+            "progress": sum(entry["status"] == "done" for entry in stages) / len(stages),
+            "result": json.loads(row[3]) if row[3] else None,
+            "created_at": row[5],
+            "updated_at": row[6],
+        }
+        if row[4]:
+            job["error"] = row[4]
+        return job
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            return {
+                "queued": counts.get("queued", 0),
+                "running": counts.get("running", 0),
+                "stored": sum(counts.values()),
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "completed": self.completed,
+                "failed": self.failed,
+                "recovered_on_startup": self.recovered,
+                "avg_job_seconds": self.job_seconds / self.completed if self.completed else 0.0,
+            }
@@ -0,0 +1,222 @@
+import re
+import numpy as np
+import pandas as pd
+
+# --- CONFIGURATION ---
+# Built-in adult reference ranges in the canonical unit; used when the report prints no range.
+# `low`/`high` may be None for one-sided ranges.
+REFERENCE_TABLE = {
+    'glucose': {"name": "Glucose", "unit": "mg/dL", "low": 70, "high": 99,
+                "aliases": ["glucose", "blood glucose", "fasting glucose", "glucose fasting", "fbs", "fasting blood sugar", "blood sugar"]},
+    'hba1c': {"name": "HbA1c", "unit": "%", "low": 4.0, "high": 5.6, "aliases": ["hba1c", "a1c", "hemoglobin a1c", "glycated hemoglobin"]},
+    'creatinine': {"name": "Creatinine", "unit": "mg/dL", "low": 0.6, "high": 1.2, "aliases": ["creatinine", "serum creatinine", "creat"]},
+    'bun': {"name": "Blood Urea Nitrogen", "unit": "mg/dL", "low": 7, "high": 20, "aliases": ["bun", "blood urea nitrogen", "urea nitrogen"]},
+    'egfr': {"name": "eGFR", "unit": "mL/min/1.73m2", "low": 60, "high": None, "aliases": ["egfr", "gfr", "estimated gfr"]},
+    'sodium': {"name": "Sodium", "unit": "mmol/L", "low": 135, "high": 145, "aliases": ["sodium", "na"]},
+    'potassium': {"name": "Potassium", "unit": "mmol/L", "low": 3.5, "high": 5.1, "aliases": ["potassium", "k"]},
+    'calcium': {"name": "Calcium", "unit": "mg/dL", "low": 8.5, "high": 10.5, "aliases": ["calcium", "ca", "total calcium"]},
+    'total_cholesterol': {"name": "Total Cholesterol", "unit": "mg/dL", "low": None, "high": 200,
+                          "aliases": ["total cholesterol", "cholesterol", "cholesterol total"]},
+    'ldl': {"name": "LDL Cholesterol", "unit": "mg/dL", "low": None, "high": 100, "aliases": ["ldl", "ldl cholesterol", "ldl c", "ldl-c"]},
+    'hdl': {"name": "HDL Cholesterol", "unit": "mg/dL", "low": 40, "high": None, "aliases": ["hdl", "hdl cholesterol", "hdl c", "hdl-c"]},
+    'triglycerides': {"name": "Triglycerides", "unit": "mg/dL", "low": None, "high": 150, "aliases": ["triglycerides", "tg", "trigs"]},
+    'hemoglobin': {"name": "Hemoglobin", "unit": "g/dL", "low": 12.0, "high": 17.5, "aliases": ["hemoglobin", "haemoglobin", "hb", "hgb"]},
+    'wbc': {"name": "White Blood Cells", "unit": "10^3/uL", "low": 4.0, "high": 11.0,
+            "aliases": ["wbc", "white blood cells", "white blood cell count", "leukocytes", "total leukocyte count", "tlc"]},
+    'platelets': {"name": "Platelets", "unit": "10^3/uL", "low": 150, "high": 450, "aliases": ["platelets", "platelet count", "plt"]},
+    'alt': {"name": "ALT", "unit": "U/L", "low": 7, "high": 56, "aliases": ["alt", "sgpt", "alanine aminotransferase"]},
+    'ast': {"name": "AST", "unit": "U/L", "low": 10, "high": 40, "aliases": ["ast", "sgot", "aspartate aminotransferase"]},
+    'tsh': {"name": "TSH", "unit": "mIU/L", "low": 0.4, "high": 4.0, "aliases": ["tsh", "thyroid stimulating hormone"]},
+    'vitamin_d': {"name": "Vitamin D", "unit": "ng/mL", "low": 30, "high": 100, "aliases": ["vitamin d", "25 oh vitamin d", "vit d"]},
+    'ferritin': {"name": "Ferritin", "unit": "ng/mL", "low": 30, "high": 400, "aliases": ["ferritin", "serum ferritin"]},
+}
+
+# Spellings of the same unit, so "mg/dl", "MG/DL" and "mg/dL" compare equal.
+UNIT_SPELLINGS = {
+    "mg/dl": "mg/dL", "g/dl": "g/dL", "g/l": "g/L", "mmol/l": "mmol/L", "umol/l": "µmol/L", "µmol/l": "µmol/L",
+    "μmol/l": "µmol/L", "mmol/mol": "mmol/mol", "%": "%", "u/l": "U/L", "iu/l": "U/L", "miu/l": "mIU/L", "uiu/ml": "mIU/L",
+    "µiu/ml": "mIU/L", "ng/ml": "ng/mL", "nmol/l": "nmol/L", "meq/l": "mmol/L", "10^3/ul": "10^3/uL", "x10^3/ul": "10^3/uL",
+    "k/ul": "10^3/uL", "10^9/l": "10^3/uL", "ml/min/1.73m2": "mL/min/1.73m2", "ml/min": "mL/min/1.73m2",
+}
+# (analyte, unit) -> (scale, offset) into the analyte's canonical unit: canonical = value * scale + offset.
+UNIT_CONVERSIONS = {
+    ('glucose', 'mmol/L'): (18.016, 0.0),
+    ('creatinine', 'µmol/L'): (1 / 88.42, 0.0),
+    ('bun', 'mmol/L'): (2.801, 0.0),
+    ('calcium', 'mmol/L'): (4.008, 0.0),
+    ('total_cholesterol', 'mmol/L'): (38.67, 0.0),
+    ('ldl', 'mmol/L'): (38.67, 0.0),
+    ('hdl', 'mmol/L'): (38.67, 0.0),
+    ('triglycerides', 'mmol/L'): (88.57, 0.0),
+    ('hemoglobin', 'g/L'): (0.1, 0.0),
+    ('hba1c', 'mmol/mol'): (0.09148, 2.152),  # IFCC -> NGSP
+    ('vitamin_d', 'nmol/L'): (0.4006, 0.0),
+}
+
+# Words that precede an analyte on flattened PDF text ("... fi Elevated Creatinine: 1.3 mg/dL").
+LEADING_NOISE = {"fi", "elevated", "high", "low", "slightly", "normal", "borderline", "result", "results", "test"}
+
+# "Glucose (Fasting): 145 mg/dL (Normal: <100)", "Creatinine: 1.3 mg/dL (Normal: 0.6–1.2)", "HbA1c - 7.2 % (Ref 4.0-5.6)"
+LAB_PATTERN = re.compile(
+    r"(?P<name>[A-Za-z][A-Za-z0-9\-]*(?:[ ][A-Za-z0-9\-]+){0,4}?)"
+    r"(?:\s*\((?P<qualifier>[^()]{1,30})\))?"
+    r"\s*[:\-]\s*"
+    r"(?P<comparator>[<>]=?)?\s*(?P<value>\d+(?:\.\d+)?)"
+    # A "." only continues a unit when more unit follows ("mL/min/1.73m2"), never as a sentence's full stop.
+    r"[ \t]*(?P<unit>(?:x\s?)?10\^\d+/[a-zA-Zµμ]+|[a-zA-Zµμ%](?:[a-zA-Zµμ0-9%]|\.(?=\w))*(?:/(?:[a-zA-Z0-9]|\.(?=\w))+)*)?"
+    r"(?:[ \t]*\((?:normal|ref(?:erence)?(?:\s+range)?|range)?\s*:?\s*(?P<range>[^()]{1,40})\))?",
+    re.IGNORECASE,
+)
+RANGE_PATTERN = re.compile(
+    r"^\s*(?:(?P<low>\d+(?:\.\d+)?)\s*(?:-|–|—|to)\s*(?P<high>\d+(?:\.\d+)?)|(?P<comparator>[<>]=?|≤|≥)\s*(?P<bound>\d+(?:\.\d+)?))",
+    re.IGNORECASE,
+)
+NON_ALPHANUMERIC = re.compile(r"[^a-z0-9]+")
+
+_ALIASES = {alias: key for key, ref in REFERENCE_TABLE.items() for alias in ref["aliases"]}
+_REFERENCE_FRAME = pd.DataFrame.from_dict(
+    {key: {"canonical_unit": ref["unit"], "ref_low": ref["low"], "ref_high": ref["high"]} for key, ref in REFERENCE_TABLE.items()},
+    orient="index", dtype=object,
+)
+_REFERENCE_FRAME[["ref_low", "ref_high"]] = _REFERENCE_FRAME[["ref_low", "ref_high"]].astype(float)
+
+
+def _analyte(name: str, qualifier: str):
+    """Returns (reference key or None, display name): the longest known alias ending the captured name."""
+    raw = [word for word in name.split() if NON_ALPHANUMERIC.sub("", word.lower())]  # Drops "-----" separators.
+    words = [NON_ALPHANUMERIC.sub(" ", word.lower()).strip() for word in raw]
+    qualified = f" {NON_ALPHANUMERIC.sub(' ', qualifier.lower()).strip()}" if qualifier else ""
+    for start in range(len(words)):
+        candidate = " ".join(words[start:])
+        for text in (candidate + qualified, candidate):
+            if text in _ALIASES:
+                display = " ".join(raw[start:])
+                return _ALIASES[text], f"{display} ({qualifier})" if qualifier else display
+    # Unknown analyte: drop leading flag words left over from the previous line.
+    while len(raw) > 1 and raw[0].lower() in LEADING_NOISE:
+        raw = raw[1:]
+    return None, " ".join(raw) + (f" ({qualifier})" if qualifier else "")
+
+def _parse_range(text: str):
+    """'0.6–1.2' -> (0.6, 1.2); '<100' -> (None, 100); '>60' -> (60, None); otherwise (None, None)."""
+    match = RANGE_PATTERN.match(text or "")
+    if not match:
+        return None, None
+    if match.group("low"):
+        return float(match.group("low")), float(match.group("high"))
+    bound = float(match.group("bound"))
+    return (None, bound) if match.group("comparator") in ("<", "<=", "≤") else (bound, None)
+
+def extract_lab_rows(text: str) -> pd.DataFrame:
+    """One row per "analyte: value unit (range)" match, as printed on the report."""
+    rows = []
+    for match in LAB_PATTERN.finditer(text):
+        key, name = _analyte(match.group("name"), match.group("qualifier"))
+        unit_text = (match.group("unit") or "").strip()
+        unit = UNIT_SPELLINGS.get(unit_text.lower().replace(" ", ""), unit_text)
+        if unit not in UNIT_SPELLINGS.values() and not re.search(r"[/%^]", unit):
+            unit = ""  # A following word ("Potassium: 4.1 and ..."), not a unit.
+        # Without a known analyte, a unit or a printed range, "Age: 56" would count as a lab result.
+        if key is None and not (unit and match.group("range")):
+            continue
+        report_low, report_high = _parse_range(match.group("range"))
+        rows.append({
+            "key": key, "name": name, "value": float(match.group("value")), "comparator": match.group("comparator") or "",
+            "unit": unit, "report_low": report_low, "report_high": report_high, "report_range": (match.group("range") or "").strip(),
+            # The match can begin a few words early ("Age 56 --- Glucose"); the result starts at its name.
+            "start": text.find(name.split()[0], match.start("name")), "end": match.end(),
+        })
+    return pd.DataFrame(rows, columns=["key", "name", "value", "comparator", "unit", "report_low", "report_high", "report_range", "start", "end"])
+
+def evaluate_lab_rows(rows: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normalizes every row to its analyte's canonical unit and flags it, in one vectorized pass.
+    The report's own range wins; the built-in range is used when the report prints none.
+    """
+    df = rows.join(_REFERENCE_FRAME, on="key")
+    scale_offset = [UNIT_CONVERSIONS.get((key, unit), (1.0, 0.0)) for key, unit in zip(df["key"], df["unit"])]
+    scale, offset = (np.array(column, dtype=float) for column in zip(*scale_offset)) if len(df) else (np.ones(0), np.zeros(0))
+    converted = (df["unit"] != df["canonical_unit"]) & (scale != 1.0)
+    df["normalized_value"] = np.where(converted, df["value"] * scale + offset, df["value"]).round(2)
+    df["normalized_unit"] = np.where(converted, df["canonical_unit"], df["unit"])
+
+    has_report_range = df["report_low"].notna() | df["report_high"].notna()
+    # Report ranges are in the report's unit, so they are compared with the value as printed.
+    value = np.where(has_report_range, df["value"], df["normalized_value"])
+    # A built-in range only applies if the value is (or was converted to) the canonical unit.
+    canonical = df["normalized_unit"] == df["canonical_unit"]
+    low = np.where(has_report_range, df["report_low"], df["ref_low"].where(canonical)).astype(float)
+    high = np.where(has_report_range, df["report_high"], df["ref_high"].where(canonical)).astype(float)
+
+    df["status"] = np.select(
+        [value < low, value > high, np.isnan(low) & np.isnan(high)],
+        ["low", "high", "unknown"],
+        default="normal",
+    )
+    df["range_source"] = np.where(has_report_range, "report", np.where(np.isnan(low) & np.isnan(high), "none", "built_in"))
+    df["range_low"], df["range_high"] = low, high
+    return df
+
+def _format_range(low: float, high: float) -> str:
+    if np.isnan(low) and np.isnan(high):
+        return ""
+    if np.isnan(low):
+        return f"<{high:g}"
+    if np.isnan(high):
+        return f">{low:g}"
+    return f"{low:g}-{high:g}"
+
+def parse_lab_report(text: str) -> list[dict]:
+    """
+    Extracts the lab results of a report's text with their units and reference ranges, and
+    flags abnormal ones. Returns a list of findings (empty if the text has no lab results).
+    """
+    rows = extract_lab_rows(text or "")
+    if rows.empty:
+        return []
+    df = evaluate_lab_rows(rows)
+    return [
+        {
+            "analyte": row.key if isinstance(row.key, str) else None,
+            "name": row.name,
+            "value": f"{row.comparator}{row.value:g} {row.unit}".strip(),
+            "normalized_value": None if np.isnan(row.normalized_value) else float(row.normalized_value),
+            "normalized_unit": row.normalized_unit or None,
+            "reference_range": row.report_range or _format_range(row.range_low, row.range_high),
+            "range_source": row.range_source,
+            "status": row.status,
+            "is_abnormal": row.status in ("low", "high"),
+            "span": [int(row.start), int(row.end)],
+        }
+        for row in df.itertuples(index=False)
+    ]
+
+def remaining_text(text: str, findings: list[dict]) -> str:
+    """The report text without the parsed lab results (headers, interpretation, comments)."""
+    parts, position = [], 0
+    for start, end in sorted(finding["span"] for finding in findings):
+        parts.append(text[position:start])
+        position = max(position, end)
+    parts.append(text[position:])
+    return re.sub(r"\s{2,}", " ", " ".join(parts)).strip()
+
+
+if __name__ == '__main__':
+    # Run from the 'app' folder: python lab_parser.py
+    def flags(text):
+        return [(f["name"], f["value"], f["status"]) for f in parse_lab_report(text)]
+
+    print("\n--- Testing Lab Report Parsing ---")
+    cases = {
+        "Glucose (Fasting): 145 mg/dL (Normal: <100)": [("Glucose (Fasting)", "145 mg/dL", "high")],
+        "HbA1c - 58 mmol/mol": [("HbA1c", "58 mmol/mol", "high")],
+        "eGFR: 45 mL/min/1.73m2": [("eGFR", "45 mL/min/1.73m2", "low")],
+        # A sentence-final period is not part of the unit (it used to leave both results unflagged).
+        "Fasting glucose: 250 mg/dL. Creatinine: 3.1 mg/dL.": [("Fasting glucose", "250 mg/dL", "high"),
+                                                               ("Creatinine", "3.1 mg/dL", "high")],
+    }
+    for text, expected in cases.items():
+        result = flags(text)
+        print(f"{text!r} -> {result}")
+        assert result == expected, f"expected {expected}"
+    print("All lab parsing checks passed.")
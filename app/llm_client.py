@@ -0,0 +1,172 @@
+import time
+import hashlib
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from PIL import Image
+from singleflight import SingleFlight
+from llm_scheduler import LLMScheduler
+from hedging import HedgedCaller
+from model_router import ModelRouter
+from context_cache import ContextCache
+
+# --- CONFIGURATION ---
+IMAGE_TOKEN_COST = 258  # Gemini bills each image as a fixed number of input tokens
+# Process-wide fallback for `model_factory`; load tests set it before importing the app,
+# so every client the server builds talks to a fake model.
+DEFAULT_MODEL_FACTORY = None
+
+
+def prompt_hash(model_name: str, contents) -> str:
+    """
+    Builds a stable SHA-256 key for a generate_content call.
+    Handles plain-string prompts as well as multimodal lists of strings and PIL images.
+    """
+    digest = hashlib.sha256(model_name.encode('utf-8'))
+    parts = contents if isinstance(contents, (list, tuple)) else [contents]
+    for part in parts:
+        if isinstance(part, Image.Image):
+            digest.update(f"<image {part.mode} {part.size}>".encode('utf-8'))
+            digest.update(part.tobytes())
+        else:
+            digest.update(b"<text>")
+            digest.update(str(part).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def estimate_tokens(contents) -> int:
+    """Rough prompt token estimate (~4 characters per token) used for routing and rate budgeting."""
+    parts = contents if isinstance(contents, (list, tuple)) else [contents]
+    return sum(IMAGE_TOKEN_COST if isinstance(p, Image.Image) else len(str(p)) // 4 for p in parts)
+
+
+def _with_prefix(system_prompt: str, contents):
+    """Prepends the static prefix to the per-request contents (for inline sends and hashing)."""
+    parts = list(contents) if isinstance(contents, (list, tuple)) else [contents]
+    return parts if system_prompt is None else [system_prompt] + parts
+
+
+class LLMClient:
+    """
+    Shared entry point for every Gemini call made by Agent 1 and Agent 2.
+    Identical prompts issued concurrently are coalesced into one upstream request,
+    and every upstream request passes through the shared rate-limiting scheduler.
+    Slow calls can optionally be hedged with a duplicate request (see hedging.py).
+    The model, output cap and timeout for each call are chosen by the ModelRouter.
+    A call's static `system_prompt` is served from the provider's context cache when possible.
+    """
+    def __init__(self, api_key, scheduler: LLMScheduler = None, hedger: HedgedCaller = None,
+                 router: ModelRouter = None, model_factory=None, context_cache: ContextCache = None):
+        if not api_key:
+            raise ValueError("Google API Key is missing. Please set it in your .env file.")
+
+        genai.configure(api_key=api_key)
+        # `model_factory(model_name)` lets benchmarks and offline jobs plug in a fake model.
+        model_factory = model_factory or DEFAULT_MODEL_FACTORY
+        self.model_factory = model_factory or genai.GenerativeModel
+        self._models = {}
+        self.router = router or ModelRouter()
+        self.singleflight = SingleFlight()
+        self.scheduler = scheduler or LLMScheduler.from_env()
+        self.hedger = hedger or HedgedCaller.from_env()
+        # Fake models can't use Gemini's cache, so they only get one if a stand-in is passed.
+        self.context_cache = context_cache or (None if model_factory else ContextCache())
+
+    def generate(self, contents, agent: str = "default", generation_config: dict = None, system_prompt: str = None) -> str:
+        """
+        Sends the prompt to Gemini and returns the response text.
+        `generation_config` is merged over the route's output cap (e.g. to request JSON mode).
+        `system_prompt` is the agent's static instruction prefix; `contents` is the per-request suffix.
+        """
+        input_tokens = estimate_tokens(contents) + (estimate_tokens(system_prompt) if system_prompt else 0)
+        route = self.router.route(agent, input_tokens)
+        config = {"max_output_tokens": route["max_output_tokens"], **(generation_config or {})}
+        key = prompt_hash(route["model"] + repr(sorted(config.items())), _with_prefix(system_prompt, contents))
+        return self.singleflight.do(key, lambda: self._call_with_fallback(contents, agent, route, input_tokens, generation_config, system_prompt))
+
+    def generate_stream(self, contents, agent: str = "default", on_chunk=None, generation_config: dict = None,
+                        system_prompt: str = None) -> str:
+        """
+        Streams the response, calling `on_chunk(text)` for each piece as Gemini produces it,
+        and returns the full text. Streams are per-caller, so they bypass coalescing and hedging.
+        """
+        input_tokens = estimate_tokens(contents) + (estimate_tokens(system_prompt) if system_prompt else 0)
+        route = self.router.route(agent, input_tokens)
+        self.scheduler.acquire(agent, input_tokens + route["max_output_tokens"])
+        model, request_contents, cached = self._prepare(route, contents, system_prompt)
+        start = time.perf_counter()
+        response = model.generate_content(
+            request_contents,
+            generation_config={"max_output_tokens": route["max_output_tokens"], **(generation_config or {})},
+            request_options={"timeout": route["timeout_s"]},
+            stream=True,
+        )
+        pieces = []
+        for chunk in response:
+            pieces.append(chunk.text)
+            if on_chunk:
+                on_chunk(chunk.text)
+        self._record(agent, route, system_prompt, cached, input_tokens, time.perf_counter() - start)
+        return "".join(pieces)
+
+    def _get_model(self, model_name: str):
+        if model_name not in self._models:
+            self._models[model_name] = self.model_factory(model_name)
+        return self._models[model_name]
+
+    def _prepare(self, route: dict, contents, system_prompt: str):
+        """
+        Returns (model, contents, cached). When the system prompt is held in the context cache,
+        only the suffix is sent; otherwise the prefix is sent inline ahead of it.
+        """
+        if system_prompt is None:
+            return self._get_model(route["model"]), contents, False
+        if self.context_cache:
+            model = self.context_cache.lookup(route["model"], system_prompt, estimate_tokens(system_prompt))
+            if model is not None:
+                return model, contents, True
+        return self._get_model(route["model"]), _with_prefix(system_prompt, contents), False
+
+    def _record(self, agent: str, route: dict, system_prompt: str, cached: bool, input_tokens: int, seconds: float):
+        self.router.record_latency(agent, route, seconds)
+        if self.context_cache and system_prompt is not None:
+            self.context_cache.record(agent, cached, estimate_tokens(system_prompt), input_tokens, seconds)
+
+    def _call_with_fallback(self, contents, agent: str, route: dict, input_tokens: int, generation_config: dict = None,
+                            system_prompt: str = None) -> str:
+        try:
+            return self._call_model(contents, agent, route, input_tokens, generation_config, system_prompt)
+        except (google_exceptions.DeadlineExceeded, TimeoutError):
+            fallback = self.router.fallback(route)
+            if fallback is None:
+                raise
+            print(f"[router] agent={agent} model={route['model']} timed out after {route['timeout_s']}s; retrying on {fallback['model']}")
+            return self._call_model(contents, agent, fallback, input_tokens, generation_config, system_prompt)
+
+    def _call_model(self, contents, agent: str, route: dict, input_tokens: int, generation_config: dict = None,
+                    system_prompt: str = None) -> str:
+        if self.hedger:
+            return self.hedger.call(lambda: self._attempt(contents, agent, route, input_tokens, generation_config, system_prompt))
+        return self._attempt(contents, agent, route, input_tokens, generation_config, system_prompt)
+
+    def _attempt(self, contents, agent: str, route: dict, input_tokens: int, generation_config: dict = None,
+                 system_prompt: str = None) -> str:
+        # Each attempt (including a hedge) is a real upstream request and is budgeted as one.
+        self.scheduler.acquire(agent, input_tokens + route["max_output_tokens"])
+        model, request_contents, cached = self._prepare(route, contents, system_prompt)
+        start = time.perf_counter()
+        response = model.generate_content(
+            request_contents,
+            generation_config={"max_output_tokens": route["max_output_tokens"], **(generation_config or {})},
+            request_options={"timeout": route["timeout_s"]},
+        )
+        self._record(agent, route, system_prompt, cached, input_tokens, time.perf_counter() - start)
+        return response.text
+
+    def stats(self) -> dict:
+        return {
+            "singleflight": self.singleflight.stats(),
+            "scheduler": self.scheduler.stats(),
+            "hedging": self.hedger.stats() if self.hedger else None,
+            "routing": self.router.stats(),
+            "context_cache": self.context_cache.stats() if self.context_cache else None,
+        }
@@ -0,0 +1,212 @@
+import os
+import time
+import heapq
+import sqlite3
+import itertools
+import threading
+
+# --- CONFIGURATION ---
+# Lower number == served first.
+PRIORITY_CRITICAL = 0
+PRIORITY_HIGH = 1
+PRIORITY_NORMAL = 2
+PRIORITY_LOW = 3
+
+AGENT_PRIORITIES = {
+    'symptom_triage': PRIORITY_CRITICAL,
+    'drug_safety': PRIORITY_HIGH,
+    'translator': PRIORITY_HIGH,
+    'chronic_care': PRIORITY_NORMAL,
+    'evaluation': PRIORITY_NORMAL,
+    'doctors_copilot': PRIORITY_LOW,
+    'copilot_section': PRIORITY_LOW,
+    'batch_evaluation': PRIORITY_LOW,
+}
+
+DEFAULT_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+DEFAULT_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "1000000"))
+DEFAULT_SHED_QUEUE_DEPTH = int(os.getenv("LLM_SHED_QUEUE_DEPTH", "20"))
+# Set to a file path to share the budget between processes (e.g. several gunicorn workers).
+DEFAULT_RATE_DB_PATH = os.getenv("LLM_RATE_DB_PATH", "")
+
+LATENCY_WINDOW = 1000
+
+
+class LLMOverloadedError(Exception):
+    """Raised when low-priority work is shed because the LLM queue is too deep."""
+    def __init__(self, message: str, retry_after: int = 5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# --- RATE BUDGETS ---
+
+class LocalRateBudget:
+    """
+    In-process token buckets for requests-per-minute and tokens-per-minute.
+    Both dimensions are checked and consumed together so neither is over-drawn.
+    """
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self.request_tokens = float(requests_per_minute)
+        self.llm_tokens = float(tokens_per_minute)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, tokens: int) -> float:
+        """Consumes one request and `tokens` LLM tokens. Returns 0 on success, else seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self.updated_at
+            self.updated_at = now
+            self.request_tokens = min(self.rpm, self.request_tokens + elapsed * self.rpm / 60)
+            self.llm_tokens = min(self.tpm, self.llm_tokens + elapsed * self.tpm / 60)
+            return _consume_or_wait(self, tokens)
+
+
+class SQLiteRateBudget:
+    """
+    The same token buckets persisted in a local SQLite file, so that several
+    worker processes on one host share a single Gemini quota.
+    """
+    def __init__(self, db_path: str, requests_per_minute: int, tokens_per_minute: int, name: str = "gemini"):
+        self.db_path = db_path
+        self.name = name
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_budget ("
+                "name TEXT PRIMARY KEY, request_tokens REAL, llm_tokens REAL, updated_at REAL)"
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO rate_budget VALUES (?, ?, ?, ?)",
+                (name, float(requests_per_minute), float(tokens_per_minute), time.time()),
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+
+    def try_acquire(self, tokens: int) -> float:
+        conn = self._connect()
+        try:
+            # BEGIN IMMEDIATE takes the write lock up front, making read-modify-write atomic across processes.
+            conn.execute("BEGIN IMMEDIATE")
+            self.request_tokens, self.llm_tokens, updated_at = conn.execute(
+                "SELECT request_tokens, llm_tokens, updated_at FROM rate_budget WHERE name = ?", (self.name,)
+            ).fetchone()
+            now = time.time()
+            elapsed = max(0.0, now - updated_at)
+            self.request_tokens = min(self.rpm, self.request_tokens + elapsed * self.rpm / 60)
+            self.llm_tokens = min(self.tpm, self.llm_tokens + elapsed * self.tpm / 60)
+            wait = _consume_or_wait(self, tokens)
+            conn.execute(
+                "UPDATE rate_budget SET request_tokens = ?, llm_tokens = ?, updated_at = ? WHERE name = ?",
+                (self.request_tokens, self.llm_tokens, now, self.name),
+            )
+            conn.execute("COMMIT")
+            return wait
+        except Exception:
+            # A failed BEGIN IMMEDIATE (e.g. "database is locked") never opened a transaction;
+            # rolling back then would raise and hide the original error.
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+
+def _consume_or_wait(budget, tokens: int) -> float:
+    """Shared bucket arithmetic for both budget implementations (caller holds the lock)."""
+    tokens = min(tokens, budget.tpm)  # A single oversized prompt must still be able to run.
+    if budget.request_tokens >= 1 and budget.llm_tokens >= tokens:
+        budget.request_tokens -= 1
+        budget.llm_tokens -= tokens
+        return 0.0
+    request_wait = max(0.0, (1 - budget.request_tokens) * 60 / budget.rpm)
+    token_wait = max(0.0, (tokens - budget.llm_tokens) * 60 / budget.tpm)
+    return max(request_wait, token_wait)
+
+
+# --- SCHEDULER ---
+
+class LLMScheduler:
+    """
+    Process-wide admission control for Gemini calls.
+    Callers wait in a priority queue (urgent triage ahead of copilot summaries)
+    and are released only when the rate budget allows. When the queue is deeper
+    than `shed_queue_depth`, new low-priority work is rejected immediately.
+    """
+    def __init__(self, budget=None, shed_queue_depth: int = DEFAULT_SHED_QUEUE_DEPTH,
+                 shed_priority: int = PRIORITY_LOW, agent_priorities: dict = None):
+        self.budget = budget or LocalRateBudget(DEFAULT_REQUESTS_PER_MINUTE, DEFAULT_TOKENS_PER_MINUTE)
+        self.shed_queue_depth = shed_queue_depth
+        self.shed_priority = shed_priority
+        self.agent_priorities = agent_priorities or AGENT_PRIORITIES
+
+        self._queue = []  # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+        # --- Metrics ---
+        self.granted = {}
+        self.shed = {}
+        self._queue_times = {}
+
+    @classmethod
+    def from_env(cls):
+        if DEFAULT_RATE_DB_PATH:
+            budget = SQLiteRateBudget(DEFAULT_RATE_DB_PATH, DEFAULT_REQUESTS_PER_MINUTE, DEFAULT_TOKENS_PER_MINUTE)
+        else:
+            budget = LocalRateBudget(DEFAULT_REQUESTS_PER_MINUTE, DEFAULT_TOKENS_PER_MINUTE)
+        return cls(budget=budget)
+
+    def acquire(self, agent: str, estimated_tokens: int):
+        """Blocks until the call may proceed. Raises LLMOverloadedError if it is shed."""
+        priority = self.agent_priorities.get(agent, PRIORITY_NORMAL)
+        enqueued_at = time.monotonic()
+        with self._cond:
+            if priority >= self.shed_priority and len(self._queue) >= self.shed_queue_depth:
+                self.shed[priority] = self.shed.get(priority, 0) + 1
+                raise LLMOverloadedError(f"LLM queue is full ({len(self._queue)} waiting); shedding '{agent}' request.")
+
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._queue, ticket)
+            try:
+                while True:
+                    if self._queue[0] == ticket:
+                        wait = self.budget.try_acquire(estimated_tokens)
+                        if wait == 0:
+                            break
+                        self._cond.wait(timeout=wait)
+                    else:
+                        self._cond.wait()
+            finally:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+
+            queue_time = time.monotonic() - enqueued_at
+            self.granted[priority] = self.granted.get(priority, 0) + 1
+            times = self._queue_times.setdefault(priority, [])
+            times.append(queue_time)
+            if len(times) > LATENCY_WINDOW:
+                del times[0]
+
+    def stats(self) -> dict:
+        with self._cond:
+            queue_times = {}
+            for priority, times in self._queue_times.items():
+                ordered = sorted(times)
+                queue_times[priority] = {
+                    "p50_ms": round(ordered[len(ordered) // 2] * 1000, 2),
+                    "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 2),
+                    "max_ms": round(ordered[-1] * 1000, 2),
+                }
+            return {
+                "queue_depth": len(self._queue),
+                "granted_by_priority": dict(self.granted),
+                "shed_by_priority": dict(self.shed),
+                "queue_time_by_priority": queue_times,
+            }
@@ -0,0 +1,117 @@
+import os
+import threading
+from hedging import LatencyTracker
+
+# --- CONFIGURATION ---
+DEFAULT_MODEL = os.getenv("LLM_DEFAULT_MODEL", "gemini-1.5-flash")
+FAST_MODEL = os.getenv("LLM_FAST_MODEL", "gemini-1.5-flash-8b")
+BUDGET_PERCENTILE = 90
+MIN_SAMPLES = 10
+# While a model is over budget, still send 1 in PROBE_EVERY calls to it so its latency stats can recover.
+PROBE_EVERY = 10
+
+# Per agent, an ordered list of routes; the first one whose `max_input_tokens`
+# covers the prompt wins. `latency_budget_s` is the time we are willing to wait;
+# if the chosen model's observed p90 exceeds it, the call is routed to FAST_MODEL.
+ROUTING_TABLE = {
+    'drug_safety': [
+        {"max_input_tokens": 2000, "model": FAST_MODEL, "max_output_tokens": 512, "timeout_s": 15, "latency_budget_s": 4},
+        {"max_input_tokens": None, "model": DEFAULT_MODEL, "max_output_tokens": 768, "timeout_s": 30, "latency_budget_s": 8},
+    ],
+    'symptom_triage': [
+        {"max_input_tokens": None, "model": DEFAULT_MODEL, "max_output_tokens": 768, "timeout_s": 20, "latency_budget_s": 5},
+    ],
+    'translator': [
+        {"max_input_tokens": 4000, "model": DEFAULT_MODEL, "max_output_tokens": 1024, "timeout_s": 30, "latency_budget_s": 10},
+        {"max_input_tokens": None, "model": DEFAULT_MODEL, "max_output_tokens": 2048, "timeout_s": 60, "latency_budget_s": 20},
+    ],
+    'chronic_care': [
+        {"max_input_tokens": None, "model": DEFAULT_MODEL, "max_output_tokens": 1024, "timeout_s": 45, "latency_budget_s": 15},
+    ],
+    'doctors_copilot': [
+        {"max_input_tokens": 4000, "model": DEFAULT_MODEL, "max_output_tokens": 2048, "timeout_s": 60, "latency_budget_s": 20},
+        {"max_input_tokens": None, "model": DEFAULT_MODEL, "max_output_tokens": 4096, "timeout_s": 90, "latency_budget_s": 40},
+    ],
+    # Per-section extraction for long copilot notes: small inputs and short, list-only outputs.
+    'copilot_section': [
+        {"max_input_tokens": 3000, "model": FAST_MODEL, "max_output_tokens": 768, "timeout_s": 20, "latency_budget_s": 6},
+        {"max_input_tokens": None, "model": DEFAULT_MODEL, "max_output_tokens": 1024, "timeout_s": 45, "latency_budget_s": 15},
+    ],
+    'evaluation': [
+        {"max_input_tokens": 3000, "model": FAST_MODEL, "max_output_tokens": 768, "timeout_s": 20, "latency_budget_s": 5},
+        {"max_input_tokens": None, "model": DEFAULT_MODEL, "max_output_tokens": 1024, "timeout_s": 30, "latency_budget_s": 10},
+    ],
+    # Offline re-scoring packs several outputs per prompt, so it needs room for several verdicts.
+    'batch_evaluation': [
+        {"max_input_tokens": None, "model": DEFAULT_MODEL, "max_output_tokens": 4096, "timeout_s": 120, "latency_budget_s": 60},
+    ],
+}
+DEFAULT_ROUTE = {"max_input_tokens": None, "model": DEFAULT_MODEL, "max_output_tokens": 1024, "timeout_s": 60, "latency_budget_s": 20}
+
+
+class ModelRouter:
+    """
+    Picks the model, output-token cap and timeout for each LLM call from ROUTING_TABLE,
+    and falls back to FAST_MODEL when the chosen model is running over its latency budget.
+    """
+    def __init__(self, routing_table: dict = None, fast_model: str = FAST_MODEL):
+        self.routing_table = routing_table or ROUTING_TABLE
+        self.fast_model = fast_model
+        self._latencies = {}  # (agent, model name) -> LatencyTracker
+        self._lock = threading.Lock()
+        self.decisions = {}  # (agent, model, reason) -> count
+        self._fallbacks_since_probe = {}  # model name -> count
+
+    def _tracker(self, agent: str, model: str) -> LatencyTracker:
+        with self._lock:
+            return self._latencies.setdefault((agent, model), LatencyTracker())
+
+    def route(self, agent: str, input_tokens: int) -> dict:
+        """Returns a copy of the selected route, annotated with the reason it was chosen."""
+        routes = self.routing_table.get(agent, [DEFAULT_ROUTE])
+        route = next((r for r in routes if r["max_input_tokens"] is None or input_tokens <= r["max_input_tokens"]), routes[-1])
+        route = dict(route, reason="table")
+
+        tracker = self._tracker(agent, route["model"])
+        if route["model"] != self.fast_model and tracker.count() >= MIN_SAMPLES:
+            expected = tracker.percentile(BUDGET_PERCENTILE)
+            if expected > route["latency_budget_s"]:
+                with self._lock:
+                    skipped = self._fallbacks_since_probe.get(route["model"], 0) + 1
+                    self._fallbacks_since_probe[route["model"]] = 0 if skipped >= PROBE_EVERY else skipped
+                if skipped >= PROBE_EVERY:
+                    route["reason"] = "latency_probe"
+                else:
+                    route.update(model=self.fast_model, reason=f"latency_budget (p{BUDGET_PERCENTILE}={expected:.1f}s > {route['latency_budget_s']}s)")
+
+        key = (agent, route["model"], route["reason"].split(" ")[0])
+        with self._lock:
+            self.decisions[key] = self.decisions.get(key, 0) + 1
+        print(f"[router] agent={agent} input_tokens={input_tokens} -> model={route['model']} "
+              f"max_output_tokens={route['max_output_tokens']} timeout={route['timeout_s']}s ({route['reason']})")
+        return route
+
+    def fallback(self, route: dict) -> dict:
+        """Returns the route to retry with after `route` timed out, or None if already on the fast model."""
+        if route["model"] == self.fast_model:
+            return None
+        return dict(route, model=self.fast_model, reason="timeout_fallback")
+
+    def record_latency(self, agent: str, route: dict, seconds: float):
+        self._tracker(agent, route["model"]).record(seconds)
+        print(f"[router] agent={agent} model={route['model']} completed in {seconds * 1000:.0f} ms")
+
+    def stats(self) -> dict:
+        with self._lock:
+            trackers = dict(self._latencies)
+            decisions = [
+                {"agent": agent, "model": model, "reason": reason, "count": count}
+                for (agent, model, reason), count in self.decisions.items()
+            ]
+        return {
+            "decisions": decisions,
+            "p90_latency_ms": {
+                f"{agent}:{model}": round(t.percentile(BUDGET_PERCENTILE) * 1000, 2)
+                for (agent, model), t in trackers.items() if t.count()
+            },
+        }
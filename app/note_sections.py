@@ -0,0 +1,68 @@
+import re
+
+# --- CONFIGURATION ---
+# Section headings (lower-cased, without the trailing colon) grouped into the sections the
+# copilot extracts separately. Text before the first recognized heading belongs to 'hpi'.
+SECTION_HEADINGS = {
+    'hpi': [
+        'chief complaint', 'cc', 'history of present illness', 'hpi', 'subjective', 'history', 'interval history',
+        'past medical history', 'pmh', 'medications', 'current medications', 'home medications', 'allergies',
+        'social history', 'family history', 'review of systems', 'ros',
+    ],
+    'exam': ['physical exam', 'physical examination', 'exam', 'examination', 'objective', 'vitals', 'vital signs'],
+    'labs': [
+        'labs', 'laboratory', 'laboratory results', 'lab results', 'results', 'imaging', 'diagnostics', 'data', 'studies',
+    ],
+    'plan': [
+        'assessment and plan', 'assessment & plan', 'a/p', 'a&p', 'assessment', 'impression', 'plan',
+        'recommendations', 'disposition',
+    ],
+}
+SECTION_ORDER = list(SECTION_HEADINGS)
+
+_HEADING_TO_SECTION = {heading: section for section, headings in SECTION_HEADINGS.items() for heading in headings}
+# A heading starts a line and ends with a colon (the text may continue on the same line),
+# or stands alone on its line. Longer headings are tried first ("assessment and plan" before "assessment").
+HEADING_PATTERN = re.compile(
+    r"^[ \t]*(?P<heading>" + "|".join(re.escape(h) for h in sorted(_HEADING_TO_SECTION, key=len, reverse=True)) + r")"
+    r"[ \t]*(?::|[ \t]*$)",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+
+def split_sections(note: str) -> dict:
+    """
+    Splits an encounter note into its HPI, exam, labs and plan sections by their headings.
+    Returns {section: text} in SECTION_ORDER, omitting empty sections; repeated headings
+    (e.g. "Medications" and "Allergies" both belong to 'hpi') are concatenated.
+    """
+    parts = {section: [] for section in SECTION_ORDER}
+    section, start = 'hpi', 0
+    for match in HEADING_PATTERN.finditer(note):
+        parts[section].append(note[start:match.start()])
+        section, start = _HEADING_TO_SECTION[match.group('heading').lower()], match.start()
+    parts[section].append(note[start:])
+    return {name: text for name in SECTION_ORDER if (text := "\n".join(p.strip() for p in parts[name] if p.strip()))}
+
+
+SENTENCE_PATTERN = re.compile(r"[^.!?\n]+(?:[.!?]+|\n|$)")
+
+
+def split_windows(text: str, max_words: int) -> list:
+    """
+    Splits a section into windows of whole sentences of at most `max_words` words each, so
+    every window fits an embedding model's input limit; a longer sentence is cut by words.
+    """
+    windows, current = [], []
+    for sentence in SENTENCE_PATTERN.findall(text):
+        words = sentence.split()
+        if current and len(current) + len(words) > max_words:
+            windows.append(" ".join(current))
+            current = []
+        while len(words) > max_words:
+            windows.append(" ".join(words[:max_words]))
+            words = words[max_words:]
+        current.extend(words)
+    if current:
+        windows.append(" ".join(current))
+    return windows
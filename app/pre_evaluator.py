@@ -0,0 +1,210 @@
+import os
+import re
+import random
+import threading
+
+# --- CONFIGURATION ---
+DEFAULT_AUDIT_SAMPLE_RATE = float(os.getenv("PRE_EVALUATOR_AUDIT_RATE", "0.05"))
+PASS_THRESHOLD = 4  # Every criterion must score at least this to skip the LLM reviewer.
+
+# Alert severities and Agent 1 verdicts that must never ship without a completed review.
+SAFETY_CRITICAL_SEVERITIES = {"high", "critical"}
+
+# Expected fields for each Agent 1 output, identified by a key only that output has.
+EXPECTED_FIELDS = {
+    'drug_information': ['safety_alerts', 'drug_information', 'questions_for_your_doctor'],
+    'key_findings': ['summary', 'key_findings', 'next_steps', 'urgency'],
+    'reasoning': ['recommendation', 'reasoning'],
+    'trend_summary': ['trend_summary', 'risk_assessment', 'behavioral_nudges'],
+    'soap_summary': ['soap_summary', 'guideline_checklist', 'draft_orders'],
+}
+# Fields that carry the "what to do next" part of each output.
+ACTION_FIELDS = ['next_steps', 'behavioral_nudges', 'questions_for_your_doctor', 'draft_orders', 'recommendation']
+
+CONSULT_PATTERN = re.compile(r"\b(consult|talk to|speak (?:to|with)|see|book|contact)\b.{0,40}\b(doctor|physician|gp|healthcare provider|pharmacist|clinician)\b|\bemergency services\b|\bgo to (?:the )?er\b", re.IGNORECASE)
+# Amounts like "500 mg" are doses; concentrations like "145 mg/dL" are lab values and are ignored.
+DOSE_PATTERN = re.compile(r"\b\d+(?:\.\d+)?\s?(?:mg|mcg|µg|g|ml|units?|iu)\b(?!\s*/)", re.IGNORECASE)
+DIAGNOSIS_PATTERN = re.compile(r"\byou (?:have|are suffering from|are diagnosed with)\b", re.IGNORECASE)
+ACTION_PATTERN = re.compile(r"\b(should|recommend|consider|avoid|drink|rest|monitor|take|book|schedule|follow up|discuss|ask|seek|call)\b", re.IGNORECASE)
+WORD_PATTERN = re.compile(r"[A-Za-z]+")
+SENTENCE_PATTERN = re.compile(r"[.!?]+")
+VOWEL_GROUP_PATTERN = re.compile(r"[aeiouy]+")
+EXPLANATION_SKIP_KEYS = frozenset({"agent_type", "safety_alerts", "drug_name"})
+# Key terms of rule-engine alert messages, tried in order: the drug pair of an interaction,
+# the drugs of a duplicate therapy, else any quoted name (allergen drug, symptom flag).
+ALERT_TERM_PATTERNS = [
+    re.compile(r"\bbetween (.+?) and (.+?)\."),
+    re.compile(r"\bfound: ([^.]+)\."),
+    re.compile(r"'([^']+)'"),
+]
+
+
+def requires_synchronous_review(agent1_output: dict) -> bool:
+    """
+    Returns True when Agent 1's output carries a safety-critical signal (a symptom red flag,
+    a High/Critical rule-engine alert, or a High urgency/risk verdict), so its evaluation
+    must be completed before the response is returned.
+    """
+    alerts = agent1_output.get("safety_alerts", []) or []
+    if any(str(alert.get("severity", "")).lower() in SAFETY_CRITICAL_SEVERITIES for alert in alerts):
+        return True
+    if agent1_output.get("recommendation") == "Go to ER now":
+        return True
+    if str(agent1_output.get("urgency", "")).lower() == "high":
+        return True
+    risk = agent1_output.get("risk_assessment") or {}
+    return isinstance(risk, dict) and str(risk.get("level", "")).lower() == "high"
+
+
+# --- HELPER FUNCTIONS ---
+
+def _collect_text(value, skip_keys: frozenset = frozenset({"agent_type"})) -> list[str]:
+    """Flattens every string in a nested dict/list structure, except under `skip_keys`."""
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, dict):
+        return [text for key, item in value.items() if key not in skip_keys for text in _collect_text(item, skip_keys)]
+    if isinstance(value, list):
+        return [text for item in value for text in _collect_text(item, skip_keys)]
+    return []
+
+def _count_syllables(word: str) -> int:
+    word = word.lower()
+    count = len(VOWEL_GROUP_PATTERN.findall(word))
+    if word.endswith("e") and count > 1:
+        count -= 1
+    return max(1, count)
+
+def flesch_reading_ease(text: str) -> float:
+    words = WORD_PATTERN.findall(text)
+    if not words:
+        return 0.0
+    sentences = max(1, len(SENTENCE_PATTERN.findall(text)))
+    syllables = sum(_count_syllables(w) for w in words)
+    return 206.835 - 1.015 * (len(words) / sentences) - 84.6 * (syllables / len(words))
+
+def _is_filled(value) -> bool:
+    return value not in (None, "", [], {})
+
+def _alert_terms(message: str) -> list[str]:
+    for pattern in ALERT_TERM_PATTERNS:
+        match = pattern.search(message)
+        if match:
+            return [term.strip() for group in match.groups() for term in group.split(",") if term.strip()]
+    return [message]
+
+def _alert_echoed(alert: dict, explanation: str) -> bool:
+    """True when the explanation mentions the alert's key terms (e.g. both drugs of an interaction)."""
+    message = alert.get("message") or ""
+    return bool(message) and all(term.lower() in explanation for term in _alert_terms(message))
+
+
+class PreEvaluator:
+    """
+    Deterministic first tier of Agent 2. Scores an Agent 1 output from cheap local
+    signals (readability, safety phrasing, dose mentions, schema completeness,
+    echoed rule-engine alerts) and decides whether the LLM reviewer is needed.
+    """
+    def __init__(self, audit_sample_rate: float = DEFAULT_AUDIT_SAMPLE_RATE, rng: random.Random = None):
+        self.audit_sample_rate = audit_sample_rate
+        self.rng = rng or random.Random()
+        self._lock = threading.Lock()
+
+        # --- Metrics ---
+        self.decisions = {}
+
+    def compute_signals(self, agent1_output: dict) -> dict:
+        text = " ".join(_collect_text(agent1_output))
+        signature = next((key for key in EXPECTED_FIELDS if key in agent1_output), None)
+        expected = EXPECTED_FIELDS.get(signature, [])
+        present = [field for field in expected if _is_filled(agent1_output.get(field))]
+        alerts = agent1_output.get("safety_alerts") or []
+        # The alerts (and the drug names heading each explanation) are part of `text`, so echoes
+        # are looked for in the explanatory fields only.
+        explanation = " ".join(_collect_text(agent1_output, EXPLANATION_SKIP_KEYS)).lower()
+        return {
+            "is_error": "error" in agent1_output,
+            "reading_ease": round(flesch_reading_ease(text), 1),
+            "mentions_consult_doctor": bool(CONSULT_PATTERN.search(text)),
+            # The copilot is clinician-facing, so doses in its draft orders are expected.
+            "dose_mentions": 0 if signature == 'soap_summary' else len(DOSE_PATTERN.findall(text)),
+            "definitive_diagnosis": bool(DIAGNOSIS_PATTERN.search(text)),
+            "action_cues": len(ACTION_PATTERN.findall(text)),
+            "has_action_fields": any(_is_filled(agent1_output.get(f)) for f in ACTION_FIELDS),
+            "schema": signature,
+            "completeness": len(present) / len(expected) if expected else 0.0,
+            "alerts_echoed": all(_alert_echoed(alert, explanation) for alert in alerts),
+            "high_risk": requires_synchronous_review(agent1_output),
+        }
+
+    def score(self, signals: dict) -> dict:
+        """Maps signals onto the same 1-5 criteria the LLM reviewer uses."""
+        ease = signals["reading_ease"]
+        clarity = 5 if ease >= 60 else 4 if ease >= 50 else 3 if ease >= 40 else 2 if ease >= 30 else 1
+
+        actionability = 1 + min(2, signals["action_cues"] // 2) + (2 if signals["has_action_fields"] else 0)
+
+        safety = 5
+        if signals["dose_mentions"]:
+            safety -= 2
+        if not signals["mentions_consult_doctor"]:
+            safety -= 2
+        if signals["definitive_diagnosis"]:
+            safety -= 1
+        if not signals["alerts_echoed"]:
+            safety -= 2
+
+        completeness = round(signals["completeness"] * 5)
+        return {name: max(1, min(5, value)) for name, value in (
+            ("Clarity", clarity), ("Actionability", actionability), ("Safety", safety), ("Completeness", completeness)
+        )}
+
+    def assess(self, agent1_output: dict) -> tuple[str, dict]:
+        """
+        Returns (decision, evaluation). `decision` is 'local' when the local evaluation
+        can be used as-is, or 'llm:<reason>' when the LLM reviewer must be consulted.
+        """
+        signals = self.compute_signals(agent1_output)
+        scores = self.score(signals)
+
+        if signals["is_error"]:
+            decision = "local"
+        elif signals["high_risk"]:
+            decision = "llm:high_risk"
+        elif signals["dose_mentions"]:
+            decision = "llm:dose_mentions"
+        elif min(scores.values()) < PASS_THRESHOLD:
+            decision = "llm:borderline"
+        elif self.rng.random() < self.audit_sample_rate:
+            decision = "llm:audit_sample"
+        else:
+            decision = "local"
+
+        with self._lock:
+            self.decisions[decision] = self.decisions.get(decision, 0) + 1
+
+        overall = round(sum(scores.values()) / len(scores), 2)
+        evaluation = {
+            "overall_quality_score": overall,
+            "evaluation_details": [
+                {"criterion": name, "score": value, "justification": "Scored by the local pre-evaluator."}
+                for name, value in scores.items()
+            ],
+            "final_recommendation": (
+                "Caution: Agent 1 did not produce a usable result and should be reviewed."
+                if signals["is_error"] else
+                "The output passed automated clarity, safety and completeness checks."
+            ),
+            "reviewer": "local_pre_evaluator",
+            "signals": signals,
+        }
+        return decision, evaluation
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = sum(self.decisions.values())
+            local = self.decisions.get("local", 0)
+            return {
+                "decisions": dict(self.decisions),
+                "local_rate": local / total if total else 0.0,
+            }
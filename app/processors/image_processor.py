@@ -1,54 +1,43 @@
 # File: app/processors/image_processor.py
 
-import streamlit as st
-import easyocr
-import spacy
 import re
 import os
+from stage_executor import run_ocr, extract_entities, StageOverloadedError
 
-# --- NEW: Helper function to download SpaCy model ---
-@st.cache_resource
-def download_spacy_model():
-    model_name = "en_core_sci_sm"
-    try:
-        spacy.load(model_name)
-    except OSError:
-        print(f"Downloading SpaCy model: {model_name}...")
-        spacy.cli.download(model_name)
-        print("Download complete.")
-    return spacy.load(model_name)
+# EasyOCR and scispaCy run in their own process pools (see stage_executor.py).
 
-# --- INITIALIZATION ---
-print("Initializing EasyOCR Reader for image processing...")
-reader = easyocr.Reader(['en'])
+# Bump when the output for the same file changes (cleaning, models), invalidating cached results.
+PROCESSOR_VERSION = "1"
 
-print("Loading SciSpacy model for image processing...")
-nlp = download_spacy_model()
-    
 # --- HELPER FUNCTIONS ---
 def clean_and_structure_text(text: str) -> dict:
     cleaned_text = re.sub(r'\s+', ' ', text).strip()
-    doc = nlp(cleaned_text)
-    entities = [{"text": ent.text, "label": ent.label_} for ent in doc.ents]
+    entities = extract_entities(cleaned_text)
     return {
         "cleaned_text": cleaned_text,
         "extracted_data": {"generic_entities": entities}
     }
 
 # --- MAIN PROCESSOR FUNCTION ---
-def process_image(image_path: str) -> dict:
+def process_image(source, filename: str = None) -> dict:
+    """`source` is the image's path or its encoded bytes (decoded in the OCR process); `filename` names it in the result."""
     try:
-        if not os.path.exists(image_path):
-            return {"error": f"File not found: {image_path}"}
-        results = reader.readtext(image_path)
-        raw_text = ' '.join([res[1] for res in results])
+        if isinstance(source, str) and not os.path.exists(source):
+            return {"error": f"File not found: {source}"}
+        results = run_ocr(source)  # [(text, confidence), ...]
+        raw_text = ' '.join([res[0] for res in results])
         if not raw_text.strip():
             return {"error": "Could not extract any text from the image."}
         structured_result = clean_and_structure_text(raw_text)
+        # Character-weighted mean of EasyOCR's per-box confidence, so short noisy boxes count less.
+        ocr_confidence = sum(len(res[0]) * res[1] for res in results) / max(1, sum(len(res[0]) for res in results))
         return {
-            "source_file": os.path.basename(image_path),
+            "source_file": filename or os.path.basename(source),
             "cleaned_text": structured_result["cleaned_text"],
-            "extracted_data": structured_result["extracted_data"]
+            "extracted_data": structured_result["extracted_data"],
+            "ocr_confidence": round(float(ocr_confidence), 3)
         }
+    except StageOverloadedError:
+        raise  # Reported to the client as a retryable 503
     except Exception as e:
         return {"error": f"An unexpected error occurred during image processing: {str(e)}"}
\ No newline at end of file
@@ -1,4 +1,5 @@
 import pandas as pd
+import io
 import os
 
 # --- CONFIGURATION ---
@@ -23,17 +24,20 @@ def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
 
 # --- MAIN PROCESSOR FUNCTION ---
 
-def process_spreadsheet(file_path: str) -> dict:
+def process_spreadsheet(source, filename: str = None) -> dict:
     """
     Main function to process a single spreadsheet file.
-    Called by the Flask app.
+    Called by the Flask app. `source` is the file's path or its bytes; `filename` names it
+    (and gives its type) when only bytes are passed.
     """
     try:
-        if not os.path.exists(file_path):
-            return {"error": f"File not found: {file_path}"}
-            
-        file_extension = file_path.rsplit('.', 1)[1].lower()
-        df = pd.read_excel(file_path) if file_extension in ['xlsx', 'xls'] else pd.read_csv(file_path)
+        if isinstance(source, str) and not os.path.exists(source):
+            return {"error": f"File not found: {source}"}
+
+        filename = filename or os.path.basename(source)
+        file_extension = filename.rsplit('.', 1)[1].lower()
+        data = source if isinstance(source, str) else io.BytesIO(source)
+        df = pd.read_excel(data) if file_extension in ['xlsx', 'xls'] else pd.read_csv(data)
 
         if df.empty:
             return {"error": "Spreadsheet is empty."}
@@ -47,7 +51,7 @@ def process_spreadsheet(file_path: str) -> dict:
         records = normalized_df.to_dict(orient='records')
         
         return {
-            "source_file": os.path.basename(file_path),
+            "source_file": filename,
             "data_type": "structured_log",
             "records": records
         }
@@ -0,0 +1,112 @@
+import re
+import time
+import threading
+import statistics
+import numpy as np
+import faiss
+
+# --- CONFIGURATION ---
+DEFAULT_SIMILARITY_THRESHOLD = 0.92
+DEFAULT_TTL_SECONDS = 6 * 60 * 60
+DEFAULT_MAX_ENTRIES = 512
+LATENCY_WINDOW = 1000
+
+
+def normalize_symptom_text(text: str) -> str:
+    """Lowercases, strips punctuation and collapses whitespace so trivial variations embed identically."""
+    text = re.sub(r"[^a-z0-9\s]", " ", text.lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class SemanticCache:
+    """
+    A small semantic cache for LLM answers, backed by an in-memory FAISS index.
+    Queries are embedded with the same MiniLM model used for RAG and matched by
+    cosine similarity, so paraphrased inputs can reuse a prior answer.
+    """
+    def __init__(self, embedding_model, similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+                 ttl_seconds: int = DEFAULT_TTL_SECONDS, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.embedding_model = embedding_model
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        dimension = embedding_model.get_sentence_embedding_dimension()
+        # Inner product on L2-normalized vectors == cosine similarity.
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+        self.entries = {}  # id -> {"text", "value", "created_at"}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+        # --- Metrics ---
+        self.hits = 0
+        self.misses = 0
+        self._hit_latencies = []
+        self._miss_latencies = []
+
+    def _embed(self, text: str) -> np.ndarray:
+        embedding = self.embedding_model.encode([normalize_symptom_text(text)])
+        embedding = np.asarray(embedding, dtype="float32")
+        faiss.normalize_L2(embedding)
+        return embedding
+
+    def _evict(self, now: float, reserve: int = 0):
+        """Drops expired entries, then the oldest ones until `reserve` new entries fit in max_entries."""
+        expired = [i for i, e in self.entries.items() if now - e["created_at"] > self.ttl_seconds]
+        overflow = len(self.entries) - len(expired) - self.max_entries + reserve
+        if overflow > 0:
+            expired_ids = set(expired)
+            alive = sorted((e["created_at"], i) for i, e in self.entries.items() if i not in expired_ids)
+            expired.extend(i for _, i in alive[:overflow])
+        if expired:
+            self.index.remove_ids(np.array(expired, dtype="int64"))
+            for i in expired:
+                del self.entries[i]
+
+    def lookup(self, text: str):
+        """Returns the cached value for the most similar prior query, or None on a miss."""
+        embedding = self._embed(text)
+        with self._lock:
+            self._evict(time.time())
+            if self.index.ntotal == 0:
+                self.misses += 1
+                return None
+            scores, ids = self.index.search(embedding, 1)
+            if ids[0][0] != -1 and scores[0][0] >= self.similarity_threshold:
+                self.hits += 1
+                return self.entries[int(ids[0][0])]["value"]
+            self.misses += 1
+            return None
+
+    def store(self, text: str, value):
+        embedding = self._embed(text)
+        with self._lock:
+            now = time.time()
+            self._evict(now, reserve=1)
+            entry_id = self._next_id
+            self._next_id += 1
+            self.index.add_with_ids(embedding, np.array([entry_id], dtype="int64"))
+            self.entries[entry_id] = {"text": text, "value": value, "created_at": now}
+
+    def record_latency(self, hit: bool, seconds: float):
+        """Records the end-to-end latency of a request served from (hit) or past (miss) the cache."""
+        with self._lock:
+            latencies = self._hit_latencies if hit else self._miss_latencies
+            latencies.append(seconds)
+            if len(latencies) > LATENCY_WINDOW:
+                del latencies[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            p50_hit = statistics.median(self._hit_latencies) if self._hit_latencies else None
+            p50_miss = statistics.median(self._miss_latencies) if self._miss_latencies else None
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "p50_hit_latency_ms": round(p50_hit * 1000, 2) if p50_hit is not None else None,
+                "p50_miss_latency_ms": round(p50_miss * 1000, 2) if p50_miss is not None else None,
+                "p50_latency_saved_ms": round((p50_miss - p50_hit) * 1000, 2) if p50_hit is not None and p50_miss is not None else None,
+            }
@@ -0,0 +1,64 @@
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into a single execution.
+    The first caller (the leader) runs the function; callers arriving while it
+    is in flight wait on the leader's future and receive the same result or
+    the same exception. Nothing is cached once the call has completed.
+    """
+    def __init__(self):
+        self._calls = {}  # key -> Future
+        self._lock = threading.Lock()
+
+        # --- Metrics ---
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn, timeout: float = None):
+        """
+        Runs fn() once per in-flight key and returns its result.
+        `timeout` only bounds how long a follower waits; a follower giving up
+        raises TimeoutError without affecting the leader or other followers.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                future.set_running_or_notify_cancel()
+                self._calls[key] = future
+                self.executions += 1
+            else:
+                self.coalesced += 1
+
+        if not is_leader:
+            return future.result(timeout=timeout)
+
+        try:
+            result = fn()
+        except BaseException as e:
+            # Propagate failures (including interrupts/cancellation) to every waiter, so
+            # nobody blocks forever on an abandoned call. The key is released below, so
+            # the next request retries instead of replaying the error.
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                if self._calls.get(key) is future:
+                    del self._calls[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.executions + self.coalesced
+            return {
+                "in_flight": len(self._calls),
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "coalesce_rate": self.coalesced / total if total else 0.0,
+            }
@@ -0,0 +1,256 @@
+import os
+import math
+import time
+import threading
+import multiprocessing
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# --- CONFIGURATION ---
+# Each heavy model gets its own process pool, so OCR, NER and embedding neither contend for
+# the GIL nor oversubscribe the cores with torch's intra-op threads. Per stage:
+#   STAGE_<NAME>_PROCESSES      processes in the pool (0 runs the stage in the calling thread)
+#   STAGE_<NAME>_TORCH_THREADS  torch intra-op threads per process
+#   STAGE_<NAME>_MAX_PENDING    queued + running tasks before new ones are rejected
+CPU_COUNT = os.cpu_count() or 1
+STAGE_DEFAULTS = {
+    "ocr": (1, max(1, CPU_COUNT // 2), 8),        # EasyOCR: seconds per page, the most threads
+    "ner": (1, 1, 32),                           # scispaCy: tens of ms per document
+    "embedding": (1, 1, 64),                     # MiniLM: a few ms per query
+}
+NER_MODEL_NAME = "en_core_sci_sm"
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+DEFAULT_TASK_SECONDS = 1.0  # Retry-After estimate before a stage has completed any task
+RESTART_RETRY_AFTER = 5  # Retry-After while a crashed stage's pool is being replaced
+
+
+class StageOverloadedError(Exception):
+    """Raised when a stage's queue is full; `retry_after` is in seconds."""
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# --- MODELS (loaded once per process) ---
+@lru_cache(maxsize=None)
+def load_ocr_reader():
+    import easyocr
+    print("Initializing EasyOCR Reader...")
+    return easyocr.Reader(['en'])
+
+@lru_cache(maxsize=None)
+def load_ner_model():
+    import spacy
+    try:
+        return spacy.load(NER_MODEL_NAME)
+    except OSError:
+        print(f"Downloading SpaCy model: {NER_MODEL_NAME}...")
+        spacy.cli.download(NER_MODEL_NAME)
+        print("Download complete.")
+    return spacy.load(NER_MODEL_NAME)
+
+@lru_cache(maxsize=None)
+def load_embedding_model():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+MODEL_LOADERS = {"ocr": load_ocr_reader, "ner": load_ner_model, "embedding": load_embedding_model}
+
+def preload_models():
+    """Loads every model in this process; a prefork server calls it before forking (see gunicorn_conf.py)."""
+    for loader in MODEL_LOADERS.values():
+        loader()
+
+
+# --- TASKS (run inside the pool processes) ---
+def _init_process(stage: str, torch_threads: int):
+    os.environ["OMP_NUM_THREADS"] = str(torch_threads)
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except ImportError:
+        pass
+    MODEL_LOADERS[stage]()
+
+def _warm_up():
+    return os.getpid()
+
+def _readtext(source) -> list:
+    return [(text, float(confidence)) for _, text, confidence in load_ocr_reader().readtext(source)]
+
+def _entities(text: str) -> list:
+    return [{"text": ent.text, "label": ent.label_} for ent in load_ner_model()(text).ents]
+
+def _encode(texts: list):
+    return load_embedding_model().encode(texts)
+
+def _embedding_dimension() -> int:
+    return load_embedding_model().get_sentence_embedding_dimension()
+
+
+class StageExecutor:
+    """
+    A bounded process pool dedicated to one model. `run` blocks the caller until the task
+    finishes in a pool process, or raises StageOverloadedError at once when `max_pending`
+    tasks are already queued or running, so callers can shed load instead of piling up.
+    """
+    def __init__(self, stage: str, processes: int, torch_threads: int, max_pending: int):
+        self.stage = stage
+        self.processes = processes
+        self.torch_threads = torch_threads
+        self.max_pending = max_pending
+        self._pool = None
+        self._lock = threading.Lock()
+
+        # --- Metrics ---
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.failed = 0
+        self.restarts = 0
+        self.task_seconds = 0.0
+
+    def start(self, fork: bool = False):
+        """
+        Starts the pool and waits for its processes to load the model. Forking keeps weights a
+        prefork master already loaded shared and doesn't re-run the server's main module, but
+        is only safe before other threads exist (see start_executors): a fork can copy a lock
+        another thread holds. Otherwise the pool comes from a forkserver, which, like spawn,
+        imports the server's main module in each new process.
+        """
+        if self.processes:
+            if fork:
+                context = multiprocessing.get_context("fork")
+            else:
+                context = multiprocessing.get_context("forkserver")
+                context.set_forkserver_preload([__name__])
+            pool = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=context,
+                initializer=_init_process,
+                initargs=(self.stage, self.torch_threads),
+            )
+            pool.submit(_warm_up).result()
+            with self._lock:
+                self._pool = pool
+        return self
+
+    def run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                avg_seconds = self.task_seconds / self.completed if self.completed else DEFAULT_TASK_SECONDS
+                retry_after = max(1, math.ceil(avg_seconds * self.pending / max(1, self.processes)))
+                raise StageOverloadedError(f"The {self.stage} stage is at capacity ({self.pending} pending); retry later.", retry_after)
+            pool = self._pool
+            if self.processes and pool is None:
+                self.rejected += 1
+                raise StageOverloadedError(f"The {self.stage} stage is restarting; retry later.", RESTART_RETRY_AFTER)
+            self.pending += 1
+
+        start_time = time.perf_counter()
+        try:
+            result = pool.submit(fn, *args).result() if pool else fn(*args)
+        except BrokenProcessPool:
+            # A pool process died (e.g. out of memory): replace the pool for the next task.
+            with self._lock:
+                self.pending -= 1
+                self.failed += 1
+            self._restart(pool)
+            raise RuntimeError(f"The {self.stage} worker process exited unexpectedly.")
+        except BaseException:
+            with self._lock:
+                self.pending -= 1
+                self.failed += 1
+            raise
+        # Only successful tasks feed the average behind the Retry-After estimate.
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+            self.task_seconds += time.perf_counter() - start_time
+        return result
+
+    def _restart(self, broken_pool):
+        with self._lock:
+            if self._pool is not broken_pool:
+                return  # Another thread is already replacing it
+            self._pool = None
+            self.restarts += 1
+        print(f"Restarting the {self.stage} process pool.")
+        broken_pool.shutdown(wait=False, cancel_futures=True)
+        try:
+            self.start()
+        except Exception as e:
+            print(f"CRITICAL: Could not restart the {self.stage} process pool; the stage will keep shedding requests. Error: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "processes": self.processes,
+                "torch_threads": self.torch_threads,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "failed": self.failed,
+                "pool_restarts": self.restarts,
+                "avg_task_seconds": self.task_seconds / self.completed if self.completed else 0.0,
+            }
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+def get_executor(stage: str, fork: bool = False) -> StageExecutor:
+    """The stage's executor, created (and its pool started) on first use."""
+    with _executors_lock:
+        if stage not in _executors:
+            processes, torch_threads, max_pending = STAGE_DEFAULTS[stage]
+            prefix = f"STAGE_{stage.upper()}_"
+            _executors[stage] = StageExecutor(
+                stage,
+                processes=int(os.getenv(prefix + "PROCESSES", str(processes))),
+                torch_threads=int(os.getenv(prefix + "TORCH_THREADS", str(torch_threads))),
+                max_pending=int(os.getenv(prefix + "MAX_PENDING", str(max_pending))),
+            ).start(fork=fork)
+        return _executors[stage]
+
+def start_executors():
+    """
+    Starts every stage's pool; the server calls this before it starts handling requests. The
+    pools are forked if no other thread is running yet (a server worker importing the app);
+    each pool's own idle manager thread doesn't count. In a process that already runs threads
+    (Streamlit importing the app) they come from a forkserver.
+    """
+    fork = threading.active_count() == 1
+    for stage in STAGE_DEFAULTS:
+        get_executor(stage, fork=fork)
+
+def stats() -> dict:
+    with _executors_lock:
+        return {stage: executor.stats() for stage, executor in _executors.items()}
+
+
+# --- PUBLIC API ---
+def run_ocr(source) -> list:
+    """EasyOCR on an image path or encoded image bytes; returns [(text, confidence), ...]."""
+    return get_executor("ocr").run(_readtext, source)
+
+def extract_entities(text: str) -> list:
+    """scispaCy entities of the text as [{"text", "label"}, ...]."""
+    return get_executor("ner").run(_entities, text)
+
+
+class PooledEncoder:
+    """Drop-in for the SentenceTransformer the agents use (`encode`, `get_sentence_embedding_dimension`)."""
+    def __init__(self):
+        self._dimension = None
+
+    def encode(self, texts, **kwargs):
+        return get_executor("embedding").run(_encode, list(texts))
+
+    def get_sentence_embedding_dimension(self) -> int:
+        if self._dimension is None:
+            self._dimension = get_executor("embedding").run(_embedding_dimension)
+        return self._dimension
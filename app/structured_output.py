@@ -0,0 +1,371 @@
+import re
+import json
+import threading
+from llm_client import estimate_tokens
+
+# --- RESPONSE SCHEMAS ---
+# Kept to the JSON-Schema subset Gemini accepts as `response_schema`
+# (type / properties / required / items / enum).
+
+TRANSLATOR_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "key_findings": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "finding": {"type": "string"},
+                    "value": {"type": "string"},
+                    "interpretation": {"type": "string"},
+                    "is_abnormal": {"type": "boolean"},
+                },
+                "required": ["finding", "value", "interpretation", "is_abnormal"],
+            },
+        },
+        "next_steps": {"type": "string"},
+        "urgency": {"type": "string", "enum": ["Low", "Medium", "High"]},
+    },
+    "required": ["summary", "key_findings", "next_steps", "urgency"],
+}
+
+CHRONIC_CARE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "trend_summary": {"type": "string"},
+        "risk_assessment": {
+            "type": "object",
+            "properties": {
+                "level": {"type": "string", "enum": ["Low", "Normal", "Elevated", "High"]},
+                "reason": {"type": "string"},
+            },
+            "required": ["level", "reason"],
+        },
+        "behavioral_nudges": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["trend_summary", "risk_assessment", "behavioral_nudges"],
+}
+
+COPILOT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "soap_summary": {
+            "type": "object",
+            "properties": {
+                "subjective": {"type": "string"},
+                "objective": {"type": "string"},
+                "assessment": {"type": "string"},
+                "plan": {"type": "string"},
+            },
+            "required": ["subjective", "objective", "assessment", "plan"],
+        },
+        "guideline_checklist": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "guideline": {"type": "string"},
+                    "status": {"type": "string", "enum": ["Addressed", "Not Addressed", "Partially Addressed"]},
+                    "reason": {"type": "string"},
+                },
+                "required": ["guideline", "status", "reason"],
+            },
+        },
+        "draft_orders": {
+            "type": "object",
+            "properties": {
+                "suggested_labs": {"type": "array", "items": {"type": "string"}},
+                "suggested_medications": {"type": "array", "items": {"type": "string"}},
+            },
+            "required": ["suggested_labs", "suggested_medications"],
+        },
+    },
+    "required": ["soap_summary", "guideline_checklist", "draft_orders"],
+}
+
+# The translator for lab reports parsed by lab_parser: the model only phrases the findings
+# (by id); values and abnormal flags are filled in locally (see GeminiAgent._phrase_lab_findings).
+TRANSLATOR_FINDINGS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "interpretations": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"id": {"type": "integer"}, "interpretation": {"type": "string"}},
+                "required": ["id", "interpretation"],
+            },
+        },
+        "next_steps": {"type": "string"},
+        "urgency": {"type": "string", "enum": ["Low", "Medium", "High"]},
+    },
+    "required": ["summary", "interpretations", "next_steps", "urgency"],
+}
+
+# The copilot with locally matched guideline recommendations: the model only judges their
+# status by id; the recommendation text is filled in locally (see GeminiAgent._run_copilot_matched).
+COPILOT_MATCHED_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "soap_summary": COPILOT_SCHEMA["properties"]["soap_summary"],
+        "guideline_status": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "integer"},
+                    "status": {"type": "string", "enum": ["Addressed", "Not Addressed", "Partially Addressed"]},
+                    "reason": {"type": "string"},
+                },
+                "required": ["id", "status", "reason"],
+            },
+        },
+        "draft_orders": COPILOT_SCHEMA["properties"]["draft_orders"],
+    },
+    "required": ["soap_summary", "guideline_status", "draft_orders"],
+}
+
+# The map step of the map-reduce copilot: the facts extracted from one section of the note.
+COPILOT_SECTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "findings": {"type": "array", "items": {"type": "string"}},
+        "problems": {"type": "array", "items": {"type": "string"}},
+        "medications": {"type": "array", "items": {"type": "string"}},
+        "labs": {"type": "array", "items": {"type": "string"}},
+        "planned_actions": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["findings", "problems", "medications", "labs", "planned_actions"],
+}
+
+EVALUATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "overall_quality_score": {"type": "number"},
+        "evaluation_details": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "criterion": {"type": "string", "enum": ["Clarity", "Actionability", "Safety", "Completeness"]},
+                    "score": {"type": "integer"},
+                    "justification": {"type": "string"},
+                },
+                "required": ["criterion", "score", "justification"],
+            },
+        },
+        "final_recommendation": {"type": "string"},
+    },
+    "required": ["overall_quality_score", "evaluation_details", "final_recommendation"],
+}
+
+
+# --- PRECOMPILED VALIDATION ---
+
+_TYPE_CHECKS = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "boolean": lambda v: isinstance(v, bool),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+}
+
+def compile_validator(schema: dict):
+    """
+    Compiles a schema into a closure `validate(value, path) -> list[str]` of error messages,
+    so the schema is walked once at import time instead of on every response.
+    """
+    type_check = _TYPE_CHECKS[schema["type"]]
+    expected_type = schema["type"]
+    enum = set(schema["enum"]) if "enum" in schema else None
+    properties = {name: compile_validator(sub) for name, sub in schema.get("properties", {}).items()}
+    required = schema.get("required", [])
+    items = compile_validator(schema["items"]) if "items" in schema else None
+
+    def validate(value, path: str = "$") -> list[str]:
+        if not type_check(value):
+            return [f"{path}: expected {expected_type}"]
+        if enum is not None and value not in enum:
+            return [f"{path}: {value!r} is not one of {sorted(enum)}"]
+        errors = []
+        if properties or required:
+            errors.extend(f"{path}.{name}: missing" for name in required if name not in value)
+            for name, validator in properties.items():
+                if name in value:
+                    errors.extend(validator(value[name], f"{path}.{name}"))
+        if items is not None:
+            for i, item in enumerate(value):
+                errors.extend(items(item, f"{path}[{i}]"))
+        return errors
+    return validate
+
+SCHEMAS = {
+    'translator': TRANSLATOR_SCHEMA,
+    'translator_findings': TRANSLATOR_FINDINGS_SCHEMA,
+    'chronic_care': CHRONIC_CARE_SCHEMA,
+    'doctors_copilot': COPILOT_SCHEMA,
+    'copilot_section': COPILOT_SECTION_SCHEMA,
+    'copilot_matched': COPILOT_MATCHED_SCHEMA,
+    'evaluation': EVALUATION_SCHEMA,
+}
+VALIDATORS = {name: compile_validator(schema) for name, schema in SCHEMAS.items()}
+
+
+# --- LOCAL REPAIR ---
+
+FENCE_PATTERN = re.compile(r"```(?:json)?", re.IGNORECASE)
+TRAILING_COMMA_PATTERN = re.compile(r",\s*([}\]])")
+DANGLING_KEY_PATTERN = re.compile(r'([{,])\s*"(?:[^"\\]|\\.)*"\s*:?\s*$')
+
+def _close_truncated(text: str) -> str:
+    """Closes an unterminated string and any open brackets of a JSON document cut off mid-stream."""
+    stack, in_string, escaped = [], False, False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+    if in_string:
+        text += '"'
+    text = text.rstrip()
+    # Drop a key that never got its value, then any dangling separator.
+    if stack and stack[-1] == "}":
+        text = DANGLING_KEY_PATTERN.sub(r"\1", text)
+    text = text.rstrip().rstrip(",")
+    return text + "".join(reversed(stack))
+
+def repair_json(text: str):
+    """
+    Recovers a JSON value from a model response without another LLM call.
+    Handles code fences, leading/trailing prose, trailing commas and truncation.
+    Returns the parsed value, or None if it could not be repaired.
+    """
+    text = FENCE_PATTERN.sub("", text).strip()
+    start = min((i for i in (text.find("{"), text.find("[")) if i != -1), default=-1)
+    if start == -1:
+        return None
+    text = text[start:]
+    decoder = json.JSONDecoder()
+    for candidate in (text, TRAILING_COMMA_PATTERN.sub(r"\1", text)):
+        try:
+            value, _ = decoder.raw_decode(candidate)  # raw_decode ignores trailing text
+            return value
+        except json.JSONDecodeError:
+            pass
+    try:
+        return json.loads(TRAILING_COMMA_PATTERN.sub(r"\1", _close_truncated(text)))
+    except json.JSONDecodeError:
+        return None
+
+
+# --- STRUCTURED GENERATION ---
+
+class StructuredOutput:
+    """
+    Shared structured-output layer for the JSON-producing agents. Requests Gemini's
+    JSON mode with a response schema, validates with a precompiled validator, repairs
+    malformed JSON locally, and re-asks only for missing top-level fields.
+    """
+    def __init__(self, llm_client):
+        self.llm = llm_client
+        self._lock = threading.Lock()
+
+        # --- Metrics ---
+        self.calls = 0
+        self.parse_failures = 0
+        self.repaired = 0
+        self.reasks = 0
+        self.unrecoverable = 0
+        self.tokens_saved = 0
+
+    def _count(self, **increments):
+        with self._lock:
+            for name, amount in increments.items():
+                setattr(self, name, getattr(self, name) + amount)
+
+    def generate(self, contents, agent: str, schema_name: str = None, on_chunk=None, system_prompt: str = None) -> dict:
+        """Returns the validated JSON object, or {"error", "raw_response"} if it could not be recovered."""
+        schema_name = schema_name or agent
+        schema, validate = SCHEMAS[schema_name], VALIDATORS[schema_name]
+        generation_config = {"response_mime_type": "application/json", "response_schema": schema}
+        if on_chunk:
+            raw = self.llm.generate_stream(contents, agent=agent, on_chunk=on_chunk, generation_config=generation_config,
+                                           system_prompt=system_prompt)
+        else:
+            raw = self.llm.generate(contents, agent=agent, generation_config=generation_config, system_prompt=system_prompt)
+        self._count(calls=1)
+
+        try:
+            result = json.loads(raw)
+        except json.JSONDecodeError:
+            self._count(parse_failures=1)
+            result = repair_json(raw)
+            if result is None:
+                self._count(unrecoverable=1)
+                return {"error": "Failed to parse AI model's response.", "raw_response": raw}
+            self._count(repaired=1)
+
+        if not isinstance(result, dict):
+            self._count(unrecoverable=1)
+            return {"error": "AI model's response was not a JSON object.", "raw_response": raw}
+
+        missing = [name for name in schema["required"] if name not in result]
+        if missing:
+            result = self._reask_missing(contents, agent, schema, result, missing, system_prompt)
+
+        errors = validate(result)
+        if errors:
+            # Keep what we have; callers treat schema drift in nested fields as non-fatal.
+            print(f"Structured output for '{agent}' failed validation: {errors[:5]}")
+        return result
+
+    def _reask_missing(self, contents, agent: str, schema: dict, partial: dict, missing: list, system_prompt: str = None) -> dict:
+        """Asks the model for only the missing top-level fields and merges them into `partial`."""
+        self._count(reasks=1)
+        sub_schema = {
+            "type": "object",
+            "properties": {name: schema["properties"][name] for name in missing},
+            "required": missing,
+        }
+        instruction = (
+            "Your previous answer to the task above was incomplete. It already contains these fields:\n"
+            f"{json.dumps(partial)}\n"
+            f"Return ONLY a JSON object with the missing fields {missing}, consistent with the existing ones."
+        )
+        parts = list(contents) if isinstance(contents, (list, tuple)) else [contents]
+        raw = self.llm.generate(parts + [instruction], agent=agent, system_prompt=system_prompt,
+                                generation_config={"response_mime_type": "application/json", "response_schema": sub_schema})
+        addition = repair_json(raw)
+        if isinstance(addition, dict):
+            partial.update({name: addition[name] for name in missing if name in addition})
+            # Output tokens we did not have to regenerate for the fields we already had.
+            self._count(tokens_saved=estimate_tokens(json.dumps(partial)) - estimate_tokens(raw))
+        still_missing = [name for name in missing if name not in partial]
+        if still_missing:
+            self._count(unrecoverable=1)
+            partial.setdefault("error", f"AI model's response is missing fields: {still_missing}")
+        return partial
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "parse_failures": self.parse_failures,
+                "parse_failure_rate": self.parse_failures / self.calls if self.calls else 0.0,
+                "repaired_locally": self.repaired,
+                "reasks": self.reasks,
+                "unrecoverable": self.unrecoverable,
+                "estimated_output_tokens_saved": self.tokens_saved,
+            }
@@ -0,0 +1,168 @@
+import io
+import os
+import time
+import hashlib
+import tempfile
+import threading
+
+# --- CONFIGURATION ---
+# Uploads up to this size are processed from memory; larger ones are spilled to the store.
+DEFAULT_SPILL_BYTES = int(os.getenv("UPLOAD_SPILL_MB", "8")) * 1024 * 1024
+DEFAULT_ROOT = os.getenv("UPLOAD_STORE_PATH", os.path.join("uploads", "store"))
+DEFAULT_RETENTION_SECONDS = int(os.getenv("UPLOAD_RETENTION_HOURS", "24")) * 3600
+PRUNE_EVERY_N_WRITES = 50
+READ_CHUNK_BYTES = 1024 * 1024
+
+
+class Upload:
+    """
+    An uploaded file: its bytes in `data`, or the path of its spilled copy in `path`.
+    `digest` is the SHA-256 of the contents, computed while the upload was read.
+    """
+    def __init__(self, filename: str, digest: str, size: int, data: bytes = None, path: str = None):
+        self.filename = filename
+        self.digest = digest
+        self.size = size
+        self.data = data
+        self.path = path
+
+    @property
+    def ext(self) -> str:
+        return self.filename.rsplit('.', 1)[-1].lower()
+
+    @property
+    def source(self):
+        """What the processors read: the bytes when held in memory, else the spilled file's path."""
+        return self.data if self.data is not None else self.path
+
+    def open(self):
+        """A binary stream over the contents."""
+        return io.BytesIO(self.data) if self.data is not None else open(self.path, 'rb')
+
+def load_upload(path: str, filename: str = None) -> Upload:
+    """An Upload for a file already on disk (a spilled upload, or a local file in a benchmark)."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return Upload(filename or os.path.basename(path), digest.hexdigest(), os.path.getsize(path), path=path)
+
+
+class UploadStore:
+    """
+    Receives uploads without a disk round-trip: files up to `spill_bytes` stay in memory, larger
+    ones are streamed to `root` under their SHA-256, so re-uploads share one file and names never
+    collide. Files are deleted `retention_seconds` after they were last stored.
+    """
+    def __init__(self, root: str = DEFAULT_ROOT, spill_bytes: int = DEFAULT_SPILL_BYTES,
+                 retention_seconds: int = DEFAULT_RETENTION_SECONDS):
+        self.root = root
+        self.spill_bytes = spill_bytes
+        self.retention_seconds = retention_seconds
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        # --- Metrics ---
+        self.in_memory = 0
+        self.spilled = 0
+        self.deduplicated = 0
+        self.memory_bytes = 0
+        self.spilled_bytes = 0
+        self.pruned = 0
+
+        os.makedirs(root, exist_ok=True)
+        self.prune()
+
+    def accept(self, filename: str, stream) -> Upload:
+        """Reads an upload from a binary stream, spilling it to the store once it outgrows `spill_bytes`."""
+        digest, buffer, spill = hashlib.sha256(), io.BytesIO(), None
+        try:
+            for chunk in iter(lambda: stream.read(READ_CHUNK_BYTES), b''):
+                digest.update(chunk)
+                if spill is None and buffer.tell() + len(chunk) > self.spill_bytes:
+                    spill = tempfile.NamedTemporaryFile(dir=self.root, suffix='.part', delete=False)
+                    spill.write(buffer.getvalue())
+                    buffer = None
+                (spill or buffer).write(chunk)
+        except BaseException:
+            if spill is not None:
+                spill.close()
+                os.remove(spill.name)
+            raise
+
+        if spill is None:
+            data = buffer.getvalue()
+            with self._lock:
+                self.in_memory += 1
+                self.memory_bytes += len(data)
+            return Upload(filename, digest.hexdigest(), len(data), data=data)
+
+        size = spill.tell()
+        spill.close()
+        upload = Upload(filename, digest.hexdigest(), size)
+        upload.path = self._store(upload, spill.name)
+        with self._lock:
+            self.spilled += 1
+            self.spilled_bytes += size
+        return upload
+
+    def persist(self, upload: Upload) -> str:
+        """The upload's path in the store, writing it there first if it is held in memory."""
+        if upload.path is None:
+            with tempfile.NamedTemporaryFile(dir=self.root, suffix='.part', delete=False) as f:
+                f.write(upload.data)
+            upload.path = self._store(upload, f.name)
+        return upload.path
+
+    def _store(self, upload: Upload, temp_path: str) -> str:
+        path = os.path.join(self.root, f"{upload.digest}.{upload.ext}")
+        if os.path.exists(path):
+            # Same content already stored: keep that copy and restart its retention period.
+            os.remove(temp_path)
+            os.utime(path)
+            with self._lock:
+                self.deduplicated += 1
+        else:
+            os.replace(temp_path, path)
+
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % PRUNE_EVERY_N_WRITES == 0
+        if prune:
+            self.prune()
+        return path
+
+    def prune(self):
+        """Deletes stored files (and abandoned partial writes) older than the retention period."""
+        cutoff = time.time() - self.retention_seconds
+        removed = 0
+        for entry in os.scandir(self.root):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                pass  # Removed concurrently by another worker's prune
+        with self._lock:
+            self.pruned += removed
+
+    def stats(self) -> dict:
+        files = []
+        for entry in os.scandir(self.root):
+            try:
+                files.append(entry.stat().st_size)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            return {
+                "spill_bytes": self.spill_bytes,
+                "retention_hours": self.retention_seconds / 3600,
+                "in_memory": self.in_memory,
+                "spilled": self.spilled,
+                "deduplicated": self.deduplicated,
+                "memory_bytes": self.memory_bytes,
+                "spilled_bytes": self.spilled_bytes,
+                "stored_files": len(files),
+                "stored_bytes": sum(files),
+                "pruned": self.pruned,
+            }
@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+
+# --- CONFIGURATION ---
+# Clinical bands per metric: (low, high) target range and the "out of range" thresholds counted as crossings.
+METRIC_RANGES = {
+    'glucose': {"target": (70, 180), "very_low": 54, "very_high": 250, "unit": "mg/dL"},
+    'systolic': {"target": (90, 130), "very_low": 80, "very_high": 180, "unit": "mmHg"},
+    'diastolic': {"target": (60, 80), "very_low": 50, "very_high": 120, "unit": "mmHg"},
+}
+ROLLING_WINDOW = pd.Timedelta(days=7)
+TIME_OF_DAY_BINS = [0, 6, 12, 18, 24]
+TIME_OF_DAY_LABELS = ["night", "morning", "afternoon", "evening"]
+REPRESENTATIVE_RECENT_READINGS = 3
+
+
+# --- HELPER FUNCTIONS ---
+
+def records_to_frame(records: list) -> pd.DataFrame:
+    """Builds a date-indexed, time-sorted frame of the known numeric metrics."""
+    df = pd.DataFrame(records)
+    if df.empty or 'date' not in df.columns:
+        return pd.DataFrame()
+    df['date'] = pd.to_datetime(df['date'], errors='coerce')
+    df = df.dropna(subset=['date']).set_index('date').sort_index()
+    metrics = [m for m in METRIC_RANGES if m in df.columns]
+    return df[metrics].apply(pd.to_numeric, errors='coerce')
+
+def _round(value, digits: int = 1):
+    return None if value is None or pd.isna(value) else round(float(value), digits)
+
+def mage(values: np.ndarray) -> float:
+    """
+    Mean Amplitude of Glycemic Excursions: the mean rise/fall between consecutive
+    turning points, counting only excursions larger than one standard deviation.
+    """
+    if len(values) < 3:
+        return None
+    sd = values.std()
+    # Collapse repeated values so a flat stretch doesn't hide a turning point.
+    values = values[np.r_[True, np.diff(values) != 0]]
+    direction = np.sign(np.diff(values))
+    turning = np.r_[0, np.flatnonzero(np.diff(direction)) + 1, len(values) - 1]
+    amplitudes = np.abs(np.diff(values[turning]))
+    amplitudes = amplitudes[amplitudes > sd]
+    return float(amplitudes.mean()) if len(amplitudes) else 0.0
+
+def _slope_per_day(series: pd.Series) -> float:
+    """Least-squares slope of the readings against time, in units per day."""
+    if len(series) < 2:
+        return None
+    days = (series.index - series.index[0]).total_seconds().to_numpy() / 86400
+    if np.ptp(days) == 0:
+        return None
+    return float(np.polyfit(days, series.to_numpy(), 1)[0])
+
+def _crossings(series: pd.Series, low: float, high: float) -> int:
+    """Number of times the readings move from inside the target range to outside it."""
+    outside = ((series < low) | (series > high)).to_numpy()
+    return int(np.count_nonzero(outside[1:] & ~outside[:-1]) + (1 if len(outside) and outside[0] else 0))
+
+
+# --- ANALYTICS ---
+
+def summarize_metric(series: pd.Series, metric: str) -> dict:
+    series = series.dropna()
+    bands = METRIC_RANGES[metric]
+    low, high = bands["target"]
+    values = series.to_numpy(dtype=float)
+    mean = values.mean()
+    first_week = series[:series.index[0] + ROLLING_WINDOW]
+    last_week = series[series.index[-1] - ROLLING_WINDOW:]
+    slope = _slope_per_day(series)
+
+    summary = {
+        "unit": bands["unit"],
+        "readings": int(len(values)),
+        "mean": _round(mean),
+        "median": _round(np.median(values)),
+        "min": _round(values.min()),
+        "max": _round(values.max()),
+        "std": _round(values.std()),
+        "cv_percent": _round(values.std() / mean * 100 if mean else None),
+        "first_7d_mean": _round(first_week.mean()),
+        "last_7d_mean": _round(last_week.mean()),
+        "slope_per_day": _round(slope, 3),
+        "slope_per_30_days": _round(slope * 30 if slope is not None else None),
+        "time_in_range_percent": _round(np.mean((values >= low) & (values <= high)) * 100),
+        "time_below_range_percent": _round(np.mean(values < low) * 100),
+        "time_above_range_percent": _round(np.mean(values > high) * 100),
+        "very_low_readings": int(np.count_nonzero(values < bands["very_low"])),
+        "very_high_readings": int(np.count_nonzero(values > bands["very_high"])),
+        "range_crossings": _crossings(series, low, high),
+        "target_range": [low, high],
+    }
+    if metric == 'glucose':
+        summary["mage"] = _round(mage(values))
+
+    # Day-of-week and time-of-day patterns (time of day only when readings carry a time).
+    by_weekday = series.groupby(series.index.day_name()).mean()
+    if len(by_weekday) > 1:
+        summary["highest_day_of_week"] = {"day": by_weekday.idxmax(), "mean": _round(by_weekday.max())}
+        summary["lowest_day_of_week"] = {"day": by_weekday.idxmin(), "mean": _round(by_weekday.min())}
+    hours = series.index.hour
+    if (hours != 0).any():
+        buckets = pd.cut(hours, bins=TIME_OF_DAY_BINS, right=False, labels=TIME_OF_DAY_LABELS)
+        by_bucket = series.groupby(buckets, observed=True).mean()
+        summary["time_of_day_means"] = {str(name): _round(value) for name, value in by_bucket.items()}
+    return summary
+
+def representative_readings(df: pd.DataFrame) -> list[dict]:
+    """A handful of rows that anchor the summary: the extremes of each metric plus the latest readings."""
+    picks = set(df.index[-REPRESENTATIVE_RECENT_READINGS:])
+    for metric in df.columns:
+        series = df[metric].dropna()
+        if not series.empty:
+            picks.update({series.idxmin(), series.idxmax()})
+    rows = df.loc[sorted(picks)]
+    rows = rows[~rows.index.duplicated()]
+    return [
+        {"date": timestamp.isoformat(), **{m: _round(v) for m, v in row.items() if not pd.isna(v)}}
+        for timestamp, row in rows.iterrows()
+    ]
+
+def analyze_vitals(records: list) -> dict:
+    """
+    Reduces a vitals log (BP and/or glucose) of any length to a compact statistical summary,
+    so the chronic care prompt stays the same size no matter how many readings were uploaded.
+    """
+    df = records_to_frame(records)
+    if df.empty:
+        return {"readings": len(records), "metrics": {}, "representative_readings": []}
+    return {
+        "readings": int(len(df)),
+        "period": {
+            "start": df.index[0].isoformat(),
+            "end": df.index[-1].isoformat(),
+            "days": int((df.index[-1] - df.index[0]).days) + 1,
+        },
+        "metrics": {m: summarize_metric(df[m], m) for m in df.columns if df[m].notna().any()},
+        "representative_readings": representative_readings(df),
+    }
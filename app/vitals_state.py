@@ -0,0 +1,351 @@
+import os
+import json
+import math
+import time
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+from vitals_analytics import METRIC_RANGES, TIME_OF_DAY_BINS, TIME_OF_DAY_LABELS, mage
+
+# --- CONFIGURATION ---
+DEFAULT_DB_PATH = os.getenv("VITALS_STATE_PATH", os.path.join("cache", "vitals_state.db"))
+WINDOW_READINGS = int(os.getenv("VITALS_WINDOW_READINGS", "120"))  # ~30 days at 4 readings/day
+EWMA_ALPHA = float(os.getenv("VITALS_EWMA_ALPHA", "0.1"))
+RECENT_DAYS = 7
+REPRESENTATIVE_RECENT_READINGS = 3
+DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def _round(value, digits: int = 1):
+    return None if value is None or math.isnan(value) else round(float(value), digits)
+
+def parse_reading(reading: dict) -> tuple[float, dict]:
+    """Returns (epoch seconds, {metric: value}) for one device reading. Raises ValueError if malformed."""
+    try:
+        timestamp = pd.Timestamp(reading["date"]).timestamp()
+        values = {m: float(reading[m]) for m in METRIC_RANGES if reading.get(m) is not None}
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Malformed reading {reading!r}: {e}")
+    if not values:
+        raise ValueError(f"Reading {reading!r} has no recognised vital sign (systolic, diastolic or glucose).")
+    if not all(math.isfinite(v) for v in values.values()):
+        raise ValueError(f"Reading {reading!r} has a value that is not a finite number.")
+    return timestamp, values
+
+
+class MetricState:
+    """
+    O(1)-per-reading running statistics for one vital sign: Welford mean/variance,
+    an EWMA, an incremental least-squares trend, range counters, weekday/time-of-day
+    sums, and a fixed-size ring buffer of the most recent readings.
+    """
+    def __init__(self, metric: str, window: int = WINDOW_READINGS):
+        self.metric = metric
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.ewma = None
+        self.min = (math.inf, None)  # (value, timestamp)
+        self.max = (-math.inf, None)
+        # Sums for the least-squares slope, with time in days since the first reading.
+        self.origin = None
+        self.sum_t = self.sum_tt = self.sum_tv = 0.0
+        # Range counters.
+        self.in_range = self.below = self.above = self.very_low = self.very_high = self.crossings = 0
+        self.was_outside = False
+        # Pattern accumulators: [sum, count] per weekday and time-of-day bucket.
+        self.weekday = np.zeros((7, 2))
+        self.time_of_day = np.zeros((len(TIME_OF_DAY_LABELS), 2))
+        self.has_time_of_day = False
+        # Ring buffer of the latest readings.
+        self.values = np.full(window, np.nan)
+        self.timestamps = np.full(window, np.nan)
+        self.next_slot = 0
+
+    def update(self, timestamp: float, value: float):
+        bands = METRIC_RANGES[self.metric]
+        low, high = bands["target"]
+
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.ewma = value if self.ewma is None else EWMA_ALPHA * value + (1 - EWMA_ALPHA) * self.ewma
+        if value < self.min[0]:
+            self.min = (value, timestamp)
+        if value > self.max[0]:
+            self.max = (value, timestamp)
+
+        if self.origin is None:
+            self.origin = timestamp
+        t = (timestamp - self.origin) / 86400
+        self.sum_t += t
+        self.sum_tt += t * t
+        self.sum_tv += t * value
+
+        outside = value < low or value > high
+        self.in_range += not outside
+        self.below += value < low
+        self.above += value > high
+        self.very_low += value < bands["very_low"]
+        self.very_high += value > bands["very_high"]
+        self.crossings += outside and not self.was_outside
+        self.was_outside = outside
+
+        moment = pd.Timestamp(timestamp, unit="s")
+        self.weekday[moment.dayofweek] += (value, 1)
+        if moment.hour or moment.minute:
+            self.has_time_of_day = True
+        bucket = int(np.searchsorted(TIME_OF_DAY_BINS, moment.hour, side="right")) - 1
+        self.time_of_day[bucket] += (value, 1)
+
+        self.values[self.next_slot] = value
+        self.timestamps[self.next_slot] = timestamp
+        self.next_slot = (self.next_slot + 1) % len(self.values)
+
+    @property
+    def last_timestamp(self) -> float:
+        """Timestamp of the latest reading, or -inf before the first."""
+        last = self.timestamps[self.next_slot - 1]
+        return -math.inf if np.isnan(last) else float(last)
+
+    def slope_per_day(self) -> float:
+        # Σ(t - t̄)(v - v̄) / Σ(t - t̄)², expanded so it only needs running sums.
+        denominator = self.sum_tt - self.sum_t * self.sum_t / self.count
+        if self.count < 2 or denominator <= 0:
+            return None
+        return (self.sum_tv - self.sum_t * self.mean) / denominator
+
+    def recent(self) -> tuple[np.ndarray, np.ndarray]:
+        """The ring buffer's readings in time order."""
+        order = np.roll(np.arange(len(self.values)), -self.next_slot)
+        timestamps, values = self.timestamps[order], self.values[order]
+        filled = ~np.isnan(values)
+        return timestamps[filled], values[filled]
+
+    def summary(self) -> dict:
+        """The same statistics analyze_vitals reports, read from the running state."""
+        bands = METRIC_RANGES[self.metric]
+        std = math.sqrt(self.m2 / self.count) if self.count else math.nan
+        slope = self.slope_per_day()
+        timestamps, values = self.recent()
+        last_week = values[timestamps >= timestamps[-1] - RECENT_DAYS * 86400] if len(values) else values
+
+        summary = {
+            "unit": bands["unit"],
+            "readings": self.count,
+            "mean": _round(self.mean),
+            "recent_median": _round(np.median(values)) if len(values) else None,
+            "min": _round(self.min[0]),
+            "max": _round(self.max[0]),
+            "std": _round(std),
+            "cv_percent": _round(std / self.mean * 100 if self.mean else math.nan),
+            "ewma": _round(self.ewma if self.ewma is not None else math.nan),
+            "last_7d_mean": _round(last_week.mean()) if len(last_week) else None,
+            "slope_per_day": _round(slope if slope is not None else math.nan, 3),
+            "slope_per_30_days": _round(slope * 30 if slope is not None else math.nan),
+            "time_in_range_percent": _round(self.in_range / self.count * 100),
+            "time_below_range_percent": _round(self.below / self.count * 100),
+            "time_above_range_percent": _round(self.above / self.count * 100),
+            "very_low_readings": self.very_low,
+            "very_high_readings": self.very_high,
+            "range_crossings": self.crossings,
+            "target_range": list(bands["target"]),
+        }
+        if self.metric == 'glucose':
+            summary["recent_mage"] = _round(mage(values) if len(values) >= 3 else math.nan)
+
+        seen = self.weekday[:, 1] > 0
+        if seen.sum() > 1:
+            means = np.where(seen, self.weekday[:, 0] / np.maximum(self.weekday[:, 1], 1), np.nan)
+            summary["highest_day_of_week"] = {"day": DAY_NAMES[int(np.nanargmax(means))], "mean": _round(np.nanmax(means))}
+            summary["lowest_day_of_week"] = {"day": DAY_NAMES[int(np.nanargmin(means))], "mean": _round(np.nanmin(means))}
+        if self.has_time_of_day:
+            summary["time_of_day_means"] = {
+                name: _round(total / n) for name, (total, n) in zip(TIME_OF_DAY_LABELS, self.time_of_day) if n
+            }
+        return summary
+
+    def to_dict(self) -> dict:
+        state = {k: v for k, v in self.__dict__.items() if not isinstance(v, np.ndarray)}
+        arrays = {k: np.where(np.isnan(v), None, v).tolist() for k, v in self.__dict__.items() if isinstance(v, np.ndarray)}
+        return {**state, **arrays, "min": list(self.min), "max": list(self.max)}
+
+    @classmethod
+    def from_dict(cls, data: dict, window: int = WINDOW_READINGS):
+        state = cls(data["metric"], window=len(data["values"]) or window)
+        for key, value in data.items():
+            current = getattr(state, key)
+            if isinstance(current, np.ndarray):
+                setattr(state, key, np.array(value, dtype=float))
+            elif key in ("min", "max"):
+                setattr(state, key, tuple(value))
+            else:
+                setattr(state, key, value)
+        return state
+
+
+class PatientVitals:
+    """The incremental state of every vital sign reported for one patient."""
+    def __init__(self, patient_id: str):
+        self.patient_id = patient_id
+        self.metrics = {}
+        self.first_timestamp = None
+        self.last_timestamp = None
+
+    def check_order(self, timestamp: float, values: dict):
+        """Raises ValueError if the reading is older than the latest one already folded in for any of its metrics."""
+        for metric in values:
+            state = self.metrics.get(metric)
+            if state is not None and timestamp < state.last_timestamp:
+                raise ValueError(
+                    f"Reading at {pd.Timestamp(timestamp, unit='s').isoformat()} is older than the latest {metric} "
+                    f"reading of patient {self.patient_id} ({pd.Timestamp(state.last_timestamp, unit='s').isoformat()}); "
+                    "readings must arrive in time order."
+                )
+
+    def update(self, timestamp: float, values: dict):
+        for metric, value in values.items():
+            self.metrics.setdefault(metric, MetricState(metric)).update(timestamp, value)
+        self.first_timestamp = timestamp if self.first_timestamp is None else min(self.first_timestamp, timestamp)
+        self.last_timestamp = timestamp if self.last_timestamp is None else max(self.last_timestamp, timestamp)
+
+    def summary(self) -> dict:
+        """A statistical summary in the shape analyze_vitals returns, for run_chronic_care_agent."""
+        if not self.metrics:
+            return {"readings": 0, "metrics": {}, "representative_readings": []}
+        picks = {}
+        for metric, state in self.metrics.items():
+            timestamps, values = state.recent()
+            moments = [(t, v) for t, v in zip(timestamps[-REPRESENTATIVE_RECENT_READINGS:], values[-REPRESENTATIVE_RECENT_READINGS:])]
+            moments += [(state.min[1], state.min[0]), (state.max[1], state.max[0])]
+            for t, v in moments:
+                picks.setdefault(t, {})[metric] = _round(v)
+        start, end = pd.Timestamp(self.first_timestamp, unit="s"), pd.Timestamp(self.last_timestamp, unit="s")
+        return {
+            "readings": max(state.count for state in self.metrics.values()),
+            "period": {"start": start.isoformat(), "end": end.isoformat(), "days": int((end - start).days) + 1},
+            "metrics": {metric: state.summary() for metric, state in self.metrics.items()},
+            "representative_readings": [
+                {"date": pd.Timestamp(t, unit="s").isoformat(), **values} for t, values in sorted(picks.items())
+            ],
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "patient_id": self.patient_id,
+            "first_timestamp": self.first_timestamp,
+            "last_timestamp": self.last_timestamp,
+            "metrics": {metric: state.to_dict() for metric, state in self.metrics.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        patient = cls(data["patient_id"])
+        patient.first_timestamp = data["first_timestamp"]
+        patient.last_timestamp = data["last_timestamp"]
+        patient.metrics = {metric: MetricState.from_dict(state) for metric, state in data["metrics"].items()}
+        return patient
+
+
+class VitalsStore:
+    """
+    Per-patient incremental vitals state, updated in O(1) per device reading and written
+    through to SQLite with every batch, so several server workers share one state per patient.
+    Each worker keeps the states it has read in memory and reloads one only when another
+    worker has written a newer version.
+    """
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self._patients = {}  # patient_id -> (version, PatientVitals)
+        self._lock = threading.Lock()
+
+        # --- Metrics ---
+        self.readings_ingested = 0
+        self.snapshots_written = 0
+        self.reloads = 0
+        self._update_seconds = 0.0
+
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS patient_vitals ("
+                "patient_id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL, "
+                "version INTEGER NOT NULL DEFAULT 0)"
+            )
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(patient_vitals)")]
+            if "version" not in columns:  # Written before states were versioned
+                self._conn.execute("ALTER TABLE patient_vitals ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+    def _load(self, patient_id: str) -> tuple[int, PatientVitals]:
+        """
+        Returns (version, state), reusing the in-memory copy unless another worker has written a
+        newer one (caller holds the lock). Version 0 is a patient with no stored readings.
+        """
+        row = self._conn.execute("SELECT version FROM patient_vitals WHERE patient_id = ?", (patient_id,)).fetchone()
+        version = row[0] if row else 0
+        cached = self._patients.get(patient_id)
+        if cached is not None and cached[0] == version:
+            return cached
+        if row is None:
+            return version, PatientVitals(patient_id)
+        state = self._conn.execute("SELECT state FROM patient_vitals WHERE patient_id = ?", (patient_id,)).fetchone()[0]
+        if cached is not None:
+            self.reloads += 1
+        self._patients[patient_id] = (version, PatientVitals.from_dict(json.loads(state)))
+        return self._patients[patient_id]
+
+    def ingest(self, patient_id: str, readings: list[dict]) -> int:
+        """
+        Folds new readings into the patient's state. The batch may be in any order, but the
+        running state (ring buffer, EWMA, range crossings) is order-dependent, so readings older
+        than ones already ingested are refused. Raises ValueError if any reading is malformed or
+        late, in which case none of the batch is applied.
+        """
+        parsed = sorted((parse_reading(reading) for reading in readings), key=lambda reading: reading[0])
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock up front: no other worker can update this
+            # patient between reading the latest state and writing the new one.
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                version, patient = self._load(patient_id)
+                for timestamp, values in parsed:
+                    patient.check_order(timestamp, values)
+                start = time.perf_counter()
+                for timestamp, values in parsed:
+                    patient.update(timestamp, values)
+                self._update_seconds += time.perf_counter() - start
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO patient_vitals VALUES (?, ?, ?, ?)",
+                    (patient_id, json.dumps(patient.to_dict()), time.time(), version + 1),
+                )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                self._patients.pop(patient_id, None)  # May hold readings that were not stored
+                raise
+            self._patients[patient_id] = (version + 1, patient)
+            self.snapshots_written += 1
+            self.readings_ingested += len(readings)
+        return len(readings)
+
+    def summary(self, patient_id: str) -> dict:
+        """Returns the patient's precomputed summary, or None if no readings were ever ingested."""
+        with self._lock:
+            _, patient = self._load(patient_id)
+            if not patient.metrics:
+                return None
+            return patient.summary()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "patients_in_memory": len(self._patients),
+                "readings_ingested": self.readings_ingested,
+                "snapshots_written": self.snapshots_written,
+                "reloads": self.reloads,
+                "mean_update_us": round(self._update_seconds / self.readings_ingested * 1e6, 2) if self.readings_ingested else None,
+            }
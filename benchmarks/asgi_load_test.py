@@ -0,0 +1,177 @@
+# File: benchmarks/asgi_load_test.py
+#
+# Requests/sec and latency percentiles of /api/unified_analysis under concurrent load:
+# the current server (Flask's threaded Werkzeug server, as frontend/main.py runs it) against
+# the ASGI app under gunicorn with 1 and N preforked workers. Each server runs in its own
+# process with the real processors (EasyOCR, scispaCy, MiniLM) and the local fake model, so
+# the mix of OCR-bound translator uploads and LLM-bound triage requests is reproducible and
+# costs no API quota.
+#
+#   python benchmarks/asgi_load_test.py --concurrency 32 --requests 400 --workers 4
+#
+# `--serve flask|asgi --port N` starts one server in the foreground (used internally).
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from PIL import Image, ImageDraw, ImageFont
+
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app'))
+sys.path.append(APP_DIR)
+
+SYMPTOMS = ["headache", "sore throat", "mild fever", "runny nose", "cough", "fatigue", "nausea",
+            "back pain", "itchy eyes", "sneezing", "muscle aches", "dizziness on standing"]
+LABS = [("Hemoglobin", 13.5, "g/dL"), ("WBC Count", 7.2, "10^3/uL"), ("Glucose", 96, "mg/dL"),
+        ("Creatinine", 0.9, "mg/dL"), ("Potassium", 4.2, "mmol/L"), ("LDL Cholesterol", 110, "mg/dL")]
+FAKE_TRANSLATION = {
+    "summary": "Most of your results are in the normal range.", "key_findings": [], "interpretations": [],
+    "next_steps": "Share these results with your doctor at your next visit.", "urgency": "Low",
+}
+FAKE_EVALUATION = {"overall_quality_score": 4.0, "evaluation_details": [], "final_recommendation": "Approved."}
+
+
+def fake_responder(contents) -> str:
+    text = " ".join(str(part) for part in contents) if isinstance(contents, (list, tuple)) else str(contents)
+    if "overall_quality_score" in text:
+        return json.dumps(FAKE_EVALUATION)
+    return json.dumps(FAKE_TRANSLATION)
+
+def serve(kind: str, port: int, workers: int, llm_median_s: float):
+    """Runs one server in this process, with every LLM call answered by the fake model."""
+    import random as fake_random
+    import llm_client
+    from fake_llm import FakeGenerativeModel
+    rng = fake_random.Random(os.getpid())
+    llm_client.DEFAULT_MODEL_FACTORY = lambda name: FakeGenerativeModel(
+        latency_sampler=lambda: rng.lognormvariate(0, 0.3) * llm_median_s, responder=fake_responder)
+
+    if kind == "flask":
+        from app import app
+        app.run(host='127.0.0.1', port=port, debug=False)
+        return
+
+    from gunicorn.app.base import BaseApplication
+    import gunicorn_conf
+
+    class PreforkServer(BaseApplication):
+        def load_config(self):
+            for name in ("worker_class", "preload_app", "timeout", "keepalive", "on_starting", "post_fork"):
+                self.cfg.set(name, getattr(gunicorn_conf, name))
+            self.cfg.set("bind", f"127.0.0.1:{port}")
+            self.cfg.set("workers", workers)
+
+        def load(self):
+            from asgi import application
+            return application
+
+    PreforkServer().run()
+
+
+def report_image(rng: random.Random) -> bytes:
+    """A small PNG lab report with random values, so translator caches never hit."""
+    image = Image.new("L", (900, 60 + 50 * len(LABS)), 255)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=28)
+    draw.text((20, 15), f"LAB REPORT  Sample {rng.randint(10000, 99999)}", fill=0, font=font)
+    for i, (name, value, unit) in enumerate(LABS):
+        draw.text((20, 65 + 50 * i), f"{name}  {value * rng.uniform(0.8, 1.2):.1f}  {unit}", fill=0, font=font)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def make_request(rng: random.Random, upload_ratio: float):
+    if rng.random() < upload_ratio:
+        return {"agent_type": "translator", "json_data": "{}"}, {"file": ("report.png", report_image(rng), "image/png")}
+    symptoms = ", ".join(rng.sample(SYMPTOMS, 3)) + f" for {rng.randint(1, 14)} days"
+    return {"agent_type": "symptom_triage", "json_data": json.dumps({"symptoms": symptoms, "age": rng.randint(18, 80)})}, {}
+
+def run_load(base_url: str, concurrency: int, total: int, upload_ratio: float, seed: int) -> dict:
+    rng = random.Random(seed)
+    workload = [make_request(rng, upload_ratio) for _ in range(total)]
+
+    def send(item):
+        form, files = item
+        start = time.perf_counter()
+        try:
+            response = requests.post(f"{base_url}/api/unified_analysis", data=form, files=files, timeout=600)
+            ok = response.status_code == 200
+        except requests.exceptions.RequestException:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(send, workload))
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for latency, ok in results if ok)
+    return {
+        "requests_per_s": round(len(latencies) / elapsed, 2),
+        "p50_s": round(statistics.median(latencies), 2) if latencies else None,
+        "p95_s": round(latencies[int(0.95 * (len(latencies) - 1))], 2) if latencies else None,
+        "errors": sum(not ok for _, ok in results),
+    }
+
+def wait_until_ready(base_url: str, process, timeout: float = 600):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Server exited during startup.")
+        try:
+            if requests.get(f"{base_url}/api/metrics", timeout=2).status_code == 200:
+                return
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(1)
+    raise RuntimeError("Server did not become ready.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test: Flask dev server vs. the ASGI app (gunicorn prefork).")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent clients.")
+    parser.add_argument("--requests", type=int, default=400, help="Requests per server.")
+    parser.add_argument("--upload-ratio", type=float, default=0.25, help="Share of requests that are OCR'd translator uploads.")
+    parser.add_argument("--workers", type=int, default=4, help="Preforked ASGI workers for the multi-worker run.")
+    parser.add_argument("--llm-median-s", type=float, default=1.0, help="Median latency of a fake LLM call.")
+    parser.add_argument("--port", type=int, default=5101)
+    parser.add_argument("--serve", choices=["flask", "asgi"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        os.chdir(APP_DIR)
+        serve(args.serve, args.port, args.workers, args.llm_median_s)
+        sys.exit(0)
+
+    for kind, workers in [("flask", 1), ("asgi", 1), ("asgi", args.workers)]:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            # Fresh caches per server, and no local rate limit: only the servers are compared.
+            env = dict(os.environ, GOOGLE_API_KEY=os.getenv("GOOGLE_API_KEY", "offline"),
+                       EVALUATION_CACHE_PATH=os.path.join(cache_dir, "evaluation_cache.db"),
+                       TRANSLATION_CACHE_PATH=os.path.join(cache_dir, "translation_cache.db"),
+                       JOB_STORE_PATH=os.path.join(cache_dir, "jobs.db"),
+                       DOCUMENT_CACHE_PATH=os.path.join(cache_dir, "document_cache.db"),
+                       UPLOAD_STORE_PATH=os.path.join(cache_dir, "uploads"),
+                       VITALS_STATE_PATH=os.path.join(cache_dir, "vitals_state.db"),
+                       LLM_REQUESTS_PER_MINUTE="1000000", LLM_TOKENS_PER_MINUTE="1000000000",
+                       LLM_SHED_QUEUE_DEPTH="100000")
+            command = [sys.executable, os.path.abspath(__file__), "--serve", kind, "--port", str(args.port),
+                       "--workers", str(workers), "--llm-median-s", str(args.llm_median_s)]
+            server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            base_url = f"http://127.0.0.1:{args.port}"
+            try:
+                wait_until_ready(base_url, server)
+                run_load(base_url, concurrency=4, total=8, upload_ratio=args.upload_ratio, seed=0)  # warm-up
+                result = run_load(base_url, args.concurrency, args.requests, args.upload_ratio, seed=1)
+                print({"server": kind, "workers": workers, "concurrency": args.concurrency, **result})
+            finally:
+                server.terminate()
+                server.wait(timeout=60)
@@ -0,0 +1,66 @@
+# File: benchmarks/cohort_screening_benchmark.py
+#
+# Times cohort screening at 1k and 10k patients: Parquet round-trip plus vectorized
+# features and ranking, against the per-patient path (analyze_vitals once per patient,
+# i.e. what running the chronic care agent per patient would need before any LLM call).
+#
+#   python benchmarks/cohort_screening_benchmark.py --patients 1000 10000 --days 90
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+from cohort_screening import synthetic_cohort, load_cohort, compute_features, score_risk
+from vitals_analytics import analyze_vitals
+
+PER_PATIENT_SAMPLE = 300  # The per-patient path is timed on a sample and extrapolated.
+
+
+def run(num_patients: int, days: int, top_n: int) -> dict:
+    cohort = synthetic_cohort(num_patients, days=days)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cohort.parquet")
+        cohort.to_parquet(path, index=False)
+        parquet_mb = os.path.getsize(path) / 1e6
+
+        start = time.perf_counter()
+        loaded = load_cohort(path)
+        load_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ranked = score_risk(compute_features(loaded))
+    screen_s = time.perf_counter() - start
+
+    sample_ids = loaded['patient_id'].cat.categories[:PER_PATIENT_SAMPLE]
+    sample = loaded[loaded['patient_id'].isin(sample_ids)]
+    start = time.perf_counter()
+    for _, records in sample.groupby('patient_id', observed=True):
+        analyze_vitals(records.assign(date=records['date'].astype(str)).drop(columns='patient_id').to_dict(orient='records'))
+    per_patient_s = (time.perf_counter() - start) / len(sample_ids) * num_patients
+
+    return {
+        "patients": num_patients,
+        "rows": len(loaded),
+        "parquet_mb": round(parquet_mb, 1),
+        "load_s": round(load_s, 2),
+        "vectorized_screen_s": round(screen_s, 2),
+        "per_patient_s (extrapolated)": round(per_patient_s, 1),
+        "flagged": int(ranked['flagged'].sum()),
+        "llm_calls": min(top_n, int(ranked['flagged'].sum())),
+        "llm_calls_per_patient_path": num_patients,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark vectorized cohort screening.")
+    parser.add_argument("--patients", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--days", type=int, default=90, help="Days of twice-daily readings per patient.")
+    parser.add_argument("--top-n", type=int, default=20)
+    args = parser.parse_args()
+
+    for num_patients in args.patients:
+        print(run(num_patients, args.days, args.top_n))
@@ -0,0 +1,111 @@
+# File: benchmarks/copilot_map_reduce_benchmark.py
+#
+# Latency vs. note length for the doctor's copilot: the single-prompt path against the
+# section-aware map-reduce path. Runs against the local fake model, whose latency grows
+# with prompt tokens (prefill) and response tokens (decoding); retrieval uses the KB folder.
+#
+#   python benchmarks/copilot_map_reduce_benchmark.py --tokens 500 1500 3000 6000 12000 24000 --runs 3
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+from fake_llm import FakeGenerativeModel
+from llm_client import LLMClient, estimate_tokens
+from llm_scheduler import LLMScheduler, LocalRateBudget
+from gemini_agent import GeminiAgent
+
+KB_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'data', 'my_final_kb')
+
+# Sentences per section; repeated (with a day counter) to grow an inpatient note.
+SECTIONS = {
+    "HPI": "Day {d}: 67-year-old with type 2 diabetes and hypertension reports worsening dyspnea on exertion and 2-pillow orthopnea.",
+    "Physical Exam": "Day {d}: BP 158/94, HR 96, SpO2 93% on room air, bibasilar crackles, 2+ pitting edema to the shins.",
+    "Labs": "Day {d}: HbA1c 8.4%, creatinine 1.6 mg/dL, eGFR 42, potassium 5.1 mmol/L, BNP 890 pg/mL, LDL 142 mg/dL.",
+    "Assessment and Plan": "Day {d}: Acute on chronic HFrEF. Continue IV furosemide 40 mg BID, daily weights, strict I/O, hold metformin.",
+}
+SECTION_EXTRACTION = {
+    "findings": ["dyspnea on exertion", "orthopnea", "BP 158/94", "bibasilar crackles", "pitting edema"],
+    "problems": ["HFrEF exacerbation", "type 2 diabetes", "hypertension", "CKD stage 3b"],
+    "medications": ["furosemide 40 mg IV BID", "metformin held"],
+    "labs": ["HbA1c 8.4%", "creatinine 1.6 mg/dL", "BNP 890 pg/mL", "LDL 142 mg/dL"],
+    "planned_actions": ["daily weights", "strict I/O"],
+}
+COPILOT_ANSWER = {
+    "soap_summary": {
+        "subjective": "Worsening dyspnea on exertion and orthopnea.",
+        "objective": "BP 158/94, crackles, edema; BNP 890, eGFR 42, HbA1c 8.4%.",
+        "assessment": "Acute on chronic HFrEF with diabetes, hypertension and CKD.",
+        "plan": "IV diuresis, daily weights, hold metformin.",
+    },
+    "guideline_checklist": [
+        {"guideline": "Start an SGLT2 inhibitor in HFrEF with diabetes.", "status": "Not Addressed", "reason": "Not in the plan."},
+        {"guideline": "Statin therapy for diabetics aged 40-75.", "status": "Not Addressed", "reason": "LDL 142, no statin."},
+    ],
+    "draft_orders": {"suggested_labs": ["BMP in 24 hours", "Lipid panel"], "suggested_medications": ["Empagliflozin 10 mg", "Atorvastatin 40 mg"]},
+}
+
+
+def build_note(target_tokens: int) -> str:
+    """An inpatient note of roughly `target_tokens` tokens, with each section growing evenly."""
+    lines = {heading: [] for heading in SECTIONS}
+    day = 1
+    while estimate_tokens("\n".join("\n".join(v) for v in lines.values())) < target_tokens:
+        for heading, sentence in SECTIONS.items():
+            lines[heading].append(sentence.format(d=day))
+        day += 1
+    return "\n\n".join(f"{heading}:\n" + "\n".join(sentences) for heading, sentences in lines.items())
+
+
+def responder(contents) -> str:
+    text = " ".join(str(part) for part in contents) if isinstance(contents, (list, tuple)) else str(contents)
+    return json.dumps(SECTION_EXTRACTION if "Note Section (" in text else COPILOT_ANSWER)
+
+
+def run(agent: GeminiAgent, note: str, map_reduce: bool, runs: int) -> float:
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        agent.run_doctors_copilot_agent(note, map_reduce=map_reduce)
+        latencies.append(time.perf_counter() - start)
+    return statistics.median(latencies)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Copilot latency vs. note length, single prompt vs. map-reduce.")
+    parser.add_argument("--tokens", type=int, nargs="+", default=[500, 1500, 3000, 6000, 12000, 24000], help="Note lengths to test.")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per note length and path (the median is reported).")
+    parser.add_argument("--prefill-ms-per-1k", type=float, default=150.0, help="Fake model prefill cost per 1k input tokens.")
+    parser.add_argument("--decode-ms-per-token", type=float, default=4.0, help="Fake model decoding cost per output token.")
+    parser.add_argument("--kb-folder", type=str, default=KB_FOLDER)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    llm = LLMClient(
+        api_key="offline",
+        scheduler=LLMScheduler(budget=LocalRateBudget(10**9, 10**12)),
+        model_factory=lambda name: FakeGenerativeModel(
+            latency_sampler=lambda: rng.lognormvariate(0, 0.1) * 0.3,
+            responder=responder,
+            seconds_per_input_token=args.prefill_ms_per_1k / 1e6,
+            seconds_per_output_token=args.decode_ms_per_token / 1e3,
+        ),
+    )
+    agent = GeminiAgent(api_key="offline", kb_folder=args.kb_folder, llm_client=llm)
+
+    for target in args.tokens:
+        note = build_note(target)
+        single = run(agent, note, map_reduce=False, runs=args.runs)
+        mapped = run(agent, note, map_reduce=True, runs=args.runs)
+        print({
+            "note_tokens": estimate_tokens(note),
+            "single_prompt_s": round(single, 2),
+            "map_reduce_s": round(mapped, 2),
+            "speedup": round(single / mapped, 2),
+        })
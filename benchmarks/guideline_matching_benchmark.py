@@ -0,0 +1,175 @@
+# File: benchmarks/guideline_matching_benchmark.py
+#
+# Per-note tokens and latency of the doctor's copilot with retrieved guideline snippets
+# (the model extracts and restates each recommendation) against locally matched
+# recommendations from the KB's recommendations table (the model only judges status by id).
+# Builds a small KB of guideline paragraphs in a temporary folder; runs against the local
+# fake model, whose latency grows with prompt tokens (prefill) and response tokens (decoding).
+#
+#   python benchmarks/guideline_matching_benchmark.py --runs 5
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+import numpy as np
+import faiss
+from sentence_transformers import SentenceTransformer
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'preprocessing')))
+
+from fake_llm import FakeGenerativeModel
+from llm_client import LLMClient, estimate_tokens
+from llm_scheduler import LLMScheduler, LocalRateBudget
+from gemini_agent import GeminiAgent
+from kb_builder import build_recommendation_table
+
+GUIDELINES = [
+    {"recommendation": "Start moderate-intensity statin therapy in adults aged 40-75 with diabetes.",
+     "trigger_conditions": ["diabetes", "age 40-75"], "required_actions": ["start or continue a statin"],
+     "trigger_terms": ["diabetes", "t2dm", "type 2 diabetes", "dm2"]},
+    {"recommendation": "Check HbA1c every 3 months in patients with diabetes not meeting glycemic goals.",
+     "trigger_conditions": ["diabetes", "HbA1c above goal"], "required_actions": ["order HbA1c in 3 months"],
+     "trigger_terms": ["hba1c", "a1c", "t2dm", "type 2 diabetes"]},
+    {"recommendation": "Add an SGLT2 inhibitor in type 2 diabetes with heart failure or CKD.",
+     "trigger_conditions": ["type 2 diabetes", "heart failure or CKD"], "required_actions": ["start an SGLT2 inhibitor"],
+     "trigger_terms": ["hfref", "heart failure", "ckd", "egfr"]},
+    {"recommendation": "Screen annually for diabetic retinopathy with a dilated eye exam.",
+     "trigger_conditions": ["diabetes"], "required_actions": ["refer for a dilated eye exam"],
+     "trigger_terms": ["diabetes", "t2dm", "retinopathy"]},
+    {"recommendation": "Measure urine albumin-to-creatinine ratio annually in diabetes or hypertension.",
+     "trigger_conditions": ["diabetes or hypertension"], "required_actions": ["order urine ACR"],
+     "trigger_terms": ["diabetes", "hypertension", "htn", "albuminuria"]},
+    {"recommendation": "Target blood pressure below 130/80 mmHg in adults with hypertension.",
+     "trigger_conditions": ["hypertension"], "required_actions": ["titrate antihypertensives", "recheck BP"],
+     "trigger_terms": ["hypertension", "htn", "blood pressure", "bp"]},
+    {"recommendation": "Use an ACE inhibitor or ARB for hypertension with albuminuria.",
+     "trigger_conditions": ["hypertension", "albuminuria"], "required_actions": ["start an ACE inhibitor or ARB"],
+     "trigger_terms": ["albuminuria", "proteinuria", "acr"]},
+    {"recommendation": "Offer tobacco cessation counselling and pharmacotherapy to every smoker.",
+     "trigger_conditions": ["current smoker"], "required_actions": ["counsel", "offer varenicline or NRT"],
+     "trigger_terms": ["smoker", "smoking", "tobacco", "pack years"]},
+    {"recommendation": "Give an annual influenza vaccine to adults with chronic disease.",
+     "trigger_conditions": ["chronic disease"], "required_actions": ["administer influenza vaccine"],
+     "trigger_terms": ["copd", "heart failure", "diabetes", "influenza"]},
+    {"recommendation": "Prescribe a beta-blocker and ACE inhibitor, ARB or ARNI in HFrEF.",
+     "trigger_conditions": ["HFrEF"], "required_actions": ["start beta-blocker", "start ACEi/ARB/ARNI"],
+     "trigger_terms": ["hfref", "reduced ejection fraction", "ef 30"]},
+    {"recommendation": "Hold metformin when eGFR falls below 30 mL/min/1.73m2.",
+     "trigger_conditions": ["metformin", "eGFR < 30"], "required_actions": ["stop metformin"],
+     "trigger_terms": ["metformin", "egfr"]},
+    {"recommendation": "Assess fall risk yearly in adults aged 65 and older.",
+     "trigger_conditions": ["age >= 65"], "required_actions": ["perform fall risk assessment"],
+     "trigger_terms": ["fall", "falls", "gait", "dizziness"]},
+]
+# The same guidance as free-text KB paragraphs, as the snippet path retrieves it.
+GUIDELINE_PARAGRAPHS = [
+    f"{g['recommendation']} This recommendation applies to patients with {' and '.join(g['trigger_conditions'])}. "
+    f"It is met when the clinician documents the following: {'; '.join(g['required_actions'])}. The evidence is strongest "
+    "in randomized trials and the benefit outweighs the harm for most patients; shared decision-making is advised, and "
+    "the reasons for not following it should be documented in the note."
+    for g in GUIDELINES
+]
+
+NOTES = [
+    "58F with type 2 diabetes and hypertension. HbA1c 8.2%, BP 146/88. On metformin 1000 mg BID and lisinopril 10 mg. "
+    "Reports polyuria. Plan: increase lisinopril to 20 mg, recheck BP in 4 weeks, diabetes education.",
+    "71M with HFrEF (EF 30%) and CKD, eGFR 38. Former smoker, 40 pack years. Dyspnea on exertion. On carvedilol. "
+    "Plan: continue carvedilol, start sacubitril-valsartan, BMP in 1 week.",
+    "45M smoker, 1 ppd, presents for annual exam. BP 128/82. No chronic conditions. Discussed smoking cessation; "
+    "started varenicline. Routine labs ordered.",
+    "67F with COPD and recurrent falls, dizziness on standing. BP 150/70 seated, 128/66 standing. "
+    "Plan: reduce amlodipine, PT referral for gait training, influenza vaccine given today.",
+]
+
+
+def build_kb(folder: str):
+    """Writes the paragraphs as a FAISS KB (as kb_builder does) and the recommendations table."""
+    model = SentenceTransformer('all-MiniLM-L6-v2')
+    embeddings = model.encode(GUIDELINE_PARAGRAPHS)
+    index = faiss.IndexFlatL2(embeddings.shape[1])
+    index.add(np.array(embeddings))
+    faiss.write_index(index, os.path.join(folder, "kb.faiss"))
+    with open(os.path.join(folder, "kb_chunks.json"), 'w', encoding='utf-8') as f:
+        json.dump([{"source": f"guidelines (chunk {i + 1})", "content_chunk": p} for i, p in enumerate(GUIDELINE_PARAGRAPHS)], f)
+    build_recommendation_table(GUIDELINES, folder)
+
+
+class TokenCounter:
+    """Answers like the copilot would and counts the tokens each call sends and receives."""
+    def __init__(self):
+        self.input_tokens = []
+        self.output_tokens = []
+
+    def __call__(self, contents) -> str:
+        text = " ".join(str(part) for part in contents) if isinstance(contents, (list, tuple)) else str(contents)
+        answer = {
+            "soap_summary": {"subjective": "Symptoms as reported.", "objective": "Vitals and labs as recorded.",
+                             "assessment": "Chronic conditions, partly controlled.", "plan": "Medication changes and follow-up."},
+            "draft_orders": {"suggested_labs": ["BMP", "HbA1c"], "suggested_medications": ["Atorvastatin 20 mg"]},
+        }
+        if "Matched Guideline Recommendations" in text:
+            ids = [int(i) for i in re.findall(r'"id": (\d+)', text.split("Matched Guideline Recommendations:", 1)[1])]
+            answer["guideline_status"] = [{"id": i, "status": "Not Addressed", "reason": "Not documented in the plan."} for i in ids]
+        else:
+            snippets = [p for p in GUIDELINE_PARAGRAPHS if p in text]
+            answer["guideline_checklist"] = [
+                {"guideline": p.split(". ")[0] + ".", "status": "Not Addressed", "reason": "Not documented in the plan."} for p in snippets
+            ]
+        response = json.dumps(answer)
+        self.input_tokens.append(estimate_tokens(text))
+        self.output_tokens.append(estimate_tokens(response))
+        return response
+
+
+def run(agent: GeminiAgent, counter: TokenCounter, runs: int) -> dict:
+    counter.input_tokens.clear()
+    counter.output_tokens.clear()
+    latencies = []
+    for _ in range(runs):
+        for note in NOTES:
+            start = time.perf_counter()
+            agent.run_doctors_copilot_agent(note)
+            latencies.append(time.perf_counter() - start)
+    return {
+        "input_tokens_per_note": round(statistics.mean(counter.input_tokens)),
+        "output_tokens_per_note": round(statistics.mean(counter.output_tokens)),
+        "p50_s": round(statistics.median(latencies), 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Copilot tokens and latency, retrieved snippets vs. matched recommendations.")
+    parser.add_argument("--runs", type=int, default=5, help="Passes over the sample notes per path.")
+    parser.add_argument("--prefill-ms-per-1k", type=float, default=150.0, help="Fake model prefill cost per 1k input tokens.")
+    parser.add_argument("--decode-ms-per-token", type=float, default=4.0, help="Fake model decoding cost per output token.")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    counter = TokenCounter()
+    llm = LLMClient(
+        api_key="offline",
+        scheduler=LLMScheduler(budget=LocalRateBudget(10**9, 10**12)),
+        model_factory=lambda name: FakeGenerativeModel(
+            latency_sampler=lambda: rng.lognormvariate(0, 0.1) * 0.3,
+            responder=counter,
+            seconds_per_input_token=args.prefill_ms_per_1k / 1e6,
+            seconds_per_output_token=args.decode_ms_per_token / 1e3,
+        ),
+    )
+    with tempfile.TemporaryDirectory() as kb_folder:
+        build_kb(kb_folder)
+        agent = GeminiAgent(api_key="offline", kb_folder=kb_folder, llm_client=llm)
+        guidelines, agent.guidelines = agent.guidelines, None
+        print({"path": "retrieved_snippets", **run(agent, counter, args.runs)})
+        agent.guidelines = guidelines
+        print({"path": "matched_recommendations", **run(agent, counter, args.runs)})
+        print({"guideline_index": guidelines.stats()})
+        guidelines.close()
@@ -0,0 +1,68 @@
+# File: benchmarks/hedging_benchmark.py
+#
+# Simulates the two chained LLM calls of /api/unified_analysis (Agent 1, then Agent 2)
+# against a fake model with heavy-tailed latency, with and without request hedging.
+#
+#   python benchmarks/hedging_benchmark.py --requests 400 --concurrency 8
+
+import os
+import sys
+import time
+import random
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+from fake_llm import FakeGenerativeModel, heavy_tailed_latency
+from hedging import HedgedCaller
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run(num_requests: int, concurrency: int, hedger: HedgedCaller = None, seed: int = 42) -> dict:
+    model = FakeGenerativeModel(latency_sampler=heavy_tailed_latency(rng=random.Random(seed)))
+
+    def llm_call(prompt):
+        if hedger:
+            return hedger.call(lambda: model.generate_content(prompt).text)
+        return model.generate_content(prompt).text
+
+    def pipeline(i):
+        start = time.perf_counter()
+        llm_call(f"agent1 {i}")
+        llm_call(f"agent2 {i}")
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(pipeline, range(num_requests)))
+
+    return {
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "upstream_calls": model.calls,
+        "extra_calls_pct": (model.calls - 2 * num_requests) / (2 * num_requests) * 100,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark hedged LLM requests against a heavy-tailed fake model.")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--percentile", type=float, default=90.0, help="Hedge after this percentile of observed latency.")
+    parser.add_argument("--budget", type=float, default=0.1, help="Max extra calls as a fraction of all calls.")
+    args = parser.parse_args()
+
+    baseline = run(args.requests, args.concurrency)
+    hedger = HedgedCaller(percentile=args.percentile, budget_ratio=args.budget)
+    hedged = run(args.requests, args.concurrency, hedger=hedger)
+
+    print(f"{'':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'calls':>8} {'extra %':>8}")
+    for name, result in (("baseline", baseline), ("hedged", hedged)):
+        print(f"{name:>10} {result['p50_ms']:>10.1f} {result['p95_ms']:>10.1f} {result['p99_ms']:>10.1f} "
+              f"{result['upstream_calls']:>8} {result['extra_calls_pct']:>8.1f}")
+    print(f"Hedger stats: {hedger.stats()}")
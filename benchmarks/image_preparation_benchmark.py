@@ -0,0 +1,124 @@
+# File: benchmarks/image_preparation_benchmark.py
+#
+# What the translator's image preparation saves: bytes uploaded per report photo (original
+# vs. downscaled, grayscale, recompressed), the local preparation cost, the estimated upload
+# time on a given uplink, and the latency of a duplicate upload answered from the
+# perceptual-hash cache against a translator call. Uses a synthetic phone photo of a lab
+# report and the local fake model.
+#
+#   python benchmarks/image_preparation_benchmark.py --uplink-mbps 5 --runs 5
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+from PIL import Image, ImageDraw, ImageFilter
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+from fake_llm import FakeGenerativeModel
+from llm_client import LLMClient
+from llm_scheduler import LLMScheduler, LocalRateBudget
+from gemini_agent import GeminiAgent
+from image_preparation import TranslationCache, prepare_image, prompt_version
+from upload_store import load_upload
+from agent_prompts import TRANSLATOR_SYSTEM_PROMPT, TRANSLATOR_FINDINGS_SYSTEM_PROMPT
+
+KB_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'data', 'my_final_kb')
+
+REPORT_LINES = [
+    "CITY DIAGNOSTICS - COMPLETE BLOOD COUNT & METABOLIC PANEL",
+    "Patient: J. Doe    Age/Sex: 58/F    Collected: 12-03-2024",
+    "Hemoglobin            10.9  g/dL      12.0 - 15.5",
+    "WBC Count             11.8  10^3/uL   4.0 - 11.0",
+    "Platelets              245  10^3/uL   150 - 450",
+    "Glucose (Fasting)      142  mg/dL     70 - 99",
+    "HbA1c                  8.2  %         4.0 - 5.6",
+    "Creatinine             1.4  mg/dL     0.6 - 1.1",
+    "Potassium              4.6  mmol/L    3.5 - 5.1",
+    "LDL Cholesterol        162  mg/dL     < 100",
+]
+TRANSLATION = {
+    "summary": "Your blood sugar and cholesterol are above the healthy range, and your blood count is slightly low.",
+    "key_findings": [{"finding": "HbA1c", "value": "8.2 %", "interpretation": "Average blood sugar is high.", "is_abnormal": True}],
+    "next_steps": "Discuss diabetes and cholesterol treatment with your doctor.",
+    "urgency": "Medium",
+}
+
+
+def report_photo(width: int = 4000, height: int = 3000, seed: int = 0) -> Image.Image:
+    """A 12 MP color 'photo' of a printed report on a desk: textured paper, dark text, slight blur."""
+    rng = random.Random(seed)
+    desk = Image.linear_gradient("L").resize((width, height)).point(lambda v: 40 + v // 3)
+    photo = Image.merge("RGB", [desk.point(lambda v, o=o: v + o) for o in (30, 15, 0)])
+    left, top = rng.randint(150, 700), rng.randint(100, 400)
+    paper = Image.effect_noise((width // 4, height // 4), 24).resize((width - 2 * left, height - 2 * top))
+    photo.paste(Image.merge("RGB", [paper.point(lambda v, o=o: 200 + v // 8 + o) for o in (12, 8, 0)]), (left, top))
+    draw = ImageDraw.Draw(photo)
+    for i, line in enumerate(REPORT_LINES * 3):
+        y = top + 150 + i * 80
+        for j, char in enumerate(line):
+            draw.text((left + 150 + j * 42 + rng.randint(-1, 1), y), char, fill=(30, 30, 40))
+    return photo.filter(ImageFilter.GaussianBlur(1))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Translator image preparation: upload bytes and duplicate-hit latency.")
+    parser.add_argument("--uplink-mbps", type=float, default=5.0, help="Client-to-model uplink used to estimate upload time.")
+    parser.add_argument("--runs", type=int, default=5, help="Distinct report photos to translate (each re-uploaded once).")
+    parser.add_argument("--llm-median-s", type=float, default=2.5, help="Median latency of the fake translator call.")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    llm = LLMClient(
+        api_key="offline",
+        scheduler=LLMScheduler(budget=LocalRateBudget(10**9, 10**12)),
+        model_factory=lambda name: FakeGenerativeModel(
+            latency_sampler=lambda: rng.lognormvariate(0, 0.2) * args.llm_median_s,
+            responder=lambda contents: json.dumps(TRANSLATION),
+        ),
+    )
+    agent = GeminiAgent(api_key="offline", kb_folder=KB_FOLDER, llm_client=llm)
+
+    sizes, prep_ms, miss_s, hit_s = [], [], [], []
+    with tempfile.TemporaryDirectory() as folder:
+        agent.translation_cache = TranslationCache(
+            prompt_version(TRANSLATOR_SYSTEM_PROMPT, TRANSLATOR_FINDINGS_SYSTEM_PROMPT),
+            db_path=os.path.join(folder, "translation_cache.db"),
+        )
+        for run in range(args.runs):
+            photo = report_photo(seed=run)
+            ocr_text = "\n".join(REPORT_LINES) + f"\nSample ID: {1000 + run}"
+            path = os.path.join(folder, f"report_{run}.jpg")
+            photo.save(path, format="JPEG", quality=92)
+
+            start = time.perf_counter()
+            _, prepared_bytes = prepare_image(Image.open(path))
+            prep_ms.append((time.perf_counter() - start) * 1000)
+            sizes.append((os.path.getsize(path), prepared_bytes))
+
+            start = time.perf_counter()
+            agent.run_translator_agent(ocr_text, upload=load_upload(path))
+            miss_s.append(time.perf_counter() - start)
+
+            # The same report sent again, re-encoded as a smaller, lower-quality copy (as chat apps do).
+            duplicate = os.path.join(folder, f"report_{run}_forwarded.jpg")
+            photo.resize((1600, 1200)).save(duplicate, format="JPEG", quality=70)
+            start = time.perf_counter()
+            agent.run_translator_agent(ocr_text, upload=load_upload(duplicate))
+            hit_s.append(time.perf_counter() - start)
+
+        original = statistics.mean(s[0] for s in sizes)
+        prepared = statistics.mean(s[1] for s in sizes)
+        bytes_per_ms = args.uplink_mbps * 1e6 / 8 / 1000
+        print({"original_kb": round(original / 1024), "prepared_kb": round(prepared / 1024),
+               "reduction": f"{original / prepared:.1f}x", "prepare_ms": round(statistics.median(prep_ms), 1),
+               "upload_ms_original": round(original / bytes_per_ms), "upload_ms_prepared": round(prepared / bytes_per_ms)})
+        print({"translator_call_p50_s": round(statistics.median(miss_s), 3),
+               "duplicate_hit_p50_ms": round(statistics.median(hit_s) * 1000, 1)})
+        print({"translation_cache": agent.translation_cache.stats()})
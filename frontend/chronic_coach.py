@@ -5,6 +5,8 @@ import pandas as pd
 import altair as alt
 from utilities import call_agent_api
 
+CHART_MAX_POINTS = 500  # Points per vital sign; the backend downsamples longer logs.
+
 def show_chronic_coach_page():
     """
     Displays the UI for the Chronic Care Coach, handles file uploads,
@@ -23,31 +25,14 @@ def show_chronic_coach_page():
     )
 
     if st.button("Analyze Trends", type="primary", use_container_width=True):
-        # --- 2. API Call & Data Processing Logic ---
+        # --- 2. API Call ---
         if uploaded_file is not None:
-            # First, process the file for charting
-            try:
-                # Read the uploaded file into a Pandas DataFrame
-                if uploaded_file.name.endswith('.csv'):
-                    df = pd.read_csv(uploaded_file)
-                else:
-                    df = pd.read_excel(uploaded_file)
-                
-                # Store the DataFrame in session state so we can display it later
-                st.session_state.chronic_care_df = df
-                
-                # Now, call the backend API with the same file
-                response = call_agent_api(agent_type='chronic_care', json_data={}, file=uploaded_file)
-                st.session_state.chronic_care_results = response
-
-            except Exception as e:
-                st.error(f"Failed to read or process the file. Please ensure it's a valid CSV or Excel file. Error: {e}")
-                st.session_state.chronic_care_results = None
-                st.session_state.chronic_care_df = None
+            # The backend parses the file and returns a downsampled, chart-ready series with the analysis.
+            response = call_agent_api(agent_type='chronic_care', json_data={"chart_max_points": CHART_MAX_POINTS}, file=uploaded_file)
+            st.session_state.chronic_care_results = response
         else:
             st.warning("Please upload a file first.")
             st.session_state.chronic_care_results = None
-            st.session_state.chronic_care_df = None
 
     # --- 3. Display Results ---
     if 'chronic_care_results' in st.session_state and st.session_state.chronic_care_results:
@@ -97,26 +82,23 @@ def show_chronic_coach_page():
 
         # --- Display the Dynamic Chart ---
         st.subheader("Your Health Data Visualization")
-        if 'chronic_care_df' in st.session_state and st.session_state.chronic_care_df is not None:
-            df = st.session_state.chronic_care_df
-            # A simple attempt to find date and value columns for charting
-            try:
-                # Basic column name cleaning for robustness
-                df.columns = df.columns.str.lower().str.strip()
-                date_col = next((col for col in df.columns if 'date' in col or 'time' in col), df.columns[0])
-                value_cols = [col for col in df.columns if col not in [date_col]]
-                
-                df[date_col] = pd.to_datetime(df[date_col])
-
-                chart = alt.Chart(df).mark_line(point=True).encode(
-                    x=alt.X(f'{date_col}:T', title='Date'),
-                    y=alt.Y(f'{value_cols[0]}:Q', title=value_cols[0].capitalize()),
-                    tooltip=[date_col] + value_cols
-                ).interactive()
-                st.altair_chart(chart, use_container_width=True)
-            except Exception as e:
-                st.warning(f"Could not automatically generate a chart from the uploaded file. Error: {e}")
-                st.dataframe(df) # Show the raw data instead
+        chart_data = results.get("chart_series")
+        if chart_data and chart_data.get("series"):
+            df = pd.concat([
+                pd.DataFrame({"date": pd.to_datetime(points["dates"]), "value": points["values"], "metric": metric.capitalize()})
+                for metric, points in chart_data["series"].items()
+            ])
+            chart = alt.Chart(df).mark_line(point=len(df) <= 200).encode(
+                x=alt.X('date:T', title='Date'),
+                y=alt.Y('value:Q', title='Reading'),
+                color=alt.Color('metric:N', title='Metric'),
+                tooltip=['date:T', 'metric:N', 'value:Q']
+            ).interactive()
+            st.altair_chart(chart, use_container_width=True)
+            if any(points["original_points"] > len(points["values"]) for points in chart_data["series"].values()):
+                st.caption(f"Long logs are downsampled to {chart_data['max_points']} points per metric ({chart_data['method']}) for display.")
+        else:
+            st.warning("Could not generate a chart: the uploaded file has no recognizable date and vitals columns.")
         
         # For Debugging/Judges: Show the full JSON response
         with st.expander("Show Full JSON Response"):
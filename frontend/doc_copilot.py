@@ -1,7 +1,7 @@
 # File: frontend/doc_copilot.py
 
 import streamlit as st
-from utilities import call_agent_api
+from utilities import call_agent_api, wait_for_evaluation
 
 def show_doc_copilot_page():
     """
@@ -34,7 +34,8 @@ def show_doc_copilot_page():
         # --- 3. API Call Logic ---
         if note_text:
             json_data = {"note": note_text}
-            response = call_agent_api(agent_type='doctors_copilot', json_data=json_data)
+            # Copilot notes are long; show the summary first and let Agent 2 finish in the background.
+            response = call_agent_api(agent_type='doctors_copilot', json_data=json_data, defer_evaluation=True)
             st.session_state.copilot_results = response
         else:
             st.warning("Please enter an encounter note.")
@@ -48,16 +49,9 @@ def show_doc_copilot_page():
         st.markdown("## Co-Pilot Generated Output")
 
         # --- Display Agent 2 (Evaluation) ---
+        # Reserved here and filled in after Agent 1 is shown, since the review may still be running.
         st.subheader("Agent 2: Quality & Safety Review")
-        if "agent2_evaluation" in results and not results["agent2_evaluation"].get("error"):
-            eval_data = results["agent2_evaluation"]
-            score = eval_data.get("overall_quality_score", "N/A")
-            recommendation = eval_data.get("final_recommendation", "No recommendation.")
-            with st.container(border=True):
-                st.markdown(f"##### Overall Quality Score: **{score} / 5.0**")
-                st.info(f"**Reviewer's Note:** {recommendation}")
-        else:
-            st.warning("The evaluation agent could not review this result.")
+        evaluation_section = st.container()
 
         # --- Display Agent 1 (Co-Pilot Analysis) ---
         st.subheader("Agent 1: Clinical Analysis")
@@ -105,6 +99,19 @@ def show_doc_copilot_page():
         else:
             st.error("The analysis agent failed to produce a valid clinical summary.")
 
+        with evaluation_section:
+            if "agent2_evaluation" in results:
+                results["agent2_evaluation"] = wait_for_evaluation(results["agent2_evaluation"])
+            if "agent2_evaluation" in results and not results["agent2_evaluation"].get("error"):
+                eval_data = results["agent2_evaluation"]
+                score = eval_data.get("overall_quality_score", "N/A")
+                recommendation = eval_data.get("final_recommendation", "No recommendation.")
+                with st.container(border=True):
+                    st.markdown(f"##### Overall Quality Score: **{score} / 5.0**")
+                    st.info(f"**Reviewer's Note:** {recommendation}")
+            else:
+                st.warning("The evaluation agent could not review this result.")
+
         # For Debugging/Judges: Show the full JSON response
         with st.expander("Show Full JSON Response"):
             st.json(results)
\ No newline at end of file
@@ -1,7 +1,7 @@
 # File: frontend/doc_to_patient.py
 
 import streamlit as st
-from utilities import call_agent_api
+from utilities import stream_agent_api
 
 def show_translator_page():
     """
@@ -23,9 +23,9 @@ def show_translator_page():
     if st.button("Translate My Report", type="primary", use_container_width=True):
         # --- 2. API Call Logic ---
         if uploaded_file is not None:
-            # Call the backend API with the file
+            # Stream the response, so parsed lab results show up before the explanation is written
             # No additional JSON data is needed for this agent, so we pass an empty dict
-            response = call_agent_api(agent_type='translator', json_data={}, file=uploaded_file)
+            response = stream_agent_api(agent_type='translator', json_data={}, file=uploaded_file)
             st.session_state.translator_results = response
         else:
             st.warning("Please upload a file first.")
@@ -1,7 +1,7 @@
 # File: frontend/drug.py
 
 import streamlit as st
-from utilities import call_agent_api
+from utilities import stream_agent_api
 
 def show_drug_page():
     """
@@ -33,7 +33,7 @@ def show_drug_page():
             json_data = {"medications": medication_list}
             
             # Call the backend and store the full response in session state
-            response = call_agent_api(agent_type='drug_safety', json_data=json_data)
+            response = stream_agent_api(agent_type='drug_safety', json_data=json_data)
             st.session_state.drug_safety_results = response
         else:
             st.warning("Please enter at least one medication name.")
@@ -1,6 +1,7 @@
 # File: frontend/main.py
 
 import streamlit as st
+import uvicorn
 import os
 import threading
 import sys
@@ -9,8 +10,8 @@ import sys
 # This is a crucial step to allow imports from the sibling 'app' folder
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
 
-# --- Import your Flask app and your page functions ---
-from app import app as flask_app # Import the 'app' object from app/app.py
+# --- Import the API server and your page functions ---
+from asgi import application as api_app # The ASGI app from app/asgi.py (wraps the Flask app in app/app.py)
 from home_page import show_home_page
 from drug import show_drug_page
 from doc_to_patient import show_translator_page
@@ -22,19 +23,20 @@ from doc_copilot import show_doc_copilot_page
 # from knowledge_base import show_knowledge_base_page
 # from patient_insights import show_patient_insights_page
 
-# --- Function to run the Flask app in a background thread ---
-def run_flask():
-    # Runs the Flask server on host 0.0.0.0, which is required for cloud deployment
-    flask_app.run(host='0.0.0.0', port=5001, debug=False)
+# --- Function to run the API server in a background thread ---
+def run_api_server():
+    # Serves the ASGI app with uvicorn on host 0.0.0.0, which is required for cloud deployment.
+    # For production load, run it under gunicorn instead (see app/gunicorn_conf.py).
+    uvicorn.run(api_app, host='0.0.0.0', port=5001, log_level='warning')
 
-# --- Start the Flask server if it's not already running ---
+# --- Start the API server if it's not already running ---
 # We use session state to ensure this only runs once.
-if 'flask_thread_started' not in st.session_state:
-    print("Starting Flask server in a background thread...")
-    flask_thread = threading.Thread(target=run_flask, daemon=True)
-    flask_thread.start()
-    st.session_state.flask_thread_started = True
-    print("Flask server thread started.")
+if 'api_thread_started' not in st.session_state:
+    print("Starting API server in a background thread...")
+    api_thread = threading.Thread(target=run_api_server, daemon=True)
+    api_thread.start()
+    st.session_state.api_thread_started = True
+    print("API server thread started.")
 
 
 # --- Your Existing Streamlit App Code Starts Here ---
@@ -1,7 +1,7 @@
 # File: frontend/symptom.py
 
 import streamlit as st
-from utilities import call_agent_api
+from utilities import stream_agent_api
 import re
 
 def show_symptom_page():
@@ -30,7 +30,7 @@ def show_symptom_page():
         # --- 2. API Call Logic ---
         if symptom_text:
             json_data = {"symptoms": symptom_text}
-            response = call_agent_api(agent_type='symptom_triage', json_data=json_data)
+            response = stream_agent_api(agent_type='symptom_triage', json_data=json_data)
             st.session_state.symptom_triage_results = response
         else:
             st.warning("Please describe your symptoms.")
@@ -2,20 +2,35 @@
 
 import requests
 import json
+import time
 import streamlit as st
 
 # URL of the running Flask backend server
 # Make sure this matches the port your app.py uses.
 API_URL = "http://127.0.0.1:5001/api/unified_analysis"
+STREAM_API_URL = f"{API_URL}/stream"
+BASE_URL = "http://127.0.0.1:5001"
+JOBS_URL = f"{BASE_URL}/api/jobs"
+JOB_STAGE_LABELS = {
+    "extraction": "📄 Reading your document...",
+    "agent1_analysis": "🧠 Agent 1 is analyzing...",
+    "agent2_evaluation": "🔎 Agent 2 is reviewing the analysis...",
+}
 
-def call_agent_api(agent_type: str, json_data: dict, file=None):
+def call_agent_api(agent_type: str, json_data: dict, file=None, defer_evaluation: bool = False, timeout: int = 600):
     """
     Reusable function to call any backend agent.
 
+    Submits the request as a background job and polls it, so a slow upload (e.g. a
+    scanned PDF being OCR'd) doesn't hold an HTTP request open for minutes.
+
     Args:
         agent_type (str): Name of the agent to call (e.g., 'drug_safety').
         json_data (dict): Text-based input for the agent (e.g., medications, symptoms).
         file (UploadedFile, optional): Uploaded file for agents that require it.
+        defer_evaluation (bool): Return Agent 1's result without waiting for Agent 2.
+            The evaluation then comes back as a pending ticket; see `wait_for_evaluation`.
+        timeout (int): Seconds to wait for the job to finish.
 
     Returns:
         dict: JSON response from the backend API.
@@ -24,7 +39,8 @@ def call_agent_api(agent_type: str, json_data: dict, file=None):
         # Prepare the POST form data
         form_data = {
             'agent_type': agent_type,
-            'json_data': json.dumps(json_data)
+            'json_data': json.dumps(json_data),
+            'defer_evaluation': 'true' if defer_evaluation else 'false'
         }
 
         files = {}
@@ -32,11 +48,37 @@ def call_agent_api(agent_type: str, json_data: dict, file=None):
             # Read the file content into memory to send
             files['file'] = (file.name, file.getvalue(), file.type)
 
-        # Display spinner while waiting for response
-        with st.spinner("🧠 Agents are collaborating on your request... Please wait."):
-            response = requests.post(API_URL, data=form_data, files=files, timeout=300)
-            response.raise_for_status()  # Raise error for bad HTTP status
-            return response.json()
+        deadline = time.time() + timeout
+        progress = st.empty()
+        try:
+            # Display spinner while the job is queued and running
+            with st.spinner("🧠 Agents are collaborating on your request... Please wait."):
+                response = requests.post(JOBS_URL, data=form_data, files=files, timeout=60)
+                while response.status_code == 503 and time.time() < deadline:
+                    # The backend is at capacity; it says when to try again.
+                    retry_after = int(response.headers.get('Retry-After', 5))
+                    progress.caption(f"The server is busy; retrying in {retry_after} s...")
+                    time.sleep(retry_after)
+                    response = requests.post(JOBS_URL, data=form_data, files=files, timeout=60)
+                response.raise_for_status()  # Raise error for bad HTTP status
+                poll_url = BASE_URL + response.json()["poll_url"]
+
+                while time.time() < deadline:
+                    response = requests.get(poll_url, timeout=10)
+                    response.raise_for_status()
+                    job = response.json()
+                    if job["status"] == "done":
+                        return job["result"]
+                    if job["status"] == "error":
+                        st.error(f"The agents failed to complete your request. Details: {job.get('error')}")
+                        return None
+                    running = [s["stage"] for s in job["stages"] if s["status"] == "running"]
+                    progress.progress(job["progress"], text=JOB_STAGE_LABELS.get(running[0] if running else None, "⏳ Queued..."))
+                    time.sleep(1)
+        finally:
+            progress.empty()
+        st.error("The request is taking longer than expected. Please try again later.")
+        return None
 
     except requests.exceptions.RequestException as e:
         st.error(
@@ -44,3 +86,88 @@ def call_agent_api(agent_type: str, json_data: dict, file=None):
             f"Ensure the Flask server (`app.py`) is running. Details: {e}"
         )
         return None
+
+def stream_agent_api(agent_type: str, json_data: dict, file=None):
+    """
+    Streaming version of `call_agent_api`. Renders Agent 1's text as it is generated,
+    then returns the same {"agent1_analysis", "agent2_evaluation"} dict once the
+    evaluation arrives, so pages can display the final result unchanged.
+    """
+    form_data = {
+        'agent_type': agent_type,
+        'json_data': json.dumps(json_data)
+    }
+    files = {}
+    if file:
+        files['file'] = (file.name, file.getvalue(), file.type)
+
+    results = {}
+    streamed_text = ""
+    findings_preview = st.empty()
+    preview = st.empty()
+    status = st.empty()
+    try:
+        status.info("🧠 Agent 1 is writing its analysis...")
+        with requests.post(STREAM_API_URL, data=form_data, files=files, stream=True, timeout=(10, 300)) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event["event"] == "token":
+                    streamed_text += event["text"]
+                    preview.markdown(streamed_text + " ▌")
+                elif event["event"] == "chart_series":
+                    results["chart_series"] = event["data"]
+                elif event["event"] == "lab_findings":
+                    # Parsed locally by the backend, so they can be shown before Agent 1 writes anything.
+                    results["lab_findings"] = event["data"]
+                    findings_preview.markdown("\n".join(
+                        f"- {'⚠️' if f['is_abnormal'] else '✅'} **{f['name']}**: {f['value']}"
+                        + (f" (reference: {f['reference_range']})" if f['reference_range'] else "")
+                        for f in event["data"]
+                    ))
+                elif event["event"] == "agent1_analysis":
+                    results["agent1_analysis"] = event["data"]
+                    status.info("🔎 Agent 2 is reviewing the analysis...")
+                elif event["event"] == "agent2_evaluation":
+                    results["agent2_evaluation"] = event["data"]
+                elif event["event"] == "error":
+                    st.error(f"The agents failed to complete your request. Details: {event['error']}")
+                    return None
+        return results
+
+    except requests.exceptions.RequestException as e:
+        st.error(
+            f"API Connection Error: Could not connect to the backend. "
+            f"Ensure the Flask server (`app.py`) is running. Details: {e}"
+        )
+        return None
+    finally:
+        # The final result is rendered by the calling page, so drop the live preview.
+        findings_preview.empty()
+        preview.empty()
+        status.empty()
+
+def wait_for_evaluation(agent2_evaluation: dict, timeout: int = 120) -> dict:
+    """
+    Resolves a deferred Agent 2 evaluation ticket by polling the backend.
+    Evaluations that were already completed synchronously are returned unchanged.
+    """
+    if not agent2_evaluation or agent2_evaluation.get("status") != "pending":
+        return agent2_evaluation
+
+    poll_url = BASE_URL + agent2_evaluation["poll_url"]
+    deadline = time.time() + timeout
+    with st.spinner("🔎 Agent 2 is reviewing the analysis..."):
+        while time.time() < deadline:
+            try:
+                response = requests.get(poll_url, timeout=10)
+                response.raise_for_status()
+                ticket = response.json()
+            except requests.exceptions.RequestException as e:
+                return {"error": f"Could not fetch the evaluation. Details: {e}"}
+            if ticket["status"] != "pending":
+                return ticket["result"]
+            time.sleep(1)
+    return {"error": "The evaluation is taking longer than expected."}
@@ -1,6 +1,8 @@
 import os
+import re
 import glob
 import json
+import sqlite3
 import argparse
 import numpy as np
 import faiss
@@ -148,10 +150,124 @@ def validate_kb(kb_folder: str, query: str):
     except Exception as e:
         print(f"Validation failed. Reason: {e}")
 
+# --- 5. GUIDELINE RECOMMENDATIONS ---
+
+RECOMMENDATIONS_DB_NAME = "kb_recommendations.db"  # Read by app/guideline_matcher.py
+RECOMMENDATION_MODEL = os.getenv("KB_RECOMMENDATION_MODEL", "gemini-1.5-flash")
+# Only chunks that read like guidance are sent to the LLM.
+RECOMMENDATION_CUES = re.compile(r"\b(should|recommend\w*|indicated|consider|screen\w*|initiate|target|goal|first-line)\b", re.IGNORECASE)
+NON_ALPHANUMERIC = re.compile(r"[^a-z0-9]+")
+
+RECOMMENDATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "recommendations": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "recommendation": {"type": "string"},
+                    "trigger_conditions": {"type": "array", "items": {"type": "string"}},
+                    "required_actions": {"type": "array", "items": {"type": "string"}},
+                    "trigger_terms": {"type": "array", "items": {"type": "string"}},
+                },
+                "required": ["recommendation", "trigger_conditions", "required_actions", "trigger_terms"],
+            },
+        },
+    },
+    "required": ["recommendations"],
+}
+
+RECOMMENDATION_PROMPT = """
+You are building a clinical decision-support knowledge base. Extract every atomic, actionable
+recommendation from the guideline text below (one action per recommendation; split compound ones).
+For each, give:
+- "recommendation": the recommendation as one self-contained sentence.
+- "trigger_conditions": the patient conditions that make it apply (e.g. "type 2 diabetes", "age 40-75", "LDL >= 190 mg/dL").
+- "required_actions": what must be done for it to count as addressed (e.g. "start moderate-intensity statin").
+- "trigger_terms": short words or phrases (at most 4 words) that would appear in an encounter note when it applies,
+  including common abbreviations and synonyms (e.g. "type 2 diabetes", "t2dm", "diabetes mellitus", "hba1c").
+Return {{"recommendations": []}} if the text contains no recommendations.
+
+Guideline text:
+---
+{chunk}
+---
+"""
+
+def normalize_term(text: str) -> str:
+    """Same normalization as app/guideline_matcher.normalize_term, so build-time and note terms compare equal."""
+    return NON_ALPHANUMERIC.sub(" ", text.lower()).strip()
+
+def extract_recommendations(chunks: list[dict]) -> list[dict]:
+    """
+    Extracts atomic recommendations (trigger conditions, required actions, trigger terms) from
+    the text chunks once, at build time, so the copilot doesn't re-derive them on every note.
+    """
+    import google.generativeai as genai
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+    model = genai.GenerativeModel(RECOMMENDATION_MODEL, generation_config={
+        "response_mime_type": "application/json", "response_schema": RECOMMENDATION_SCHEMA,
+    })
+
+    candidates = [chunk for chunk in chunks if RECOMMENDATION_CUES.search(chunk['content_chunk'])]
+    print(f"Extracting recommendations from {len(candidates)} of {len(chunks)} chunks...")
+    recommendations = []
+    for chunk in candidates:
+        try:
+            response = model.generate_content(RECOMMENDATION_PROMPT.format(chunk=chunk['content_chunk']))
+            extracted = json.loads(response.text).get("recommendations", [])
+        except Exception as e:
+            print(f"WARNING: Could not extract recommendations from {chunk['source']}: {e}")
+            continue
+        for recommendation in extracted:
+            recommendation["source"] = chunk["source"]
+            recommendations.append(recommendation)
+    print(f"Extracted {len(recommendations)} recommendations.")
+    return recommendations
+
+def build_recommendation_table(recommendations: list[dict], output_folder: str):
+    """
+    Stores the recommendations in an SQLite table next to the FAISS index, with their trigger
+    terms in a separate table indexed by term for local matching at request time.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    db_path = os.path.join(output_folder, RECOMMENDATIONS_DB_NAME)
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute(
+            "CREATE TABLE recommendations (id INTEGER PRIMARY KEY, source TEXT, recommendation TEXT NOT NULL, "
+            "trigger_conditions TEXT NOT NULL, required_actions TEXT NOT NULL)"
+        )
+        conn.execute("CREATE TABLE triggers (term TEXT NOT NULL, recommendation_id INTEGER NOT NULL REFERENCES recommendations (id))")
+        seen = set()
+        for recommendation in recommendations:
+            key = normalize_term(recommendation["recommendation"])
+            if key in seen:  # The same recommendation often appears in overlapping chunks.
+                continue
+            seen.add(key)
+            cursor = conn.execute(
+                "INSERT INTO recommendations (source, recommendation, trigger_conditions, required_actions) VALUES (?, ?, ?, ?)",
+                (recommendation.get("source"), recommendation["recommendation"],
+                 json.dumps(recommendation["trigger_conditions"]), json.dumps(recommendation["required_actions"])),
+            )
+            terms = {normalize_term(term) for term in recommendation["trigger_terms"]} - {""}
+            conn.executemany("INSERT INTO triggers VALUES (?, ?)", [(term, cursor.lastrowid) for term in terms])
+        conn.execute("CREATE INDEX idx_triggers_term ON triggers (term)")
+    conn.close()
+    print(f"Recommendations table with {len(seen)} recommendations saved to: {db_path}")
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Build a local Knowledge Base from preprocessed data.")
     parser.add_argument("input_folders", nargs='+', type=str, help="One or more paths to folders containing preprocessed .json files.")
     parser.add_argument("output_folder", type=str, help="The path to the folder where the final KB (FAISS index and chunks) will be saved.")
+    parser.add_argument("--recommendations", action="store_true", help="Also extract atomic guideline recommendations with Gemini into an indexed table.")
+    parser.add_argument("--recommendations-from", type=str, default=None, help="Build the recommendations table from a JSON list of already extracted recommendations instead.")
     
     args = parser.parse_args()
     
@@ -160,5 +276,11 @@ if __name__ == "__main__":
         chunked_documents = chunk_documents(normalized_documents)
         build_and_save_kb(chunked_documents, args.output_folder)
         validate_kb(args.output_folder, query="glucose")
+        if args.recommendations and not args.recommendations_from:
+            build_recommendation_table(extract_recommendations(chunked_documents), args.output_folder)
+
+    if args.recommendations_from:
+        with open(args.recommendations_from, 'r', encoding='utf-8') as f:
+            build_recommendation_table(json.load(f), args.output_folder)
 
         
\ No newline at end of file